@@ -0,0 +1,228 @@
+"""Asyncio runtime: async Web client, Bolt app and Socket Mode connection
+
+Used when ``runtime.mode`` is ``async``. Slack calls, Bolt listeners and the
+Socket Mode connection all run on one event loop, and the clients share a
+pooled aiohttp session so connections are kept alive between calls. Poll
+delivery, summary refreshes and deletions are still started by the scheduler
+and background threads, which hand their whole fan-out to the loop at once.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, Optional
+
+import aiohttp
+from slack_bolt.async_app import AsyncApp
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+import replies
+from fanout import EventLoopThread
+from metrics import SLACK_API_CALLS, SLACK_API_ERRORS, SLACK_API_LATENCY, SLACK_API_RATE_LIMITED
+from summary import SHOW_ALL_ACTION, VOTERS_PAGE_ACTION
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedAsyncWebClient(AsyncWebClient):
+    """AsyncWebClient that records call counts, latency and errors for every API method"""
+
+    async def api_call(self, api_method: str, **kwargs):
+        start = time.monotonic()
+        try:
+            return await super().api_call(api_method, **kwargs)
+        except SlackApiError as e:
+            if e.response.status_code == 429:
+                SLACK_API_RATE_LIMITED.inc(method=api_method)
+            SLACK_API_ERRORS.inc(method=api_method, error=e.response.get("error") or "unknown")
+            raise
+        except Exception as e:
+            SLACK_API_ERRORS.inc(method=api_method, error=type(e).__name__)
+            raise
+        finally:
+            SLACK_API_CALLS.inc(method=api_method)
+            SLACK_API_LATENCY.observe(time.monotonic() - start, method=api_method)
+
+
+def create_session(io: EventLoopThread, connection_limit: int) -> aiohttp.ClientSession:
+    """One HTTP session for every client, so calls reuse pooled keep-alive connections"""
+    async def create():
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connection_limit, keepalive_timeout=60))
+    return io.run(create())
+
+
+def create_app(io: EventLoopThread, tenants: Dict[str, Any], tenant_for: Callable, team_of: Callable,
+               authorize: Callable, base_url: str, session: aiohttp.ClientSession) -> AsyncApp:
+    """Build the async Bolt app with the same listeners as the sync one"""
+    # Commands that outlive their listener, kept referenced until they finish
+    background = set()
+
+    def in_background(coro) -> None:
+        task = asyncio.ensure_future(coro)
+        background.add(task)
+        task.add_done_callback(background.discard)
+
+    async def build():
+        if len(tenants) == 1:
+            return AsyncApp(client=tenant_for(None).client)
+
+        async def authorize_async(enterprise_id: Optional[str], team_id: Optional[str]):
+            # The bot identity is looked up through the blocking fan-out once per tenant
+            return await asyncio.to_thread(authorize, enterprise_id, team_id)
+
+        return AsyncApp(client=InstrumentedAsyncWebClient(base_url=base_url, session=session),
+                        authorize=authorize_async)
+
+    app = io.run(build())
+
+    async def is_vote(body):
+        try:
+            tenant = tenant_for(team_of(body))
+        except LookupError:
+            # Events of a workspace that is not configured are left to other listeners
+            return False
+        actions = body.get("actions") or []
+        return bool(actions) and tenant.settings.vote(actions[0]["action_id"]) is not None
+
+    @app.action(re.compile(".*"), matchers=[is_vote])
+    @traced("action.vote")
+    async def handle_vote(ack, body, respond):
+        await ack()
+        tenant = tenant_for(team_of(body))
+        vote = tenant.settings.vote(body["actions"][0]["action_id"])
+        reply = tenant.handle_vote(body, *vote) if vote else None
+        if reply:
+            await respond(**reply)
+
+    @app.action(SHOW_ALL_ACTION)
+    @traced("action.attendance_show_all")
+    async def show_all_voters(ack, body, client):
+        await ack()
+        view = tenant_for(team_of(body)).voters_view(body["actions"][0]["value"])
+        await client.views_open(trigger_id=body["trigger_id"], view=view)
+
+    @app.action(re.compile(f"^{VOTERS_PAGE_ACTION}_"))
+    @traced("action.attendance_voters_page")
+    async def page_voters(ack, body, client):
+        await ack()
+        target = json.loads(body["actions"][0]["value"])
+        view = tenant_for(team_of(body)).voters_view(target["date"], target["page"])
+        await client.views_update(view_id=body["view"]["id"], hash=body["view"]["hash"], view=view)
+
+    @app.event("app_home_opened")
+    @traced("event.app_home_opened")
+    async def handle_app_home_opened(event, body, client):
+        tenant = tenant_for(team_of(body))
+        if tenant.summary_mode != "app_home" or event.get("tab") != "home":
+            return
+        try:
+            await client.views_publish(user_id=event["user"], view=tenant.home_view(event["user"]))
+        except Exception as e:
+            logger.error("Error publishing App Home for user %s: %s", event['user'], e)
+
+    @app.event("team_join")
+    @traced("event.team_join")
+    async def handle_team_join(event, body):
+        tenant_for(team_of(body)).user_directory.apply(event["user"])
+
+    @app.event("user_change")
+    @traced("event.user_change")
+    async def handle_user_change(event, body):
+        tenant_for(team_of(body)).user_directory.apply(event["user"])
+
+    @app.command("/attendance-poll")
+    @traced("command.attendance-poll")
+    async def create_poll(ack, body):
+        await ack()
+        # The poll's own calls run on this loop, the thread only waits for the run to finish
+        await asyncio.to_thread(tenant_for(team_of(body)).send_attendance_poll)
+
+    @app.command("/new-poll")
+    @traced("command.new-poll")
+    async def force_new_poll(ack, body, respond):
+        await ack()
+        tenant = tenant_for(team_of(body))
+        try:
+            deleting = await asyncio.to_thread(tenant.delete_previous_messages)
+        except Exception as e:
+            await respond(f"Error creating new poll: {e}")
+            return
+
+        async def replace_poll():
+            try:
+                await asyncio.to_thread(tenant.send_attendance_poll)
+                await respond(**replies.new_poll_sent(tenant))
+            except Exception as e:
+                await respond(f"Error creating new poll: {e}")
+
+        in_background(replace_poll())
+        await respond(**replies.new_poll_started(deleting))
+
+    @app.command("/delete-poll")
+    @traced("command.delete-poll")
+    async def delete_poll(ack, body, respond):
+        await ack()
+        # Deleting a poll that is no longer in memory reads its messages from the store
+        await respond(**await asyncio.to_thread(replies.delete_poll, tenant_for(team_of(body))))
+
+    @app.command("/attendance-stats")
+    @traced("command.attendance-stats")
+    async def get_stats(ack, body, respond):
+        await ack()
+        await respond(**replies.stats(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-history")
+    @traced("command.attendance-history")
+    async def show_history(ack, body, respond):
+        await ack()
+        await respond(**replies.history(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-trends")
+    @traced("command.attendance-trends")
+    async def show_trends(ack, body, respond):
+        await ack()
+        await respond(**replies.trends(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-mute")
+    @traced("command.attendance-mute")
+    async def mute_bot(ack, body, respond):
+        await ack()
+        await respond(**replies.mute(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-unmute")
+    @traced("command.attendance-unmute")
+    async def unmute_bot(ack, body, respond):
+        await ack()
+        await respond(**replies.unmute(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-mute-status")
+    @traced("command.attendance-mute-status")
+    async def check_mute_status(ack, body, respond):
+        await ack()
+        await respond(**replies.mute_status(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-dlq")
+    @traced("command.attendance-dlq")
+    async def show_dead_letters(ack, body, respond):
+        await ack()
+        await respond(**replies.dead_letters(tenant_for(team_of(body)), body))
+
+    @app.command("/attendance-help")
+    @traced("command.attendance-help")
+    async def show_help(ack, respond):
+        await ack()
+        await respond(**replies.help_reply())
+
+    return app
+
+
+def start_socket_mode(io: EventLoopThread, app: AsyncApp, app_token: str) -> None:
+    """Connect to Socket Mode on the event loop and serve until the process exits"""
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+    async def serve():
+        await AsyncSocketModeHandler(app, app_token).start_async()
+    io.run(serve())
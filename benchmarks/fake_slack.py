@@ -0,0 +1,150 @@
+"""Local stand-in for the Slack Web API used by the benchmarks
+
+Serves the methods the bot calls with configurable latency and simulated
+429 rate limit responses, and records when every call arrived.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+
+class FakeSlack:
+    """In-memory workspace behind the fake Web API"""
+
+    def __init__(self, users: int, latency: float = 0.0, throttle_probability: float = 0.0,
+                 rate_limits: Optional[Dict[str, float]] = None, retry_after: int = 1, seed: int = 0):
+        self.users = [
+            {"id": f"U{i:06d}", "name": f"user{i}", "is_bot": False, "deleted": False}
+            for i in range(users)
+        ]
+        self.users.append({"id": "USLACKBOT", "name": "slackbot", "is_bot": False, "deleted": False})
+        self.latency = latency
+        self.throttle_probability = throttle_probability
+        self.rate_limits = rate_limits or {}
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Tuple[int, int]] = {}
+        self._ts = 0
+        self.calls: Dict[str, int] = {}
+        self.throttled: Dict[str, int] = {}
+        # (method, arrival time, request arguments) of every successful call
+        self.log: List[Tuple[str, float, Dict[str, Any]]] = []
+
+    def reset_log(self) -> None:
+        with self._lock:
+            self.log = []
+            self.calls = {}
+            self.throttled = {}
+
+    def _throttle(self, method: str) -> bool:
+        """Whether this call should be answered with a 429"""
+        with self._lock:
+            limit = self.rate_limits.get(method)
+            if limit:
+                second = int(time.monotonic())
+                window, count = self._windows.get(method, (second, 0))
+                if window != second:
+                    window, count = second, 0
+                self._windows[method] = (window, count + 1)
+                if count >= limit:
+                    return True
+            return self.throttle_probability > 0 and self._random.random() < self.throttle_probability
+
+    def handle(self, method: str, args: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if self.latency:
+            time.sleep(self.latency)
+        if method != "auth.test" and self._throttle(method):
+            with self._lock:
+                self.throttled[method] = self.throttled.get(method, 0) + 1
+            return 429, {"ok": False, "error": "ratelimited"}
+
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.log.append((method, time.monotonic(), args))
+            self._ts += 1
+            ts = f"{1700000000 + self._ts}.{self._ts:06d}"
+
+        if method == "auth.test":
+            return 200, {"ok": True, "user_id": "UBOT", "user": "attendancebot", "bot_id": "BBOT",
+                         "team_id": "TBENCH", "team": "bench", "url": "https://bench.slack.com/"}
+        if method == "users.list":
+            limit = int(args.get("limit") or 1000)
+            start = int(args.get("cursor") or 0)
+            end = start + limit
+            next_cursor = str(end) if end < len(self.users) else ""
+            return 200, {"ok": True, "members": self.users[start:end],
+                         "response_metadata": {"next_cursor": next_cursor}}
+        if method == "conversations.open":
+            return 200, {"ok": True, "channel": {"id": "D" + args["users"]}}
+        if method == "chat.postMessage":
+            return 200, {"ok": True, "channel": args["channel"], "ts": ts}
+        if method in ("chat.update", "chat.delete"):
+            return 200, {"ok": True, "channel": args["channel"], "ts": args["ts"]}
+        if method == "views.publish":
+            return 200, {"ok": True}
+        return 200, {"ok": False, "error": "unknown_method"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self) -> None:
+        url = urlparse(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        args: Dict[str, Any] = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                args.update(json.loads(body))
+            else:
+                args.update(parse_qsl(body))
+
+        status, payload = self.server.slack.handle(method, args)
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", str(self.server.slack.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _serve
+    do_POST = _serve
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FakeSlackServer:
+    """Runs a :class:`FakeSlack` on a local port in a background thread"""
+
+    def __init__(self, slack: FakeSlack, host: str = "127.0.0.1", port: int = 0):
+        self.slack = slack
+        self._server = _Server((host, port), _Handler)
+        self._server.slack = slack
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-slack", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def __enter__(self) -> "FakeSlackServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,230 @@
+"""End-to-end load benchmark against a local fake Slack Web API
+
+Drives poll delivery, a burst of votes through the action handlers and poll
+deletion at several audience sizes, and reports throughput, time to delivery
+and API call counts. Runs fully offline:
+
+    python benchmarks/run.py --users 100 1000 10000
+
+Every audience size runs in its own process so that module-level bot state
+starts fresh.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULT_PREFIX = "RESULT "
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, count: int, duration: float, latencies: List[float], calls: Dict[str, int],
+              throttled: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "phase": name,
+        "count": count,
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(count / duration, 1) if duration > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "api_calls": sum(calls.values()),
+        "api_calls_by_method": dict(calls),
+        "throttled": sum(throttled.values()),
+    }
+
+
+def write_config(path: str, args: argparse.Namespace) -> None:
+    fan_out = {"max_workers": args.workers, "max_retries": 5}
+    if not args.slack_tiers:
+        # Measure the engine itself rather than the production rate budgets
+        fan_out["rate_limits"] = {method: 10 ** 7 for method in [
+            "users.list", "conversations.open", "chat.postMessage", "chat.update", "chat.delete"
+        ]}
+    custom = {
+        "summary_refresh": {"debounce_seconds": args.debounce},
+        "summary_mode": {"mode": args.summary_mode, "channel": "CBENCH"},
+        "poll_mode": {"mode": args.poll_mode},
+        "fan_out": fan_out,
+        "runtime": {"mode": args.runtime, "max_concurrency": 1000, "connection_limit": 100},
+        "storage": {"backend": "memory"},
+        "dm_channel_cache": {"path": "data/dm_channels.json"},
+    }
+    with open(path, "w") as f:
+        json.dump(custom, f)
+
+
+def run_single(args: argparse.Namespace) -> Dict[str, Any]:
+    """Benchmark one audience size in this process"""
+    sys.path.insert(0, BENCHMARK_DIR)
+    sys.path.insert(0, REPO_DIR)
+    from fake_slack import FakeSlack, FakeSlackServer
+
+    server_limits = {}
+    if args.server_rate_limit:
+        server_limits = {method: args.server_rate_limit for method in [
+            "conversations.open", "chat.postMessage", "chat.update", "chat.delete"
+        ]}
+    slack = FakeSlack(args.single, latency=args.latency / 1000.0,
+                      throttle_probability=args.throttle_probability,
+                      rate_limits=server_limits, retry_after=args.retry_after)
+
+    results: Dict[str, Any] = {"users": args.single}
+    with FakeSlackServer(slack) as server, tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        write_config("benchmark_config.json", args)
+        os.environ["SLACK_BOT_TOKEN"] = "xoxb-benchmark"
+        os.environ["SLACK_API_URL"] = server.url
+        os.environ["ATTENDANCE_CONFIG_PATH"] = os.path.join(workdir, "benchmark_config.json")
+
+        quiet = io.StringIO()
+        with contextlib.redirect_stdout(quiet):
+            import main
+
+            # The directory is normally loaded at startup, long before the poll runs
+            tenant = main.tenant_for(None)
+            start = time.monotonic()
+            tenant.load_user_directory()
+            results["directory_load_s"] = round(time.monotonic() - start, 3)
+
+            # Poll delivery
+            slack.reset_log()
+            start = time.monotonic()
+            tenant.send_attendance_poll()
+            duration = time.monotonic() - start
+            delivered = [t - start for method, t, _ in slack.log if method == "chat.postMessage"]
+            delivery = summarize("delivery", len(delivered), duration, delivered, slack.calls, slack.throttled)
+
+            # Vote burst: every recipient votes once through the Bolt handlers
+            voters = [(user["id"], user["name"]) for user in slack.users if user["name"] != "slackbot"]
+            random.Random(1).shuffle(voters)
+            handler_latencies: List[float] = []
+            # A weekly poll is answered once for each of its dates
+            days = tenant.poll.dates if args.poll_mode == "weekly" else [None]
+
+            def vote(voter):
+                user_id, name = voter
+                for day in days:
+                    response = random.choice(["yes", "no", "maybe"])
+                    action_id = f"attendance_{response}" if day is None else f"attendance_{response}_{day}"
+                    body = {"user": {"id": user_id, "name": name},
+                            "actions": [{"action_id": action_id, "value": response}]}
+                    began = time.monotonic()
+                    main.handle_vote(lambda *a, **kw: None, body, lambda *a, **kw: None)
+                    handler_latencies.append(time.monotonic() - began)
+
+            slack.reset_log()
+            start = time.monotonic()
+            with ThreadPoolExecutor(max_workers=args.handler_threads) as pool:
+                list(pool.map(vote, voters))
+            tenant.summary_refresher.wait_idle()
+            duration = time.monotonic() - start
+
+            # Time until each recipient's message shows the final tally
+            converged: Dict[str, float] = {}
+            for method, t, call_args in slack.log:
+                if method == "chat.update":
+                    converged[call_args["channel"]] = t - start
+            votes = summarize("votes", len(voters) * len(days), duration, list(converged.values()),
+                              slack.calls, slack.throttled)
+            votes["handler_p50_ms"] = round(percentile(handler_latencies, 50) * 1000, 3)
+            votes["handler_p99_ms"] = round(percentile(handler_latencies, 99) * 1000, 3)
+
+            # Poll deletion
+            slack.reset_log()
+            start = time.monotonic()
+            tenant.delete_previous_messages()
+            tenant.deletion_job.wait_idle()
+            duration = time.monotonic() - start
+            deleted = [t - start for method, t, _ in slack.log if method == "chat.delete"]
+            deletion = summarize("deletion", len(deleted), duration, deleted, slack.calls, slack.throttled)
+
+        results["phases"] = [delivery, votes, deletion]
+        os.chdir(REPO_DIR)
+    return results
+
+
+def print_table(all_results: List[Dict[str, Any]]) -> None:
+    header = f"{'users':>7} {'phase':<9} {'count':>7} {'time s':>8} {'per s':>9} {'p50 ms':>9} {'p99 ms':>9} {'calls':>7} {'429s':>5}"
+    print(header)
+    print("-" * len(header))
+    for result in all_results:
+        for phase in result["phases"]:
+            print(f"{result['users']:>7} {phase['phase']:<9} {phase['count']:>7} {phase['duration_s']:>8.2f} "
+                  f"{phase['throughput_per_s']:>9.1f} {phase['p50_ms']:>9.1f} {phase['p99_ms']:>9.1f} "
+                  f"{phase['api_calls']:>7} {phase['throttled']:>5}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="audience sizes to benchmark")
+    parser.add_argument("--latency", type=float, default=5.0, help="fake API latency per call in ms")
+    parser.add_argument("--throttle-probability", type=float, default=0.001,
+                        help="probability that a call is answered with a 429")
+    parser.add_argument("--server-rate-limit", type=int, default=0,
+                        help="calls per second per method before the fake API answers 429 (0: unlimited)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--workers", type=int, default=16, help="fan-out worker threads")
+    parser.add_argument("--runtime", choices=["sync", "async"], default="sync",
+                        help="sync worker threads or the asyncio runtime")
+    parser.add_argument("--handler-threads", type=int, default=10,
+                        help="concurrent action handlers, like Bolt's thread pool")
+    parser.add_argument("--debounce", type=float, default=2.0, help="summary refresh window in seconds")
+    parser.add_argument("--summary-mode", choices=["dm", "channel", "app_home"], default="dm")
+    parser.add_argument("--poll-mode", choices=["daily", "weekly"], default="daily",
+                        help="one poll per workday or one poll covering the week")
+    parser.add_argument("--slack-tiers", action="store_true",
+                        help="use the configured Slack rate limits instead of unlimited client budgets")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    if args.single is not None:
+        print(RESULT_PREFIX + json.dumps(run_single(args)))
+        return
+
+    passthrough = [arg for arg in sys.argv[1:] if arg != "--json"]
+    if "--users" in passthrough:
+        index = passthrough.index("--users")
+        end = index + 1
+        while end < len(passthrough) and not passthrough[end].startswith("--"):
+            end += 1
+        del passthrough[index:end]
+
+    all_results = []
+    for users in args.users:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--single", str(users)] + passthrough,
+            capture_output=True, text=True, check=True
+        ).stdout
+        line = next(line for line in output.splitlines() if line.startswith(RESULT_PREFIX))
+        all_results.append(json.loads(line[len(RESULT_PREFIX):]))
+
+    if args.json:
+        print(json.dumps(all_results, indent=2))
+    else:
+        print_table(all_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,37 @@
 import json
+import logging
 import os
-from typing import Dict, List, Any
+import re
+import string
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 import pytz
 
+logger = logging.getLogger(__name__)
+
+DAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Placeholders each template may use
+TEMPLATE_FIELDS = {
+    'message_template': {'date'},
+    'summary_template': {'date', 'coming_count', 'coming_users', 'not_coming_count', 'not_coming_users',
+                         'maybe_count', 'maybe_users'},
+    'week_template': {'date', 'end'},
+}
+
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
 class ConfigurationError(Exception):
     pass
 
+
+def template_fields(template: str) -> Set[str]:
+    """Names of the placeholders in a format string, raises ValueError if it does not parse"""
+    return {re.split(r"[.\[]", field)[0] for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+
 class Config:
     def __init__(self, config_path: str = None):
         self.config_path = config_path
@@ -44,8 +70,25 @@ class Config:
         """Validate the configuration settings"""
         self._validate_schedule()
         self._validate_workdays()
+        self._validate_poll_mode()
         self._validate_response_options()
         self._validate_templates()
+        self._validate_summary_refresh()
+        self._validate_summary_mode()
+        self._validate_summary_layout()
+        self._validate_fan_out()
+        self._validate_outbox()
+        self._validate_runtime()
+        self._validate_dispatch()
+        self._validate_dm_channel_cache()
+        self._validate_storage()
+        self._validate_retention()
+        self._validate_replicas()
+        self._validate_metrics()
+        self._validate_tracing()
+        self._validate_profiler()
+        self._validate_logging()
+        self._validate_hot_reload()
 
     def _validate_schedule(self) -> None:
         """Validate schedule settings"""
@@ -61,22 +104,33 @@ class Config:
         if not isinstance(minute, int) or minute < 0 or minute > 59:
             raise ConfigurationError("Schedule minute must be an integer between 0 and 59")
 
-        # Validate timezone
+        # Validate timezone, a lookup instead of a scan over every known name
         timezone = schedule.get('timezone')
-        if timezone not in pytz.all_timezones:
+        try:
+            pytz.timezone(timezone)
+        except (pytz.UnknownTimeZoneError, AttributeError):
             raise ConfigurationError(f"Invalid timezone: {timezone}")
 
     def _validate_workdays(self) -> None:
         """Validate workday settings"""
         workdays = self.settings.get('workdays', {})
-        required_days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        
-        for day in required_days:
+        for day in DAY_NAMES:
             if day not in workdays:
                 raise ConfigurationError(f"Missing workday configuration for {day}")
             if not isinstance(workdays[day], bool):
                 raise ConfigurationError(f"Workday value for {day} must be a boolean")
 
+    def _validate_poll_mode(self) -> None:
+        """Validate poll mode settings"""
+        poll_mode = self.settings.get('poll_mode', {})
+        mode = poll_mode.get('mode')
+        if mode not in ['daily', 'weekly']:
+            raise ConfigurationError(f"Poll mode must be 'daily' or 'weekly', got: {mode}")
+        weekday = poll_mode.get('weekday')
+        if weekday not in DAY_NAMES:
+            raise ConfigurationError(f"Poll mode weekday must be a day name, got: {weekday}")
+        self._validate_template('week_template', poll_mode.get('week_template'))
+
     def _validate_response_options(self) -> None:
         """Validate response options"""
         options = self.settings.get('response_options', [])
@@ -90,14 +144,202 @@ class Config:
             for key in required_keys:
                 if key not in option:
                     raise ConfigurationError(f"Response option missing required key: {key}")
+        action_ids = [option['action_id'] for option in options]
+        if len(set(action_ids)) != len(action_ids):
+            raise ConfigurationError("Response option action_ids must be unique")
 
     def _validate_templates(self) -> None:
         """Validate message templates"""
         required_templates = ['message_template', 'summary_template']
         for template_name in required_templates:
-            template = self.settings.get(template_name)
-            if not isinstance(template, str) or not template:
-                raise ConfigurationError(f"{template_name} must be a non-empty string")
+            self._validate_template(template_name, self.settings.get(template_name))
+
+    @staticmethod
+    def _validate_template(template_name: str, template: Any) -> None:
+        if not isinstance(template, str) or not template:
+            raise ConfigurationError(f"{template_name} must be a non-empty string")
+        try:
+            unknown = template_fields(template) - TEMPLATE_FIELDS[template_name]
+        except ValueError as e:
+            raise ConfigurationError(f"{template_name} is not a valid template: {e}")
+        if unknown:
+            raise ConfigurationError(f"{template_name} has unknown placeholders: {', '.join(sorted(unknown))}")
+
+    def _validate_summary_refresh(self) -> None:
+        """Validate summary refresh settings"""
+        refresh = self.settings.get('summary_refresh', {})
+        debounce = refresh.get('debounce_seconds')
+        if isinstance(debounce, bool) or not isinstance(debounce, (int, float)) or debounce < 0:
+            raise ConfigurationError("Summary refresh debounce_seconds must be a non-negative number")
+
+    def _validate_summary_mode(self) -> None:
+        """Validate summary mode settings"""
+        summary_mode = self.settings.get('summary_mode', {})
+        mode = summary_mode.get('mode')
+        if mode not in ['dm', 'channel', 'app_home']:
+            raise ConfigurationError(f"Summary mode must be 'dm', 'channel' or 'app_home', got: {mode}")
+        channel = summary_mode.get('channel')
+        if not isinstance(channel, str):
+            raise ConfigurationError("Summary channel must be a string")
+        if mode == 'channel' and not channel:
+            raise ConfigurationError("Summary mode 'channel' requires a summary channel ID")
+
+    def _validate_summary_layout(self) -> None:
+        """Validate summary layout settings"""
+        layout = self.settings.get('summary_layout', {})
+        style = layout.get('style')
+        if style not in ['full', 'compact']:
+            raise ConfigurationError(f"Summary layout style must be 'full' or 'compact', got: {style}")
+        for key in ['preview_names', 'page_size']:
+            value = layout.get(key)
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                raise ConfigurationError(f"Summary layout {key} must be a positive integer")
+        if layout['page_size'] > 200:
+            raise ConfigurationError("Summary layout page_size must be at most 200")
+
+    def _validate_fan_out(self) -> None:
+        """Validate fan-out settings"""
+        fan_out = self.settings.get('fan_out', {})
+        for key in ['max_workers', 'max_retries']:
+            value = fan_out.get(key)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ConfigurationError(f"Fan-out {key} must be a non-negative integer")
+        if fan_out['max_workers'] == 0:
+            raise ConfigurationError("Fan-out max_workers must be at least 1")
+
+        rate_limits = fan_out.get('rate_limits', {})
+        if not isinstance(rate_limits, dict):
+            raise ConfigurationError("Fan-out rate_limits must be a dictionary")
+        for method, rate in rate_limits.items():
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate <= 0:
+                raise ConfigurationError(f"Rate limit for {method} must be a positive number")
+
+    def _validate_outbox(self) -> None:
+        """Validate outbox settings"""
+        outbox = self.settings.get('outbox', {})
+        max_attempts = outbox.get('max_attempts')
+        if isinstance(max_attempts, bool) or not isinstance(max_attempts, int) or max_attempts <= 0:
+            raise ConfigurationError("Outbox max_attempts must be a positive integer")
+        for key in ['base_delay_seconds', 'max_delay_seconds']:
+            value = outbox.get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ConfigurationError(f"Outbox {key} must be a positive number")
+        if outbox['max_delay_seconds'] < outbox['base_delay_seconds']:
+            raise ConfigurationError("Outbox max_delay_seconds must not be below base_delay_seconds")
+
+    def _validate_runtime(self) -> None:
+        """Validate runtime settings"""
+        runtime = self.settings.get('runtime', {})
+        mode = runtime.get('mode')
+        if mode not in ['sync', 'async']:
+            raise ConfigurationError(f"Runtime mode must be 'sync' or 'async', got: {mode}")
+        for key in ['max_concurrency', 'connection_limit']:
+            value = runtime.get(key)
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                raise ConfigurationError(f"Runtime {key} must be a positive integer")
+
+    def _validate_dispatch(self) -> None:
+        """Validate dispatch settings"""
+        dispatch = self.settings.get('dispatch', {})
+        mode = dispatch.get('mode')
+        if mode not in ['immediate', 'window']:
+            raise ConfigurationError(f"Dispatch mode must be 'immediate' or 'window', got: {mode}")
+
+        window = dispatch.get('window_minutes')
+        if isinstance(window, bool) or not isinstance(window, int) or window < 1 or window > 720:
+            raise ConfigurationError("Dispatch window_minutes must be an integer between 1 and 720")
+
+        for key in ['safety_margin_seconds', 'call_latency_seconds']:
+            value = dispatch.get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ConfigurationError(f"Dispatch {key} must be a non-negative number")
+
+    def _validate_dm_channel_cache(self) -> None:
+        """Validate DM channel cache settings"""
+        path = self.settings.get('dm_channel_cache', {}).get('path')
+        if not isinstance(path, str) or not path:
+            raise ConfigurationError("DM channel cache path must be a non-empty string")
+
+    def _validate_storage(self) -> None:
+        """Validate storage settings"""
+        storage = self.settings.get('storage', {})
+        backend = storage.get('backend')
+        if backend not in ['sqlite', 'memory']:
+            raise ConfigurationError(f"Storage backend must be 'sqlite' or 'memory', got: {backend}")
+        if backend == 'sqlite' and (not isinstance(storage.get('path'), str) or not storage['path']):
+            raise ConfigurationError("SQLite storage path must be a non-empty string")
+
+    def _validate_retention(self) -> None:
+        """Validate retention settings"""
+        retention = self.settings.get('retention', {})
+        for key in ['max_tracked_polls', 'cold_storage_days']:
+            value = retention.get(key)
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ConfigurationError(f"Retention {key} must be a positive integer")
+
+    def _validate_replicas(self) -> None:
+        """Validate replica settings"""
+        replicas = self.settings.get('replicas', {})
+        if not isinstance(replicas.get('enabled'), bool):
+            raise ConfigurationError("Replicas enabled must be a boolean")
+        if not isinstance(replicas.get('lease_path'), str) or not replicas['lease_path']:
+            raise ConfigurationError("Replicas lease_path must be a non-empty string")
+        for key in ['lease_seconds', 'renew_seconds', 'sync_seconds']:
+            value = replicas.get(key)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ConfigurationError(f"Replicas {key} must be a positive number")
+        if replicas['renew_seconds'] >= replicas['lease_seconds']:
+            raise ConfigurationError("Replicas renew_seconds must be shorter than lease_seconds")
+        if replicas['enabled'] and self.settings.get('storage', {}).get('backend') != 'sqlite':
+            raise ConfigurationError("Running replicas requires the sqlite storage backend on a shared volume")
+
+    def _validate_metrics(self) -> None:
+        """Validate metrics settings"""
+        metrics = self.settings.get('metrics', {})
+        if not isinstance(metrics.get('enabled'), bool):
+            raise ConfigurationError("Metrics enabled must be a boolean")
+        if not isinstance(metrics.get('host'), str) or not metrics['host']:
+            raise ConfigurationError("Metrics host must be a non-empty string")
+        port = metrics.get('port')
+        if isinstance(port, bool) or not isinstance(port, int) or port < 1 or port > 65535:
+            raise ConfigurationError("Metrics port must be an integer between 1 and 65535")
+
+    def _validate_tracing(self) -> None:
+        """Validate tracing settings"""
+        tracing = self.settings.get('tracing', {})
+        if not isinstance(tracing.get('enabled'), bool):
+            raise ConfigurationError("Tracing enabled must be a boolean")
+        if not isinstance(tracing.get('path'), str) or not tracing['path']:
+            raise ConfigurationError("Tracing path must be a non-empty string")
+
+    def _validate_profiler(self) -> None:
+        """Validate sampling profiler settings"""
+        profiler = self.settings.get('profiler', {})
+        if not isinstance(profiler.get('enabled'), bool):
+            raise ConfigurationError("Profiler enabled must be a boolean")
+        interval = profiler.get('interval_ms')
+        if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+            raise ConfigurationError("Profiler interval_ms must be a positive number")
+        max_stacks = profiler.get('max_stacks')
+        if isinstance(max_stacks, bool) or not isinstance(max_stacks, int) or max_stacks <= 0:
+            raise ConfigurationError("Profiler max_stacks must be a positive integer")
+        if not isinstance(profiler.get('path'), str) or not profiler['path']:
+            raise ConfigurationError("Profiler path must be a non-empty string")
+
+    def _validate_logging(self) -> None:
+        """Validate logging settings"""
+        level = self.settings.get('logging', {}).get('level')
+        if level not in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
+            raise ConfigurationError(f"Logging level must be one of DEBUG, INFO, WARNING, ERROR, CRITICAL, got: {level}")
+
+    def _validate_hot_reload(self) -> None:
+        """Validate hot reload settings"""
+        hot_reload = self.settings.get('hot_reload', {})
+        if not isinstance(hot_reload.get('enabled'), bool):
+            raise ConfigurationError("Hot reload enabled must be a boolean")
+        interval = hot_reload.get('interval_seconds')
+        if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+            raise ConfigurationError("Hot reload interval_seconds must be a positive number")
 
     def get_schedule(self) -> Dict[str, Any]:
         return self.settings['poll_schedule']
@@ -105,6 +347,9 @@ class Config:
     def get_workdays(self) -> Dict[str, bool]:
         return self.settings['workdays']
 
+    def get_poll_mode(self) -> Dict[str, Any]:
+        return self.settings['poll_mode']
+
     def get_response_options(self) -> List[Dict[str, str]]:
         return self.settings['response_options']
 
@@ -114,6 +359,58 @@ class Config:
     def get_summary_template(self) -> str:
         return self.settings['summary_template']
 
+    def get_summary_refresh(self) -> Dict[str, Any]:
+        return self.settings['summary_refresh']
+
+    def get_summary_mode(self) -> Dict[str, Any]:
+        return self.settings['summary_mode']
+
+    def get_summary_layout(self) -> Dict[str, Any]:
+        return self.settings['summary_layout']
+
+    def get_fan_out(self) -> Dict[str, Any]:
+        return self.settings['fan_out']
+
+    def get_outbox(self) -> Dict[str, Any]:
+        return self.settings['outbox']
+
+    def get_runtime(self) -> Dict[str, Any]:
+        return self.settings['runtime']
+
+    def get_dispatch(self) -> Dict[str, Any]:
+        return self.settings['dispatch']
+
+    def get_dm_channel_cache(self) -> Dict[str, Any]:
+        return self.settings['dm_channel_cache']
+
+    def get_storage(self) -> Dict[str, Any]:
+        return self.settings['storage']
+
+    def get_retention(self) -> Dict[str, int]:
+        return self.settings['retention']
+
+    def get_replicas(self) -> Dict[str, Any]:
+        return self.settings['replicas']
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.settings['metrics']
+
+    def get_tracing(self) -> Dict[str, Any]:
+        return self.settings['tracing']
+
+    def get_profiler(self) -> Dict[str, Any]:
+        return self.settings['profiler']
+
+    def get_logging(self) -> Dict[str, Any]:
+        return self.settings['logging']
+
+    def get_hot_reload(self) -> Dict[str, Any]:
+        return self.settings['hot_reload']
+
+    def compile(self, previous: Optional['CompiledConfig'] = None) -> 'CompiledConfig':
+        """Precompute the validated settings for the hot paths, see :class:`CompiledConfig`"""
+        return CompiledConfig(self, previous)
+
     def save_custom_config(self, config_path: str = None) -> None:
         """Save current configuration to a file"""
         save_path = config_path or self.config_path
@@ -124,4 +421,127 @@ class Config:
             with open(save_path, 'w') as f:
                 json.dump(self.settings, f, indent=4)
         except Exception as e:
-            raise ConfigurationError(f"Failed to save configuration: {str(e)}") 
\ No newline at end of file
+            raise ConfigurationError(f"Failed to save configuration: {str(e)}") 
+
+
+class CompiledConfig:
+    """Immutable settings of one validated configuration, precomputed for the hot paths
+
+    The timezone is resolved once, workdays are a bitmask over
+    ``date.weekday()``, the templates have been checked for their placeholders
+    and the response options are an action ID to value map, which routes votes
+    to their answer. A reloaded configuration is compiled into a new object
+    that replaces the old one, so readers always see one consistent version.
+
+    ``previous`` is the configuration this one replaces. Action IDs it knew
+    that are gone now still route to their answer, so buttons of messages sent
+    before a reload keep working.
+    """
+
+    __slots__ = ('config', 'timezone', 'workday_mask', 'weekly', 'poll_weekday', 'message_template',
+                 'summary_template', 'week_template', 'response_options', 'actions', 'retired_actions')
+
+    def __init__(self, config: Config, previous: Optional['CompiledConfig'] = None):
+        poll_mode = config.get_poll_mode()
+        actions = {option['action_id']: option['value'] for option in config.get_response_options()}
+        retired = {}
+        if previous is not None:
+            retired = {**previous.retired_actions, **previous.actions}
+            for action_id in actions:
+                retired.pop(action_id, None)
+
+        set_value = super().__setattr__
+        set_value('config', config)
+        set_value('timezone', pytz.timezone(config.get_schedule()['timezone']))
+        set_value('workday_mask', sum(1 << index for index, day in enumerate(DAY_NAMES)
+                                      if config.get_workdays()[day]))
+        set_value('weekly', poll_mode['mode'] == 'weekly')
+        set_value('poll_weekday', DAY_NAMES.index(poll_mode['weekday']))
+        set_value('message_template', config.get_message_template())
+        set_value('summary_template', config.get_summary_template())
+        set_value('week_template', poll_mode['week_template'])
+        set_value('response_options', tuple(MappingProxyType(dict(option))
+                                            for option in config.get_response_options()))
+        set_value('actions', MappingProxyType(actions))
+        set_value('retired_actions', MappingProxyType(retired))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("CompiledConfig is immutable")
+
+    def is_workday(self, day) -> bool:
+        return bool(self.workday_mask >> day.weekday() & 1)
+
+    @staticmethod
+    def day_action_id(action_id: str, day: str) -> str:
+        """Action ID of an answer button for one day of a weekly poll"""
+        return f"{action_id}_{day}"
+
+    def vote(self, action_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """The answer of an action ID and, for a weekly poll's buttons, its date
+
+        Returns None for actions that are not answer buttons.
+        """
+        value = self.actions.get(action_id) or self.retired_actions.get(action_id)
+        if value is not None:
+            return value, None
+        base, _, day = action_id.rpartition("_")
+        value = self.actions.get(base) or self.retired_actions.get(base)
+        if value is not None and DATE_PATTERN.match(day):
+            return value, day
+        return None
+
+
+class ConfigWatcher:
+    """Watches a custom configuration file and hands every valid new version to ``on_change``
+
+    The file is checked every ``interval`` seconds by its modification time,
+    size and inode, so an editor that replaces the file is picked up too. A
+    version that does not load or validate is logged and skipped, and the
+    running configuration stays in place.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[Config], None], interval: float = 2.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._stamp = self._read_stamp()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def check(self) -> bool:
+        """Load the file if it changed since the last check, returns whether a new version was applied"""
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            config = Config(self.path)
+            config.validate()
+        except ConfigurationError as e:
+            logger.error("Ignoring invalid configuration in %s: %s", self.path, e)
+            return False
+        try:
+            self.on_change(config)
+        except Exception as e:
+            logger.exception("Error applying configuration from %s: %s", self.path, e)
+            return False
+        logger.info("Reloaded configuration from %s", self.path)
+        return True
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check()
@@ -0,0 +1,119 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from slack_sdk.errors import SlackApiError
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# chat.delete errors that mean there is nothing left to delete
+GONE_ERRORS = {"message_not_found", "channel_not_found", "is_archived"}
+
+MessageKey = Tuple[str, str]
+
+
+class DeletionJob:
+    """Deletes the messages of retired polls on a background thread
+
+    Messages are checkpointed in the state store before the job picks them up
+    and are removed from the checkpoint one by one as they are deleted, so a
+    restart can resume where the job stopped. Deletions that fail stay
+    checkpointed and are retried with the next batch or after a restart.
+    """
+
+    def __init__(self, fan_out, store):
+        self.fan_out = fan_out
+        self.store = store
+        self.deleted = 0
+        self._pending: Dict[MessageKey, Dict[str, str]] = {}
+        self._failed: Dict[MessageKey, Dict[str, str]] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, poll_date: str, messages: List[Dict[str, str]]) -> None:
+        """Retire a poll in the store and delete its messages in the background"""
+        self.store.retire_poll(poll_date, messages)
+        with self._lock:
+            for message in messages:
+                self._pending[(message["channel"], message["ts"])] = message
+            # Give earlier failures another chance along with the new batch
+            self._pending.update(self._failed)
+            self._failed = {}
+        self._start()
+
+    def resume(self) -> None:
+        """Pick up deletions checkpointed before the last shutdown"""
+        messages = self.store.load_pending_deletions()
+        if not messages:
+            return
+        with self._lock:
+            for message in messages:
+                self._pending[(message["channel"], message["ts"])] = message
+        logger.info("Resuming deletion of %d messages from retired polls", len(messages))
+        self._start()
+
+    def progress(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pending": len(self._pending) + self._in_flight,
+                "deleted": self.deleted,
+                "failed": len(self._failed),
+            }
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted deletion has been attempted"""
+        return self._idle.wait(timeout)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None or not self._pending:
+                return
+            self._idle.clear()
+            self._thread = threading.Thread(target=self._run, name="poll-deletion", daemon=True)
+            self._thread.start()
+
+    def _delete(self, message: Dict[str, str]) -> None:
+        try:
+            self.fan_out.call("chat.delete", channel=message["channel"], ts=message["ts"])
+        except SlackApiError as e:
+            if e.response.get("error") not in GONE_ERRORS:
+                raise
+
+    async def _delete_async(self, message: Dict[str, str]) -> None:
+        try:
+            await self.fan_out.acall("chat.delete", channel=message["channel"], ts=message["ts"])
+        except SlackApiError as e:
+            if e.response.get("error") not in GONE_ERRORS:
+                raise
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                batch = list(self._pending.values())
+                self._pending = {}
+                self._in_flight = len(batch)
+                if not batch:
+                    self._thread = None
+                    self._idle.set()
+                    return
+
+            with tracer.span("poll.cleanup", messages=len(batch)):
+                delete = self._delete_async if self.fan_out.asynchronous else self._delete
+                report = self.fan_out.run(batch, delete, label="poll deletion",
+                                          describe=lambda message: {"channel": message["channel"]},
+                                          method="chat.delete")
+
+            for message, _ in report.succeeded:
+                self.store.complete_deletion(message["channel"], message["ts"])
+            with self._lock:
+                self.deleted += len(report.succeeded)
+                self._in_flight = 0
+                for message, e in report.failed:
+                    self._failed[(message["channel"], message["ts"])] = message
+            for message, e in report.failed:
+                logger.error("Error deleting message %s in %s: %s", message["ts"], message["channel"], e)
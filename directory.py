@@ -0,0 +1,116 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def is_eligible(user: Dict[str, Any]) -> bool:
+    """Whether a Slack user should receive attendance polls"""
+    # Skip bots, deleted users, and slackbot
+    return not (user.get("is_bot", False) or
+                user.get("deleted", False) or
+                user.get("name") == "slackbot")
+
+
+class UserDirectory:
+    """Local directory of poll recipients kept current from Slack events
+
+    Muted users stay in the directory but are left out of :meth:`recipients`,
+    which is kept ready to send as users join, change, mute and unmute.
+    """
+
+    def __init__(self, page_size: int = 200):
+        self.page_size = page_size
+        self.loaded = False
+        self._users: Dict[str, Dict[str, str]] = {}
+        self._muted: Set[str] = set()
+        self._recipients: Dict[str, Dict[str, str]] = {}
+        # Events applied while a bootstrap is paging, replayed over its result
+        self._events: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._bootstrap_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def bootstrap(self, call: Callable[..., Any]) -> None:
+        """Load every workspace member page by page through ``call("users.list", ...)``
+
+        Users who join or change while the pages load are replayed over the
+        loaded members, so the events win over the possibly older pages.
+        """
+        with self._lock:
+            self._events = []
+        users = {}
+        cursor = None
+        try:
+            while True:
+                kwargs = {"limit": self.page_size}
+                if cursor:
+                    kwargs["cursor"] = cursor
+                result = call("users.list", **kwargs)
+                for member in result["members"]:
+                    if is_eligible(member):
+                        users[member["id"]] = self._compact(member)
+                cursor = (result.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+        except Exception:
+            with self._lock:
+                self._events = None
+            raise
+
+        with self._lock:
+            for user in self._events:
+                if is_eligible(user):
+                    users[user["id"]] = self._compact(user)
+                else:
+                    users.pop(user["id"], None)
+            self._events = None
+            self._users = users
+            self._recipients = {user_id: user for user_id, user in users.items() if user_id not in self._muted}
+            self.loaded = True
+        logger.info("Loaded %d poll recipients into the user directory", len(users))
+
+    def ensure_loaded(self, call: Callable[..., Any]) -> None:
+        """Bootstrap the directory unless it has already been loaded"""
+        with self._bootstrap_lock:
+            if not self.loaded:
+                self.bootstrap(call)
+
+    def apply(self, user: Dict[str, Any]) -> None:
+        """Apply a user object from a ``team_join`` or ``user_change`` event"""
+        with self._lock:
+            if self._events is not None:
+                self._events.append(user)
+            if is_eligible(user):
+                self._users[user["id"]] = self._compact(user)
+                if user["id"] not in self._muted:
+                    self._recipients[user["id"]] = self._users[user["id"]]
+            else:
+                self._users.pop(user["id"], None)
+                self._recipients.pop(user["id"], None)
+
+    def set_muted(self, user_id: str, muted: bool) -> None:
+        """Leave a user out of the recipients while they are muted"""
+        with self._lock:
+            if muted:
+                self._muted.add(user_id)
+                self._recipients.pop(user_id, None)
+            else:
+                self._muted.discard(user_id)
+                if user_id in self._users:
+                    self._recipients[user_id] = self._users[user_id]
+
+    def get(self, user_id: str) -> Optional[Dict[str, str]]:
+        return self._users.get(user_id)
+
+    def recipients(self) -> List[Dict[str, str]]:
+        """Return the current eligible recipients who have not muted the bot"""
+        with self._lock:
+            return list(self._recipients.values())
+
+    @staticmethod
+    def _compact(user: Dict[str, Any]) -> Dict[str, str]:
+        return {"id": user["id"], "name": user["name"]}
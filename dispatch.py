@@ -0,0 +1,83 @@
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+
+class DispatchPlan:
+    """When to start sending a poll so that it is delivered by the deadline"""
+
+    def __init__(self, deadline: datetime, start_at: datetime, recipients: int, estimated_seconds: float):
+        self.deadline = deadline
+        self.start_at = start_at
+        self.recipients = recipients
+        self.estimated_seconds = estimated_seconds
+
+    @property
+    def finish_at(self) -> datetime:
+        """When the last recipient is expected to get the poll"""
+        return self.start_at + timedelta(seconds=self.estimated_seconds)
+
+    @property
+    def lead_seconds(self) -> float:
+        """How long before the deadline the first recipients get the poll"""
+        return (self.deadline - self.start_at).total_seconds()
+
+    @property
+    def late(self) -> bool:
+        """Whether delivery cannot finish by the deadline"""
+        return self.finish_at > self.deadline
+
+    def __repr__(self) -> str:
+        return (f"DispatchPlan(recipients={self.recipients}, start_at={self.start_at:%H:%M:%S}, "
+                f"deadline={self.deadline:%H:%M:%S}, estimated={self.estimated_seconds:.1f}s)")
+
+
+class DispatchPlanner:
+    """Estimates delivery time from rate limits and audience size
+
+    The fan-out engine lets roughly ten seconds worth of calls go out in a burst
+    and is then limited by the per-method rate. Delivery also cannot be faster
+    than the worker pool can complete round trips.
+
+    Sending starts so that it finishes at the deadline, with no more slack
+    than the delivery itself takes: a small audience gets the poll within
+    seconds of the deadline, a large one is spread over the time the rate
+    limits require and no longer.
+    """
+
+    def __init__(self, rate_limits: Dict[str, float], max_workers: int,
+                 call_latency: float = 0.3, safety_margin: float = 30.0):
+        self.rate_limits = rate_limits
+        self.max_workers = max_workers
+        self.call_latency = call_latency
+        self.safety_margin = safety_margin
+
+    def _method_seconds(self, method: str, calls: int) -> float:
+        rate = self.rate_limits.get(method, 20) / 60.0
+        burst = max(1.0, rate * 10)
+        return max(0.0, calls - burst) / rate
+
+    def estimate_seconds(self, recipients: int, unopened: int = 0) -> float:
+        """Estimated time to deliver to ``recipients``, ``unopened`` of them without a known DM"""
+        if recipients <= 0:
+            return 0.0
+        calls_per_worker = math.ceil((recipients + unopened) / self.max_workers)
+        return max(
+            self._method_seconds("chat.postMessage", recipients),
+            self._method_seconds("conversations.open", unopened),
+            calls_per_worker * self.call_latency,
+        )
+
+    def plan(self, deadline: datetime, recipients: int, unopened: int = 0,
+             earliest: Optional[datetime] = None) -> DispatchPlan:
+        """Plan a delivery that finishes just before the deadline, starting no earlier than ``earliest``
+
+        The safety margin covers errors in the estimate, which grow with it,
+        so it is never larger than the estimated delivery time itself.
+        """
+        estimated = self.estimate_seconds(recipients, unopened)
+        margin = min(self.safety_margin, estimated)
+        start_at = deadline - timedelta(seconds=estimated + margin)
+        if earliest is not None and start_at < earliest:
+            start_at = earliest
+        return DispatchPlan(deadline, start_at, recipients, estimated)
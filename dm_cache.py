@@ -0,0 +1,100 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Errors from chat.postMessage/chat.update that mean a cached DM channel is stale; errors such as
+# cannot_dm_bot are permanent for the user, so reopening the channel would only fail again
+STALE_CHANNEL_ERRORS = {"channel_not_found", "is_archived"}
+
+
+class DMChannelCache:
+    """Persisted mapping of user IDs to their DM channel IDs with the bot
+
+    Replicas on a shared volume can use the same file. A save merges the
+    changes since the last save into what is on disk under an exclusive lock,
+    so one replica's save never drops the channels another one learned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._channels: Dict[str, str] = {}
+        # Changes since the last save, merged into the file by the next one
+        self._changed: Dict[str, str] = {}
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._channels = self._read()
+
+    def _read(self) -> Dict[str, str]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning("Ignoring unreadable DM channel cache %s: %s", self.path, e)
+            return {}
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def get(self, user_id: str) -> Optional[str]:
+        return self._channels.get(user_id)
+
+    def set(self, user_id: str, channel_id: str) -> None:
+        with self._lock:
+            if self._channels.get(user_id) != channel_id:
+                self._channels[user_id] = channel_id
+                self._changed[user_id] = channel_id
+                self._removed.discard(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            if self._channels.pop(user_id, None) is not None:
+                self._changed.pop(user_id, None)
+                self._removed.add(user_id)
+
+    def save(self) -> None:
+        """Merge the changes since the last save into the file on disk"""
+        with self._lock:
+            if not self._changed and not self._removed:
+                return
+            changed, removed = self._changed, self._removed
+            self._changed, self._removed = {}, set()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Unique per process and thread, so concurrent saves never share a temp file
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(f"{self.path}.lock", 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                channels = self._read()
+                channels.update(changed)
+                for user_id in removed:
+                    channels.pop(user_id, None)
+                with open(tmp_path, 'w') as f:
+                    json.dump(channels, f)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            with self._lock:
+                # Keep the changes for the next save, unless newer ones replaced them
+                for user_id, channel_id in changed.items():
+                    if user_id not in self._removed:
+                        self._changed.setdefault(user_id, channel_id)
+                for user_id in removed:
+                    if user_id not in self._changed:
+                        self._removed.add(user_id)
+            logger.error("Error saving DM channel cache: %s", e)
+            return
+
+        with self._lock:
+            # Pick up the channels other replicas saved, but not ones invalidated here since
+            for user_id, channel_id in channels.items():
+                if user_id not in self._removed:
+                    self._channels.setdefault(user_id, channel_id)
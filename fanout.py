@@ -0,0 +1,465 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, as_completed
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple
+
+from slack_sdk.errors import SlackApiError
+
+from metrics import FAN_OUT_DURATION, FAN_OUT_FAILURES, FAN_OUT_QUEUE_DEPTH
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Calls per minute for the Slack Web API methods the bot uses, following
+# Slack's published rate limit tiers (Tier 2: 20+, Tier 3: 50+). chat.postMessage
+# has a "special" limit of roughly one message per second per channel, so a
+# workspace-wide budget is used for it instead.
+DEFAULT_RATE_LIMITS = {
+    "users.list": 20,
+    "conversations.open": 50,
+    "chat.postMessage": 600,
+    "chat.update": 50,
+    "chat.delete": 50,
+}
+
+
+def retry_after(error: SlackApiError) -> float:
+    """Seconds Slack asked to wait after a 429 response, whatever the case of the header name"""
+    for name, value in (error.response.headers or {}).items():
+        if name.lower() == "retry-after":
+            return float(value)
+    return 1.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed rate per minute"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        # Allow roughly ten seconds worth of calls to go out in a burst
+        self.capacity = max(1.0, burst if burst is not None else self.rate * 10)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available and return 0, or else return the seconds until there is one"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Block until a token is available and take it"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the given time, e.g. after a 429 response"""
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0
+            self._updated = self._blocked_until
+
+
+class FanOutReport:
+    """Outcome of a fan-out run"""
+
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = total
+        self.succeeded: List[Tuple[Any, Any]] = []
+        self.failed: List[Tuple[Any, Exception]] = []
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def done(self) -> int:
+        return len(self.succeeded) + len(self.failed)
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+
+def log_progress(report: FanOutReport) -> None:
+    logger.info("%s: %d/%d done, %d failed, %.1fs elapsed",
+                report.label, report.done, report.total, len(report.failed), report.duration)
+
+
+# Token a worker took from a task's rate limit before running it, see FairExecutor.submit
+_reserved = threading.local()
+
+
+def take_reserved(bucket: "TokenBucket") -> bool:
+    """Use up the token reserved for the running task if it came from ``bucket``"""
+    if getattr(_reserved, "bucket", None) is bucket:
+        _reserved.bucket = None
+        return True
+    return False
+
+
+class FairExecutor:
+    """Worker pool shared by several tenants that takes turns between their queues
+
+    Tasks wait in a queue per tenant and per run. Idle workers serve the
+    tenants round-robin, and within a tenant its runs round-robin. A large
+    fan-out in one workspace therefore cannot hold back another workspace's
+    poll that is due at the same time, and a tenant's poll delivery does not
+    wait behind its own cleanup of the previous poll.
+
+    A run can name the token bucket its tasks draw from. A worker then takes
+    the token before it picks up a task and passes over runs whose bucket is
+    empty, so a throttled run waits in its queue instead of in the workers.
+    """
+
+    def __init__(self, max_workers: int = 16, name: str = "fan-out"):
+        self.max_workers = max_workers
+        self._queues: "OrderedDict[str, OrderedDict[Any, deque]]" = OrderedDict()
+        self._condition = threading.Condition()
+        for index in range(max_workers):
+            threading.Thread(target=self._work, name=f"{name}-{index}", daemon=True).start()
+
+    def submit(self, key: str, lane: Any, fn: Callable, *args, gate: Optional[TokenBucket] = None) -> Future:
+        """Queue ``fn(*args)`` for the tenant ``key`` in one of its ``lane`` queues
+
+        With a ``gate``, the task only starts once it got a token from it,
+        which its first call from that bucket uses through :func:`take_reserved`.
+        """
+        future: Future = Future()
+        with self._condition:
+            lanes = self._queues.setdefault(key, OrderedDict())
+            lanes.setdefault(lane, deque()).append((future, fn, args, gate))
+            self._condition.notify()
+        return future
+
+    def _next(self) -> Tuple[Optional[tuple], Optional[float]]:
+        # Take one task from the first lane that may run, trying the tenants in line and
+        # their lanes in line, then send that lane and tenant to the back of their lines.
+        # Returns the task, or None and the seconds until a throttled lane gets a token.
+        wait = None
+        for key, lanes in self._queues.items():
+            for lane, tasks in lanes.items():
+                gate = tasks[0][3]
+                delay = gate.try_acquire() if gate is not None else 0.0
+                if delay:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                task = tasks.popleft()
+                del lanes[lane]
+                if tasks:
+                    lanes[lane] = tasks
+                del self._queues[key]
+                if lanes:
+                    self._queues[key] = lanes
+                return task, None
+        return None, wait
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    task, wait = self._next() if self._queues else (None, None)
+                    if task is not None:
+                        break
+                    self._condition.wait(wait)
+            future, fn, args, gate = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            _reserved.bucket = gate
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                _reserved.bucket = None
+
+
+class FanOut:
+    """Runs Slack Web API calls for many recipients on a bounded worker pool
+
+    Every call goes through a per-method token bucket and is retried after the
+    ``Retry-After`` delay when Slack answers with HTTP 429. Fan-outs of
+    several tenants can share one :class:`FairExecutor`, each under its own
+    ``key``, while keeping their own rate limits.
+    """
+
+    asynchronous = False
+
+    def __init__(self, client, max_workers: int = 16, max_retries: int = 3,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 executor: Optional[FairExecutor] = None, key: str = "default"):
+        self.client = client
+        self.executor = executor or FairExecutor(max_workers)
+        self.max_workers = self.executor.max_workers
+        self.key = key
+        self.max_retries = max_retries
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS)
+        self.rate_limits.update(rate_limits or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+
+    def _bucket(self, method: str) -> TokenBucket:
+        with self._buckets_lock:
+            if method not in self._buckets:
+                self._buckets[method] = TokenBucket(self.rate_limits.get(method, 20))
+            return self._buckets[method]
+
+    def call(self, method: str, **kwargs) -> Any:
+        """Call a Web API method (e.g. ``chat.update``) within its rate limit"""
+        bucket = self._bucket(method)
+        api = getattr(self.client, method.replace(".", "_"))
+        attempt = 0
+        with tracer.span(f"slack.{method}") as span:
+            while True:
+                if not take_reserved(bucket):
+                    bucket.acquire()
+                try:
+                    return api(**kwargs)
+                except SlackApiError as e:
+                    if e.response.status_code != 429 or attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    delay = retry_after(e)
+                    span.set(retries=attempt, retry_after=delay)
+                    bucket.pause(delay)
+
+    def run(self, items: Iterable[Any], task: Callable[[Any], Any], label: str = "fan-out",
+            on_progress: Optional[Callable[[FanOutReport], None]] = log_progress,
+            progress_interval: float = 5.0,
+            describe: Optional[Callable[[Any], Dict[str, Any]]] = None,
+            method: Optional[str] = None) -> FanOutReport:
+        """Run ``task`` for every item concurrently and collect the results
+
+        ``task`` is expected to make its Slack calls through :meth:`call`.
+        ``describe`` returns span attributes for an item, e.g. its user ID, so
+        slow recipients can be found in the traces. ``method`` is the Slack
+        method every task calls, whose token is taken before the task gets a
+        worker, so tasks waiting for the rate limit do not hold workers.
+        """
+        items = list(items)
+        report = FanOutReport(label, len(items))
+        if not items:
+            report.finished = time.monotonic()
+            return report
+
+        def traced_task(item):
+            with tracer.span(label, **(describe(item) if describe else {})):
+                return task(item)
+
+        last_report = report.started
+        FAN_OUT_QUEUE_DEPTH.inc(len(items), tenant=self.key, kind=label)
+        # Each task runs in a copy of the caller's context so its spans join the caller's trace
+        gate = self._bucket(method) if method else None
+        futures = {
+            self.executor.submit(self.key, report, contextvars.copy_context().run, traced_task, item, gate=gate): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            FAN_OUT_QUEUE_DEPTH.dec(tenant=self.key, kind=label)
+            try:
+                report.succeeded.append((item, future.result()))
+            except Exception as e:
+                report.failed.append((item, e))
+                FAN_OUT_FAILURES.inc(tenant=self.key, kind=label)
+
+            now = time.monotonic()
+            if on_progress and now - last_report >= progress_interval:
+                last_report = now
+                on_progress(report)
+
+        report.finished = time.monotonic()
+        FAN_OUT_DURATION.observe(report.duration, tenant=self.key, kind=label)
+        if on_progress:
+            on_progress(report)
+        return report
+
+
+class EventLoopThread:
+    """An asyncio event loop running forever on a daemon thread
+
+    Threads such as the scheduler or the summary refresher hand coroutines to
+    it with :meth:`run`. Code already running on the loop awaits them instead.
+    """
+
+    def __init__(self, name: str = "slack-io"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def in_loop(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread until it is done
+
+        The coroutine runs in a copy of the calling thread's context, so its
+        spans join the caller's trace.
+        """
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("Blocking on the event loop thread would deadlock, await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(
+            self._in_context(coro, contextvars.copy_context()), self.loop
+        ).result(timeout)
+
+    @staticmethod
+    async def _in_context(coro: Coroutine, context: contextvars.Context) -> Any:
+        return await asyncio.get_running_loop().create_task(coro, context=context)
+
+
+class AsyncTokenBucket:
+    """Token bucket for coroutines on one event loop, refilled at a fixed rate per minute"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, burst if burst is not None else self.rate * 10)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it"""
+        while True:
+            now = time.monotonic()
+            if now >= self._blocked_until:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            else:
+                wait = self._blocked_until - now
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the given time, e.g. after a 429 response"""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0
+        self._updated = self._blocked_until
+
+
+class AsyncFanOut:
+    """:class:`FanOut` for an async Web client, running every call on one event loop
+
+    Tasks are coroutine functions. Thousands of them can wait on Slack at the
+    same time without a thread each; ``max_concurrency`` bounds how many run at
+    once. ``call`` and ``run`` block the calling thread, ``acall`` and ``arun``
+    are their coroutine versions for code on the loop.
+    """
+
+    asynchronous = True
+
+    def __init__(self, client, io: EventLoopThread, max_concurrency: int = 1000, max_retries: int = 3,
+                 rate_limits: Optional[Dict[str, float]] = None, key: str = "default"):
+        self.client = client
+        self.io = io
+        self.max_workers = max_concurrency
+        self.key = key
+        self.max_retries = max_retries
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS)
+        self.rate_limits.update(rate_limits or {})
+        # Only touched from the event loop thread
+        self._buckets: Dict[str, AsyncTokenBucket] = {}
+
+    def _bucket(self, method: str) -> AsyncTokenBucket:
+        if method not in self._buckets:
+            self._buckets[method] = AsyncTokenBucket(self.rate_limits.get(method, 20))
+        return self._buckets[method]
+
+    async def acall(self, method: str, **kwargs) -> Any:
+        """Call a Web API method (e.g. ``chat.update``) within its rate limit"""
+        bucket = self._bucket(method)
+        api = getattr(self.client, method.replace(".", "_"))
+        attempt = 0
+        with tracer.span(f"slack.{method}") as span:
+            while True:
+                await bucket.acquire()
+                try:
+                    return await api(**kwargs)
+                except SlackApiError as e:
+                    if e.response.status_code != 429 or attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    delay = retry_after(e)
+                    span.set(retries=attempt, retry_after=delay)
+                    bucket.pause(delay)
+
+    def call(self, method: str, **kwargs) -> Any:
+        return self.io.run(self.acall(method, **kwargs))
+
+    async def arun(self, items: Iterable[Any], task: Callable[[Any], Awaitable], label: str = "fan-out",
+                   on_progress: Optional[Callable[[FanOutReport], None]] = log_progress,
+                   progress_interval: float = 5.0,
+                   describe: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                   method: Optional[str] = None) -> FanOutReport:
+        """Await ``task`` for every item concurrently and collect the results
+
+        ``method`` is accepted for parity with :meth:`FanOut.run`. Tasks that
+        wait for a rate limit here only hold a coroutine, not a worker.
+        """
+        items = list(items)
+        report = FanOutReport(label, len(items))
+        if not items:
+            report.finished = time.monotonic()
+            return report
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def traced_task(item):
+            async with semaphore:
+                with tracer.span(label, **(describe(item) if describe else {})):
+                    try:
+                        return item, await task(item), None
+                    except Exception as e:
+                        return item, None, e
+
+        last_report = report.started
+        FAN_OUT_QUEUE_DEPTH.inc(len(items), tenant=self.key, kind=label)
+        # Tasks copy the caller's context when they are created, so their spans join the caller's trace
+        for finished in asyncio.as_completed([asyncio.ensure_future(traced_task(item)) for item in items]):
+            item, result, error = await finished
+            FAN_OUT_QUEUE_DEPTH.dec(tenant=self.key, kind=label)
+            if error is None:
+                report.succeeded.append((item, result))
+            else:
+                report.failed.append((item, error))
+                FAN_OUT_FAILURES.inc(tenant=self.key, kind=label)
+
+            now = time.monotonic()
+            if on_progress and now - last_report >= progress_interval:
+                last_report = now
+                on_progress(report)
+
+        report.finished = time.monotonic()
+        FAN_OUT_DURATION.observe(report.duration, tenant=self.key, kind=label)
+        if on_progress:
+            on_progress(report)
+        return report
+
+    def run(self, items: Iterable[Any], task: Callable[[Any], Awaitable], label: str = "fan-out",
+            on_progress: Optional[Callable[[FanOutReport], None]] = log_progress,
+            progress_interval: float = 5.0,
+            describe: Optional[Callable[[Any], Dict[str, Any]]] = None,
+            method: Optional[str] = None) -> FanOutReport:
+        return self.io.run(self.arun(items, task, label, on_progress, progress_interval, describe, method))
@@ -0,0 +1,185 @@
+"""Columnar attendance history
+
+Every poll is kept as one compact vector per day: byte ``i`` holds the response
+code of the user with stable index ``i``. Per-day totals are counted once when
+a day is recorded, with ``bytes.count`` running over the whole vector in C, and
+prefix sums over those totals answer rolling windows without touching the
+vectors at all. A per-user query reads one byte per day.
+"""
+import bisect
+import threading
+from array import array
+from datetime import date
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# Response codes stored in the day vectors, 0 means no answer
+CODES = {"yes": 1, "no": 2, "maybe": 3}
+
+
+class DayVector:
+    """Response codes of one poll with their totals"""
+
+    __slots__ = ("poll_date", "weekday", "codes", "polled", "yes", "no", "maybe")
+
+    def __init__(self, poll_date: str, codes: bytes, polled: int):
+        self.poll_date = poll_date
+        self.weekday = date.fromisoformat(poll_date).weekday()
+        self.codes = bytes(codes)
+        self.polled = polled
+        self.yes = self.codes.count(CODES["yes"])
+        self.no = self.codes.count(CODES["no"])
+        self.maybe = self.codes.count(CODES["maybe"])
+
+    @property
+    def responses(self) -> int:
+        return self.yes + self.no + self.maybe
+
+    def code(self, index: int) -> int:
+        return self.codes[index] if index < len(self.codes) else 0
+
+
+class AttendanceHistory:
+    """In-memory columnar history of all polls, backed by the state store
+
+    Only the replica that refreshes summaries records days. Other replicas
+    pick them up with :meth:`refresh`.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._days: Dict[str, DayVector] = {}
+        self._dates: List[str] = []
+        # Prefix sums of yes votes, answers and polled users over self._dates, rebuilt lazily
+        self._prefix: Optional[Tuple[array, array, array]] = None
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    def refresh(self) -> None:
+        """Load users and days from the store, from the latest known day on"""
+        with self._lock:
+            since = self._dates[-1] if self._dates else None
+        users = self.store.load_history_users()
+        days = self.store.load_history(since)
+        with self._lock:
+            self._index.update(users)
+            for poll_date, codes, polled in days:
+                self._put(DayVector(poll_date, codes, polled))
+
+    def _put(self, day: DayVector) -> None:
+        if day.poll_date not in self._days:
+            bisect.insort(self._dates, day.poll_date)
+        self._days[day.poll_date] = day
+        self._prefix = None
+
+    def record(self, poll_date: str, responses: Mapping[str, str], polled: int) -> bool:
+        """Store the current answers of a poll as its day vector
+
+        Returns False if nothing changed since the day was last recorded.
+        """
+        with self._lock:
+            new_users = []
+            for user in responses:
+                if user not in self._index:
+                    self._index[user] = len(self._index)
+                    new_users.append((user, self._index[user]))
+
+            codes = bytearray(len(self._index))
+            for user, response in responses.items():
+                codes[self._index[user]] = CODES.get(response, 0)
+
+            previous = self._days.get(poll_date)
+            if previous is not None and previous.polled == polled and previous.codes == codes:
+                return False
+            day = DayVector(poll_date, codes, polled)
+            self._put(day)
+        self.store.save_history_day(poll_date, day.codes, polled, new_users)
+        return True
+
+    def days(self, since: Optional[str] = None, until: Optional[str] = None) -> List[DayVector]:
+        """Recorded days from ``since`` up to and including ``until``, oldest first"""
+        with self._lock:
+            start, end = self._span(since, until)
+            return [self._days[poll_date] for poll_date in self._dates[start:end]]
+
+    def _span(self, since: Optional[str], until: Optional[str]) -> Tuple[int, int]:
+        start = bisect.bisect_left(self._dates, since) if since else 0
+        end = bisect.bisect_right(self._dates, until) if until else len(self._dates)
+        return start, end
+
+    def _prefix_sums(self) -> Tuple[array, array, array]:
+        if self._prefix is None:
+            yes, answered, polled = array('q', [0]), array('q', [0]), array('q', [0])
+            for poll_date in self._dates:
+                day = self._days[poll_date]
+                yes.append(yes[-1] + day.yes)
+                answered.append(answered[-1] + day.responses)
+                polled.append(polled[-1] + day.polled)
+            self._prefix = (yes, answered, polled)
+        return self._prefix
+
+    def totals(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """Poll count and summed yes votes, answers and polled users over a date range"""
+        with self._lock:
+            start, end = self._span(since, until)
+            yes, answered, polled = self._prefix_sums()
+            return {
+                "polls": end - start,
+                "yes": yes[end] - yes[start],
+                "responses": answered[end] - answered[start],
+                "polled": polled[end] - polled[start],
+            }
+
+    def rolling(self, window: int, since: Optional[str] = None,
+                until: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Average yes votes over the trailing ``window`` polls, for each poll in the range
+
+        Windows at the start of the range reach back before ``since``.
+        """
+        with self._lock:
+            start, end = self._span(since, until)
+            yes = self._prefix_sums()[0]
+            points = []
+            for position in range(start + 1, end + 1):
+                first = max(0, position - window)
+                points.append((self._dates[position - 1], (yes[position] - yes[first]) / (position - first)))
+            return points
+
+    def weekday_averages(self, since: Optional[str] = None,
+                         until: Optional[str] = None) -> Dict[int, Dict[str, float]]:
+        """Average yes votes and response rate per weekday (0 is Monday)"""
+        sums: Dict[int, List[int]] = {}
+        for day in self.days(since, until):
+            entry = sums.setdefault(day.weekday, [0, 0, 0, 0])
+            entry[0] += 1
+            entry[1] += day.yes
+            entry[2] += day.responses
+            entry[3] += day.polled
+        return {
+            weekday: {
+                "polls": polls,
+                "average_yes": yes / polls,
+                "response_rate": responses / polled if polled else 0.0,
+            }
+            for weekday, (polls, yes, responses, polled) in sorted(sums.items())
+        }
+
+    def user_summary(self, user: str, since: Optional[str] = None,
+                     until: Optional[str] = None) -> Dict[str, int]:
+        """How often a user answered each option over a date range"""
+        counts = {"polls": 0, "yes": 0, "no": 0, "maybe": 0}
+        with self._lock:
+            index = self._index.get(user)
+            start, end = self._span(since, until)
+            counts["polls"] = end - start
+            if index is None:
+                return counts
+            tally = [0, 0, 0, 0]
+            for poll_date in self._dates[start:end]:
+                tally[self._days[poll_date].code(index)] += 1
+        for response, code in CODES.items():
+            counts[response] = tally[code]
+        return counts
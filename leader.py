@@ -0,0 +1,100 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """Time-limited lease in a shared SQLite file that elects one replica as leader
+
+    The holder renews the lease every ``renew_interval`` seconds. If it stops
+    renewing, another replica takes over once ``ttl`` seconds have passed.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, ttl: float = 30.0, renew_interval: float = 10.0, name: str = "scheduler",
+                 on_elected: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.name = name
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self.is_leader = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+
+    def hold(self) -> bool:
+        """Take or renew the lease if it is free, expired or already ours"""
+        with self._lock:
+            was_leader = self.is_leader
+            now = time.time()
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)
+                    ).fetchone()
+                    if row is None or row[0] == self.holder or row[1] < now:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                            (self.name, self.holder, now + self.ttl)
+                        )
+                        self.is_leader = True
+                    else:
+                        self.is_leader = False
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except Exception as e:
+                logger.error("Error renewing leader lease: %s", e)
+                self.is_leader = False
+
+        if self.is_leader and not was_leader:
+            logger.info("Became leader as %s", self.holder)
+            if self.on_elected:
+                self.on_elected()
+        elif was_leader and not self.is_leader:
+            logger.warning("Lost leadership as %s", self.holder)
+        return self.is_leader
+
+    def start(self) -> None:
+        """Try to become leader now and keep renewing or retrying in the background"""
+        self.hold()
+        self._thread = threading.Thread(target=self._run, name="leader-lease", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.renew_interval):
+            self.hold()
+
+    def release(self) -> None:
+        """Give up the lease so another replica can take over right away"""
+        self._stopped.set()
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+            except Exception as e:
+                logger.error("Error releasing leader lease: %s", e)
+            self.is_leader = False
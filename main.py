@@ -1,455 +1,400 @@
 import os
+import atexit
+import json
+import re
+import logging
+import threading
+import time
 from dotenv import load_dotenv
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-from datetime import datetime, timedelta
-import pytz
-from apscheduler.schedulers.background import BackgroundScheduler
-from config import Config
+from config import Config, ConfigWatcher
+from fanout import EventLoopThread, FairExecutor
+import replies
+from summary import SHOW_ALL_ACTION, VOTERS_PAGE_ACTION
+from tenant import DEFAULT_TENANT, Tenant, load_tenant_specs
+import metrics
+from tracing import SamplingProfiler, setup_logging, traced, tracer
+
+# Bolt's app and Socket Mode adapters, the scheduler and the leader lease are
+# imported where they are used, so a process only loads the runtime and features it runs
 
 load_dotenv()
 
 # Initialize configuration
-config = Config()
+# Process-wide settings (logging, tracing, metrics, replicas, worker pool) come from this file,
+# and it is also the configuration of the single tenant when no tenants file is given
+config = Config(os.environ.get("ATTENDANCE_CONFIG_PATH"))
 config.validate()
 
-# Initialize the Slack app
-app = App(token=os.environ["SLACK_BOT_TOKEN"])
-
-# Store responses and message tracking
-responses = {}
-message_tracking = {}  # Track the original message for each day
-current_poll_date = None  # Store the date of the current active poll
-muted_users = {}  # Store user IDs with their mute expiration dates
-
-
-def get_tomorrow_date():
-    timezone = config.get_schedule()['timezone']
-    tz = pytz.timezone(timezone)
-    tomorrow = datetime.now(tz) + timedelta(days=1)
-    return tomorrow.strftime("%Y-%m-%d")
-
-
-def is_workday(date):
-    workdays = config.get_workdays()
-    # Convert weekday number (0-6) to day name (monday-sunday)
-    day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-    return workdays[day_names[date.weekday()]]
-
-
-def create_summary_blocks(responses, tomorrow_date):
-    coming = [user for user, response in responses.items() if response == "yes"]
-    not_coming = [user for user, response in responses.items() if response == "no"]
-    maybe = [user for user, response in responses.items() if response == "maybe"]
-
-    # Get message templates from config
-    message_template = config.get_message_template()
-    summary_template = config.get_summary_template()
-
-    blocks = [
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": message_template.format(date=tomorrow_date),
-            },
-        },
-        {
-            "type": "actions",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": option["text"]},
-                    "value": option["value"],
-                    "action_id": option["action_id"],
-                }
-                for option in config.get_response_options()
-            ],
-        },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": summary_template.format(
-                    date=tomorrow_date,
-                    coming_count=len(coming),
-                    coming_users=', '.join(coming) if coming else 'None',
-                    not_coming_count=len(not_coming),
-                    not_coming_users=', '.join(not_coming) if not_coming else 'None',
-                    maybe_count=len(maybe),
-                    maybe_users=', '.join(maybe) if maybe else 'None'
-                ),
-            },
-        },
-    ]
-    return blocks
-
-
-def send_attendance_poll():
-    try:
-        # Get all users in the workspace
-        result = app.client.users_list()
-        users = result["members"]
-        
-        tomorrow = get_tomorrow_date()
-        # Clear previous responses for the new poll
-        responses.clear()
-        
-        # Set the current poll date
-        global current_poll_date
-        current_poll_date = tomorrow
-        
-        # Get current date for mute check
-        timezone = config.get_schedule()['timezone']
-        tz = pytz.timezone(timezone)
-        current_date = datetime.now(tz).date()
-        
-        for user in users:
-            # Skip bots, deleted users, and slackbot
-            if (user["is_bot"] or 
-                user.get("deleted", False) or 
-                user["name"] == "slackbot"):
-                continue
-                
-            # Skip muted users
-            if user["id"] in muted_users and muted_users[user["id"]] >= current_date:
-                print(f"Skipping muted user: {user['name']}, muted until: {muted_users[user['id']]}")
-                continue
-            
-            try:
-                # Open DM channel with user
-                dm_channel = app.client.conversations_open(users=user["id"])
-                channel_id = dm_channel["channel"]["id"]
-                
-                # Send message to DM channel
-                result = app.client.chat_postMessage(
-                    channel=channel_id,
-                    blocks=create_summary_blocks(responses, tomorrow),
-                    text="Will you be coming to the office tomorrow?"
-                )
-                
-                # Store the message details for updates
-                if tomorrow not in message_tracking:
-                    message_tracking[tomorrow] = {}
-                message_tracking[tomorrow][user["id"]] = {"channel": channel_id, "ts": result["ts"]}
-            except Exception as e:
-                print(f"Error sending message to user {user['name']}: {e}")
-            
-    except Exception as e:
-        print(f"Error sending attendance poll: {e}")
+# Log records go through a queue, so per-user loops never wait on the console
+setup_logging(config.get_logging()['level'])
+logger = logging.getLogger(__name__)
+
+# Span timelines for poll runs, refresh waves and handlers, written as JSON lines
+tracing_settings = config.get_tracing()
+tracer.configure(tracing_settings['enabled'], tracing_settings['path'])
+
+# SLACK_API_URL points the bot at another Web API endpoint, e.g. the benchmark's fake server
+slack_api_url = os.environ.get("SLACK_API_URL", metrics.InstrumentedWebClient.BASE_URL)
+
+# One worker pool for every tenant's Slack calls, shared round-robin between tenants
+fan_out_settings = config.get_fan_out()
+executor = FairExecutor(fan_out_settings['max_workers'])
+
+# In async mode, Slack calls and Bolt listeners all run on one event loop instead, over a
+# pooled keep-alive HTTP session. async_runtime needs aiohttp, so it is only imported then.
+runtime_settings = config.get_runtime()
+io = None
+session = None
+if runtime_settings['mode'] == 'async':
+    import async_runtime
+    io = EventLoopThread()
+    session = async_runtime.create_session(io, runtime_settings['connection_limit'])
+
+
+def create_client(token):
+    if io is not None:
+        return async_runtime.InstrumentedAsyncWebClient(token=token, base_url=slack_api_url, session=session)
+    return metrics.InstrumentedWebClient(token=token, base_url=slack_api_url)
+
+
+def resume_jobs():
+    """Pick up every tenant's pending deletions and queued messages, e.g. after becoming leader"""
+    for tenant in tenants.values():
+        tenant.resume_jobs()
+
+
+# With several replicas, the one holding the lease runs the scheduled jobs and summary refreshes,
+# and every replica serves interactions. Replicas share state through the SQLite store.
+replica_settings = config.get_replicas()
+leader = None
+if replica_settings['enabled']:
+    from leader import LeaderLease
+    leader = LeaderLease(
+        replica_settings['lease_path'],
+        ttl=replica_settings['lease_seconds'],
+        renew_interval=replica_settings['renew_seconds'],
+        on_elected=resume_jobs
+    )
+    atexit.register(leader.release)
 
 
-def update_all_summaries(tomorrow_date=None):
-    global current_poll_date
-    if tomorrow_date is None:
-        working_date = current_poll_date
+def create_tenants():
+    """One tenant per entry of the ATTENDANCE_TENANTS_PATH file, or a single one from the environment"""
+    tenants_path = os.environ.get("ATTENDANCE_TENANTS_PATH")
+    if not tenants_path:
+        specs = [{"id": DEFAULT_TENANT, "team_id": None, "bot_token_env": "SLACK_BOT_TOKEN"}]
     else:
-        working_date = tomorrow_date
-
-    if working_date and working_date in message_tracking:
-        for user_id, msg_info in message_tracking[working_date].items():
-            try:
+        specs = load_tenant_specs(tenants_path)
 
-                app.client.chat_update(
-                    channel=msg_info["channel"],
-                    ts=msg_info["ts"],
-                    blocks=create_summary_blocks(responses, working_date),
-                    text="Will you be coming to the office tomorrow?"
-                )
-            except Exception as e:
-                print(f"Error updating message for user {user_id}: {e}")
+    created = {}
+    for spec in specs:
+        if spec.get('config_path'):
+            tenant_config = Config(spec['config_path'])
+            tenant_config.validate()
+        else:
+            tenant_config = config
+        created[spec['id']] = Tenant(
+            spec['id'],
+            tenant_config,
+            create_client(os.environ[spec['bot_token_env']]),
+            executor,
+            team_id=spec['team_id'],
+            max_retries=fan_out_settings['max_retries'],
+            leader=leader,
+            io=io
+        )
+    return created
+
+
+tenants = create_tenants()
+tenants_by_team = {tenant.team_id: tenant for tenant in tenants.values() if tenant.team_id}
+
+metrics.ACTIVE_RECIPIENTS.set_function(
+    lambda: sum(tenant.poll.message_count(tenant.poll.poll_date) for tenant in tenants.values()))
+metrics.MUTED_USERS.set_function(lambda: sum(len(tenant.mutes) for tenant in tenants.values()))
+metrics.PENDING_DELETIONS.set_function(
+    lambda: sum(tenant.deletion_job.progress()['pending'] for tenant in tenants.values()))
+metrics.OUTBOX_PENDING.set_function(lambda: sum(tenant.outbox.progress()['pending'] for tenant in tenants.values()))
+metrics.DEAD_LETTERS.set_function(lambda: sum(tenant.outbox.progress()['dead'] for tenant in tenants.values()))
+
+
+def tenant_for(team_id):
+    """The tenant of a workspace; a single tenant serves every workspace"""
+    if len(tenants) == 1:
+        return next(iter(tenants.values()))
+    tenant = tenants_by_team.get(team_id)
+    if tenant is None:
+        raise LookupError(f"No tenant is configured for team {team_id}")
+    return tenant
+
+
+def team_of(body):
+    """Workspace ID of an action, command or event payload"""
+    return (body.get("team") or {}).get("id") or body.get("team_id")
+
+
+def authorize(enterprise_id, team_id):
+    """Hand Bolt the bot token of the workspace a request came from"""
+    from slack_bolt.authorization import AuthorizeResult
+
+    tenant = tenants_by_team.get(team_id)
+    if tenant is None:
+        return None
+    identity = tenant.identity()
+    return AuthorizeResult(
+        enterprise_id=enterprise_id,
+        team_id=team_id,
+        bot_token=tenant.client.token,
+        bot_id=identity.get("bot_id"),
+        bot_user_id=identity.get("user_id")
+    )
 
 
-# Handle responses
-@app.action("attendance_yes")
-def handle_yes(ack, body):
-    ack()
-    user = body["user"]["name"]
-    responses[user] = "yes"
-    update_all_summaries()  # Update messages for all users
+# Answer buttons are routed by the tenant's action ID map, which follows configuration reloads
+def is_vote(body):
+    try:
+        tenant = tenant_for(team_of(body))
+    except LookupError:
+        # Events of a workspace that is not configured are left to other listeners
+        return False
+    actions = body.get("actions") or []
+    return bool(actions) and tenant.settings.vote(actions[0]["action_id"]) is not None
 
 
-@app.action("attendance_no")
-def handle_no(ack, body):
+# Handle responses, for a weekly poll the action ID also carries the date
+@traced("action.vote")
+def handle_vote(ack, body, respond):
     ack()
-    user = body["user"]["name"]
-    responses[user] = "no"
-    update_all_summaries()  # Update messages for all users
+    tenant = tenant_for(team_of(body))
+    vote = tenant.settings.vote(body["actions"][0]["action_id"])
+    reply = tenant.handle_vote(body, *vote) if vote else None
+    if reply:
+        respond(**reply)
 
 
-@app.action("attendance_maybe")
-def handle_maybe(ack, body):
+# Full list of voters, opened from a compact summary
+@traced("action.attendance_show_all")
+def show_all_voters(ack, body, client):
     ack()
-    user = body["user"]["name"]
-    responses[user] = "maybe"
-    update_all_summaries()  # Update messages for all users
+    view = tenant_for(team_of(body)).voters_view(body["actions"][0]["value"])
+    client.views_open(trigger_id=body["trigger_id"], view=view)
 
 
-# Command to trigger the poll manually
-@app.command("/attendance-poll")
-def create_poll(ack, body):
+@traced("action.attendance_voters_page")
+def page_voters(ack, body, client):
     ack()
-    send_attendance_poll()
-
-
-def is_next_day_workday():
-    timezone = config.get_schedule()['timezone']
-    tz = pytz.timezone(timezone)
-    tomorrow = datetime.now(tz) + timedelta(days=1)
-    return is_workday(tomorrow)
+    target = json.loads(body["actions"][0]["value"])
+    view = tenant_for(team_of(body)).voters_view(target["date"], target["page"])
+    client.views_update(view_id=body["view"]["id"], hash=body["view"]["hash"], view=view)
 
 
-def schedule_daily_poll():
-    """Schedule the daily attendance poll"""
-    scheduler = BackgroundScheduler()
-    schedule = config.get_schedule()
-    tz = pytz.timezone(schedule['timezone'])
-    
-    # Schedule the job to run at configured time, but only if next day is a workday
-    scheduler.add_job(
-        lambda: send_attendance_poll() if is_next_day_workday() else None,
-        'cron',
-        hour=schedule['hour'],
-        minute=schedule['minute'],
-        timezone=tz
-    )
-    
-    # Add job to clean up expired mutes
-    scheduler.add_job(
-        cleanup_expired_mutes,
-        'cron',
-        hour=0,  # Run at midnight
-        minute=0,
-        timezone=tz,
-    )
-    
-    scheduler.start()
-    print(f"Scheduled daily attendance poll for {schedule['hour']}:{schedule['minute']} {schedule['timezone']}")
+@traced("event.app_home_opened")
+def handle_app_home_opened(event, body, client):
+    tenant = tenant_for(team_of(body))
+    if tenant.summary_mode != "app_home" or event.get("tab") != "home":
+        return
+    try:
+        client.views_publish(user_id=event["user"], view=tenant.home_view(event["user"]))
+    except Exception as e:
+        logger.error("Error publishing App Home for user %s: %s", event['user'], e)
 
 
-def cleanup_expired_mutes():
-    """Clean up expired muted users"""
-    timezone = config.get_schedule()['timezone']
-    tz = pytz.timezone(timezone)
-    current_date = datetime.now(tz).date()
-    
-    expired_mutes = []
-    for user_id, expiration_date in muted_users.items():
-        if expiration_date < current_date:
-            expired_mutes.append(user_id)
-    
-    # Remove expired mutes
-    for user_id in expired_mutes:
-        del muted_users[user_id]
-    
-    if expired_mutes:
-        print(f"Cleaned up {len(expired_mutes)} expired mutes")
+# Keep the user directory current
+@traced("event.team_join")
+def handle_team_join(event, body):
+    tenant_for(team_of(body)).user_directory.apply(event["user"])
 
 
-def delete_previous_messages(tomorrow_date=None):
-    try:
-        global current_poll_date
-        if tomorrow_date is None:
-            tomorrow_date = current_poll_date
-            
-        if tomorrow_date in message_tracking:
-            for user_id, msg_info in message_tracking[tomorrow_date].items():
-                try:
-                    app.client.chat_delete(
-                        channel=msg_info["channel"],
-                        ts=msg_info["ts"]
-                    )
-                except Exception as e:
-                    print(f"Error deleting message for user {user_id}: {e}")
-            
-            del message_tracking[tomorrow_date]
-            responses.clear()
-            current_poll_date = None
-            return True
-        return False
-    except Exception as e:
-        print(f"Error in delete_previous_messages: {e}")
-        return False
+@traced("event.user_change")
+def handle_user_change(event, body):
+    tenant_for(team_of(body)).user_directory.apply(event["user"])
 
 
-def get_attendance_stats():
-    global current_poll_date
-    total_users = len(responses)
-    coming = len([u for u, r in responses.items() if r == "yes"])
-    not_coming = len([u for u, r in responses.items() if r == "no"])
-    maybe = len([u for u, r in responses.items() if r == "maybe"])
-    no_response = len(message_tracking.get(current_poll_date, {})) - total_users if current_poll_date else 0
-    
-    return {
-        "date": current_poll_date or get_tomorrow_date(),
-        "total_responses": total_users,
-        "coming": coming,
-        "not_coming": not_coming,
-        "maybe": maybe,
-        "no_response": no_response if no_response >= 0 else 0
-    }
+# Command to trigger the poll manually
+@traced("command.attendance-poll")
+def create_poll(ack, body):
+    ack()
+    tenant_for(team_of(body)).send_attendance_poll()
 
 
 # New command to force create a new poll
-@app.command("/new-poll")
+@traced("command.new-poll")
 def force_new_poll(ack, body, respond):
     ack()
+    tenant = tenant_for(team_of(body))
     try:
-        # Delete previous poll if exists
-        delete_previous_messages()
-        # Send new poll
-        send_attendance_poll()
-        respond("New attendance poll has been created and sent to all users.")
+        # Delete previous poll if exists, its messages are removed in the background
+        deleting = tenant.delete_previous_messages()
     except Exception as e:
         respond(f"Error creating new poll: {e}")
+        return
+
+    def replace_poll():
+        try:
+            tenant.send_attendance_poll()
+            respond(**replies.new_poll_sent(tenant))
+        except Exception as e:
+            respond(f"Error creating new poll: {e}")
+
+    # Delivery to a large audience outlasts the command, so report back when it is done
+    threading.Thread(target=replace_poll, name="new-poll", daemon=True).start()
+    respond(**replies.new_poll_started(deleting))
 
 
 # Command to delete the current poll
-@app.command("/delete-poll")
+@traced("command.delete-poll")
 def delete_poll(ack, body, respond):
     ack()
-    if delete_previous_messages():
-        respond("Previous attendance poll has been deleted.")
-    else:
-        respond("No active poll found to delete.")
+    respond(**replies.delete_poll(tenant_for(team_of(body))))
 
 
 # Command to get current statistics
-@app.command("/attendance-stats")
+@traced("command.attendance-stats")
 def get_stats(ack, body, respond):
     ack()
-    stats = get_attendance_stats()
-    respond(
-        blocks=[
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Attendance Statistics for {stats['date']}*\n"
-                           f"• Total Responses: {stats['total_responses']}\n"
-                           f"• Coming: {stats['coming']}\n"
-                           f"• Not Coming: {stats['not_coming']}\n"
-                           f"• Maybe: {stats['maybe']}\n"
-                           f"• No Response: {stats['no_response']}"
-                }
-            }
-        ]
-    )
+    respond(**replies.stats(tenant_for(team_of(body)), body))
+
+
+# Command to show past polls and the caller's own attendance
+@traced("command.attendance-history")
+def show_history(ack, body, respond):
+    ack()
+    respond(**replies.history(tenant_for(team_of(body)), body))
+
+
+# Command to show weekday occupancy and rolling averages
+@traced("command.attendance-trends")
+def show_trends(ack, body, respond):
+    ack()
+    respond(**replies.trends(tenant_for(team_of(body)), body))
 
 
 # Command to mute the bot for a specific number of days
-@app.command("/attendance-mute")
+@traced("command.attendance-mute")
 def mute_bot(ack, body, respond):
     ack()
-    user_id = body["user_id"]
-    text = body.get("text", "").strip()
-    
-    try:
-        # Parse the number of days from the command
-        if not text:
-            respond("Please specify the number of days to mute the bot. Example: `/attendance-mute 5`")
-            return
-            
-        days = int(text)
-        if days <= 0:
-            respond("Please provide a positive number of days.")
-            return
-        
-        # Calculate the mute expiration date
-        timezone = config.get_schedule()['timezone']
-        tz = pytz.timezone(timezone)
-        current_date = datetime.now(tz).date()
-        expiration_date = current_date + timedelta(days=days)
-        
-        # Store the mute information
-        muted_users[user_id] = expiration_date
-        
-        # Format the expiration date for the response
-        formatted_date = expiration_date.strftime("%A, %B %d, %Y")
-        
-        respond(f"You have muted the attendance bot until {formatted_date}. You will not receive attendance polls until then.")
-    except ValueError:
-        respond("Invalid input. Please provide a number of days to mute the bot. Example: `/attendance-mute 5`")
-    except Exception as e:
-        respond(f"Error processing your request: {e}")
+    respond(**replies.mute(tenant_for(team_of(body)), body))
 
 
 # Command to unmute the bot
-@app.command("/attendance-unmute")
+@traced("command.attendance-unmute")
 def unmute_bot(ack, body, respond):
     ack()
-    user_id = body["user_id"]
-    
-    if user_id in muted_users:
-        del muted_users[user_id]
-        respond("You have successfully unmuted the attendance bot. You will now receive attendance polls.")
-    else:
-        respond("You are not currently muted and are already receiving attendance polls.")
+    respond(**replies.unmute(tenant_for(team_of(body)), body))
 
 
 # Command to check mute status
-@app.command("/attendance-mute-status")
+@traced("command.attendance-mute-status")
 def check_mute_status(ack, body, respond):
     ack()
-    user_id = body["user_id"]
-    
-    timezone = config.get_schedule()['timezone']
-    tz = pytz.timezone(timezone)
-    current_date = datetime.now(tz).date()
-    
-    if user_id in muted_users:
-        expiration_date = muted_users[user_id]
-        if expiration_date >= current_date:
-            days_left = (expiration_date - current_date).days
-            formatted_date = expiration_date.strftime("%A, %B %d, %Y")
-            respond(f"You have muted the attendance bot until {formatted_date} ({days_left} days remaining).")
-        else:
-            # Mute has expired, clean it up
-            del muted_users[user_id]
-            respond("You are not currently muted and are receiving attendance polls.")
-    else:
-        respond("You are not currently muted and are receiving attendance polls.")
+    respond(**replies.mute_status(tenant_for(team_of(body)), body))
+
+
+# Command to inspect, retry or drop undeliverable messages
+@traced("command.attendance-dlq")
+def show_dead_letters(ack, body, respond):
+    ack()
+    respond(**replies.dead_letters(tenant_for(team_of(body)), body))
 
 
 # Command to show help
-@app.command("/attendance-help")
+@traced("command.attendance-help")
 def show_help(ack, respond):
     ack()
-    help_text = """
-*Available Commands:*
-• `/attendance-poll` - Manually trigger attendance poll
-• `/new-poll` - Force create a new poll (deletes previous one)
-• `/delete-poll` - Delete the current active poll
-• `/attendance-stats` - Show current attendance statistics
-• `/attendance-mute <days>` - Mute the bot for the specified number of days
-• `/attendance-unmute` - Unmute the bot if it's currently muted
-• `/attendance-mute-status` - Check your current mute status
-• `/attendance-help` - Show this help message
-
-*How it works:*
-• Bot automatically sends attendance polls at 18:00 (Berlin time)
-• Each user receives a private message with the poll
-• Responses are collected and summarized
-• You can use the commands above to manage the polls
-"""
-    respond(
-        blocks=[
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": help_text
-                }
-            }
-        ]
-    )
+    respond(**replies.help_reply())
+
+
+def register_handlers(app):
+    """Attach the sync listeners above to a Bolt app"""
+    app.action(re.compile(".*"), matchers=[is_vote])(handle_vote)
+    app.action(SHOW_ALL_ACTION)(show_all_voters)
+    app.action(re.compile(f"^{VOTERS_PAGE_ACTION}_"))(page_voters)
+    app.event("app_home_opened")(handle_app_home_opened)
+    app.event("team_join")(handle_team_join)
+    app.event("user_change")(handle_user_change)
+    app.command("/attendance-poll")(create_poll)
+    app.command("/new-poll")(force_new_poll)
+    app.command("/delete-poll")(delete_poll)
+    app.command("/attendance-stats")(get_stats)
+    app.command("/attendance-history")(show_history)
+    app.command("/attendance-trends")(show_trends)
+    app.command("/attendance-mute")(mute_bot)
+    app.command("/attendance-unmute")(unmute_bot)
+    app.command("/attendance-mute-status")(check_mute_status)
+    app.command("/attendance-dlq")(show_dead_letters)
+    app.command("/attendance-help")(show_help)
+
+
+# Initialize the Slack app: the sync listeners above, or their async versions on the event loop
+if io is not None:
+    app = async_runtime.create_app(io, tenants, tenant_for, team_of, authorize, slack_api_url, session)
+else:
+    from slack_bolt import App
+
+    if len(tenants) == 1:
+        app = App(client=tenant_for(None).client)
+    else:
+        app = App(client=metrics.InstrumentedWebClient(base_url=slack_api_url), authorize=authorize)
+    register_handlers(app)
+
+
+def sync_from_store():
+    """Pick up polls, votes and mutes that other replicas wrote to the store"""
+    while True:
+        time.sleep(replica_settings['sync_seconds'])
+        for tenant in tenants.values():
+            try:
+                tenant.sync_from_store()
+            except Exception as e:
+                logger.error("Error syncing tenant %s from the store: %s", tenant.id, e)
+
+
+def watch_configs():
+    """Apply edits of the configuration files to their tenants while the bot runs"""
+    watched = {}
+    for tenant in tenants.values():
+        if tenant.config.config_path:
+            watched.setdefault(tenant.config.config_path, []).append(tenant)
+
+    for path, path_tenants in watched.items():
+        def apply(new_config, path_tenants=path_tenants):
+            for tenant in path_tenants:
+                tenant.apply_config(new_config)
+        ConfigWatcher(path, apply, interval=config.get_hot_reload()['interval_seconds']).start()
+        logger.info("Watching %s for configuration changes", path)
 
 
 # Main function to run the bot
 if __name__ == "__main__":
-    # Start the scheduler
-    schedule_daily_poll()
+    metrics_settings = config.get_metrics()
+    if metrics_settings['enabled']:
+        metrics.start_metrics_server(metrics_settings['host'], metrics_settings['port'])
+        logger.info("Serving metrics on %s:%s", metrics_settings['host'], metrics_settings['port'])
+
+    profiler_settings = config.get_profiler()
+    if profiler_settings['enabled']:
+        SamplingProfiler(profiler_settings['path'], interval=profiler_settings['interval_ms'] / 1000.0,
+                         max_stacks=profiler_settings['max_stacks']).start()
+        logger.info("Sampling profiler writing to %s", profiler_settings['path'])
+
+    # Start the scheduler, every tenant's jobs run in its own timezone
+    from apscheduler.schedulers.background import BackgroundScheduler
+    scheduler = BackgroundScheduler()
+    for tenant in tenants.values():
+        tenant.schedule_daily_poll(scheduler)
+        tenant.start()
+    scheduler.start()
+    if leader is not None:
+        # Pending deletions and queued messages are resumed by whichever replica is elected
+        leader.start()
+        threading.Thread(target=sync_from_store, name="store-sync", daemon=True).start()
+    if config.get_hot_reload()['enabled']:
+        watch_configs()
     
     # Start the bot
-    handler = SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
-    handler.start()
+    if io is not None:
+        async_runtime.start_socket_mode(io, app, os.environ["SLACK_APP_TOKEN"])
+    else:
+        from slack_bolt.adapter.socket_mode import SocketModeHandler
+        handler = SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+        handler.start()
@@ -0,0 +1,237 @@
+"""Prometheus-style metrics for the bot, exposed as text over a local HTTP port"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_DURATION_BUCKETS = (0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric(ABC):
+    """A named metric rendered as a Prometheus text block"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Return (sample name, formatted labels, value) for every sample of the metric"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the (unlabelled) value at scrape time"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                return [(self.name, "", float(self._function()))]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in items]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: cumulative bucket counts, sum, count
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names + ("le",), key + (f"{bound:g}",))
+                samples.append((f"{self.name}_bucket", labels, bucket_count))
+            labels = _format_labels(self.label_names + ("le",), key + ("+Inf",))
+            samples.append((f"{self.name}_bucket", labels, count))
+            samples.append((f"{self.name}_sum", _format_labels(self.label_names, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.label_names, key), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+SLACK_API_CALLS = REGISTRY.register(Counter(
+    "slack_api_calls_total", "Slack Web API calls by method", ["method"]))
+SLACK_API_LATENCY = REGISTRY.register(Histogram(
+    "slack_api_call_duration_seconds", "Slack Web API call latency by method", ["method"]))
+SLACK_API_ERRORS = REGISTRY.register(Counter(
+    "slack_api_errors_total", "Failed Slack Web API calls by method and error", ["method", "error"]))
+SLACK_API_RATE_LIMITED = REGISTRY.register(Counter(
+    "slack_api_rate_limited_total", "Slack Web API calls answered with HTTP 429 by method", ["method"]))
+FAN_OUT_DURATION = REGISTRY.register(Histogram(
+    "fan_out_duration_seconds", "Duration of fan-out runs by tenant and kind", ["tenant", "kind"],
+    DEFAULT_DURATION_BUCKETS))
+FAN_OUT_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "fan_out_queue_depth", "Fan-out items waiting or in flight by tenant and kind", ["tenant", "kind"]))
+FAN_OUT_FAILURES = REGISTRY.register(Counter(
+    "fan_out_failures_total", "Fan-out items that failed by tenant and kind", ["tenant", "kind"]))
+VOTES = REGISTRY.register(Counter(
+    "attendance_votes_total", "Votes that changed a response, by tenant and response", ["tenant", "response"]))
+ACTIVE_RECIPIENTS = REGISTRY.register(Gauge(
+    "attendance_active_recipients", "Users who received the active poll"))
+MUTED_USERS = REGISTRY.register(Gauge(
+    "attendance_muted_users", "Users who currently muted the bot"))
+PENDING_DELETIONS = REGISTRY.register(Gauge(
+    "attendance_pending_deletions", "Messages of deleted polls that still have to be deleted"))
+OUTBOX_PENDING = REGISTRY.register(Gauge(
+    "attendance_outbox_pending", "Failed poll messages and summary updates queued for a retry"))
+DEAD_LETTERS = REGISTRY.register(Gauge(
+    "attendance_dead_letters", "Poll messages and summary updates given up on"))
+POLL_STARTED = REGISTRY.register(Gauge(
+    "attendance_poll_last_started_timestamp_seconds", "Unix time the last poll delivery started, by tenant",
+    ["tenant"]))
+POLL_DELIVERED = REGISTRY.register(Gauge(
+    "attendance_poll_last_delivered_timestamp_seconds", "Unix time the last poll delivery finished, by tenant",
+    ["tenant"]))
+
+
+class InstrumentedWebClient(WebClient):
+    """WebClient that records call counts, latency and errors for every API method"""
+
+    def api_call(self, api_method: str, **kwargs):
+        start = time.monotonic()
+        try:
+            return super().api_call(api_method, **kwargs)
+        except SlackApiError as e:
+            if e.response.status_code == 429:
+                SLACK_API_RATE_LIMITED.inc(method=api_method)
+            SLACK_API_ERRORS.inc(method=api_method, error=e.response.get("error") or "unknown")
+            raise
+        except Exception as e:
+            SLACK_API_ERRORS.inc(method=api_method, error=type(e).__name__)
+            raise
+        finally:
+            SLACK_API_CALLS.inc(method=api_method)
+            SLACK_API_LATENCY.observe(time.monotonic() - start, method=api_method)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        data = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Serve the metrics in Prometheus text format on a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
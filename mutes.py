@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import logging
+import threading
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# First day a mute applies (None when it applied right away) and last day it applies
+Mute = Tuple[Optional[date], date]
+
+
+class MuteRegistry:
+    """Mutes of one workspace, indexed by the days they start and end
+
+    The registry's day is the day the next poll asks about, not the day it is
+    sent, so a mute from the 1st through the 14th silences the poll sent on
+    the last day of the previous month and not the one sent on the 14th. For
+    a weekly poll that is the first workday it covers.
+
+    The users whose mute covers the current day form a set that only changes
+    when a mute is set, lifted, starts or ends, so a poll never looks at
+    mutes user by user. Every start and end is an event in a min-heap,
+    applied by :meth:`advance` once its day comes, at ``O(log n)`` per event.
+    Events of a mute that was replaced or lifted are dropped when they reach
+    the top of the heap.
+
+    ``on_change(user_id, muted)`` is called whenever a user becomes muted or
+    unmuted, e.g. to keep a precomputed recipient list current.
+    """
+
+    def __init__(self, store, polled_date: date, on_change: Optional[Callable[[str, bool], None]] = None):
+        self.store = store
+        self.on_change = on_change
+        self._mutes: Dict[str, Mute] = {}
+        self._events: List[Tuple[date, int, str, Mute]] = []
+        self._sequence = itertools.count()
+        self._muted: Set[str] = set()
+        self._today = polled_date
+        self._lock = threading.Lock()
+        self.load(store.load_mutes())
+
+    def __len__(self) -> int:
+        return len(self._muted)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._muted
+
+    def muted(self) -> Set[str]:
+        """Users muted for the day the next poll asks about"""
+        with self._lock:
+            return set(self._muted)
+
+    def get(self, user_id: str) -> Optional[Mute]:
+        """A user's mute, with ``start`` only set while it lies ahead"""
+        mute = self._mutes.get(user_id)
+        if mute is None or mute[0] is None or mute[0] > self._today:
+            return mute
+        return None, mute[1]
+
+    def _active(self, mute: Mute) -> bool:
+        start, until = mute
+        return (start is None or start <= self._today) and self._today <= until
+
+    def _set_muted(self, user_id: str, muted: bool) -> None:
+        if muted == (user_id in self._muted):
+            return
+        if muted:
+            self._muted.add(user_id)
+        else:
+            self._muted.discard(user_id)
+        logger.debug("User %s is %s", user_id, "muted" if muted else "no longer muted")
+        if self.on_change:
+            self.on_change(user_id, muted)
+
+    def _index(self, user_id: str, mute: Mute) -> None:
+        start, until = mute
+        if start is not None and start > self._today:
+            heapq.heappush(self._events, (start, next(self._sequence), user_id, mute))
+        heapq.heappush(self._events, (until + timedelta(days=1), next(self._sequence), user_id, mute))
+
+    def load(self, mutes: Dict[str, Mute]) -> int:
+        """Catch up with every mute, e.g. the ones another replica wrote to the store
+
+        Only users whose mute was set, changed or lifted are touched, each at
+        ``O(log n)``, so syncing with an unchanged store costs one comparison
+        per mute. Returns the number of users whose mute changed.
+        """
+        with self._lock:
+            changed = 0
+            for user_id in [user_id for user_id in self._mutes if user_id not in mutes]:
+                del self._mutes[user_id]
+                self._set_muted(user_id, False)
+                changed += 1
+            for user_id, mute in mutes.items():
+                if self._mutes.get(user_id) == mute:
+                    continue
+                self._mutes[user_id] = mute
+                self._index(user_id, mute)
+                self._set_muted(user_id, self._active(mute))
+                changed += 1
+            # Mutes that ended while nobody was looking are dropped from the store too
+            self._drain()
+            return changed
+
+    def set(self, user_id: str, until: date, start: Optional[date] = None) -> None:
+        """Mute a user through ``until``, from ``start`` on if it is a later day"""
+        with self._lock:
+            if start is not None and start <= self._today:
+                start = None
+            mute = (start, until)
+            self._mutes[user_id] = mute
+            self.store.save_mute(user_id, until, start)
+            self._index(user_id, mute)
+            self._set_muted(user_id, self._active(mute))
+
+    def remove(self, user_id: str) -> bool:
+        """Lift a mute, started or not, returns whether there was one"""
+        with self._lock:
+            if self._mutes.pop(user_id, None) is None:
+                return False
+            self.store.delete_mute(user_id)
+            self._set_muted(user_id, False)
+            return True
+
+    def advance(self, polled_date: date) -> int:
+        """Apply the starts and ends that are due by ``polled_date``, returns the number of mutes that ended"""
+        with self._lock:
+            self._today = max(self._today, polled_date)
+            return self._drain()
+
+    def _drain(self) -> int:
+        expired = 0
+        while self._events and self._events[0][0] <= self._today:
+            _, _, user_id, mute = heapq.heappop(self._events)
+            if self._mutes.get(user_id) != mute:
+                continue
+            if mute[1] < self._today:
+                del self._mutes[user_id]
+                self.store.delete_mute(user_id)
+                expired += 1
+            self._set_muted(user_id, user_id in self._mutes and self._active(mute))
+        return expired
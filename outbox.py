@@ -0,0 +1,210 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from slack_sdk.errors import SlackApiError
+
+logger = logging.getLogger(__name__)
+
+# Slack errors worth retrying, besides HTTP 429 and 5xx responses
+RETRYABLE_ERRORS = {"ratelimited", "internal_error", "fatal_error", "service_unavailable", "request_timeout"}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed call may succeed later; network errors and timeouts count as transient"""
+    if isinstance(error, SlackApiError):
+        status = error.response.status_code
+        return status == 429 or status >= 500 or error.response.get("error") in RETRYABLE_ERRORS
+    return True
+
+
+def outbound_key(poll_date: str, user_id: str, operation: str) -> str:
+    """Idempotency key of one outbound operation"""
+    return f"{poll_date}|{user_id}|{operation}"
+
+
+class Outbox:
+    """Durable queue of poll messages and summary updates that failed, retried in the background
+
+    Each entry stands for one ``(poll date, user, operation)``. It does not
+    keep the payload: a retry renders the message from the current poll state,
+    so a later update for the same message replaces the earlier one. Entries
+    are retried with jittered exponential backoff and become dead letters after
+    ``max_attempts`` or on an error that cannot go away by itself.
+
+    ``send(operation, entries)`` performs the retries and returns a
+    :class:`fanout.FanOutReport` over the entries.
+    """
+
+    def __init__(self, store, send: Callable, max_attempts: int = 6,
+                 base_delay: float = 2.0, max_delay: float = 300.0):
+        self.store = store
+        self.send = send
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread: Optional[threading.Thread] = None
+        self._next_wake = 0.0
+
+    def _backoff(self, attempts: int) -> float:
+        # Half of the delay is fixed and half random, so retries of one wave spread out
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _fail(self, entry: Dict, error: Exception) -> None:
+        entry["attempts"] += 1
+        if isinstance(error, SlackApiError):
+            entry["last_error"] = error.response.get("error") or f"HTTP {error.response.status_code}"
+        else:
+            entry["last_error"] = str(error) or type(error).__name__
+        if entry["attempts"] >= self.max_attempts or not is_retryable(error):
+            entry["dead"] = True
+        else:
+            entry["next_attempt"] = time.time() + self._backoff(entry["attempts"])
+
+    def add(self, poll_date: str, user_id: str, operation: str, error: Exception) -> None:
+        """Queue a failed operation, unless it is already queued"""
+        key = outbound_key(poll_date, user_id, operation)
+        with self._lock:
+            if key in self._entries and not self._entries[key]["dead"]:
+                return
+            entry = {"key": key, "poll_date": poll_date, "user_id": user_id, "operation": operation,
+                     "attempts": 0, "next_attempt": 0.0, "last_error": None, "dead": False}
+            self._fail(entry, error)
+            self._entries[key] = entry
+        self.store.save_outbound(dict(entry))
+        if entry["dead"]:
+            logger.warning("Gave up on %s for %s on %s: %s", operation, user_id, poll_date, error)
+        else:
+            self._start(entry["next_attempt"])
+
+    def complete(self, poll_date: str, user_id: str, operation: str) -> None:
+        """Forget a queued operation that went through some other way, e.g. a later update"""
+        key = outbound_key(poll_date, user_id, operation)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["dead"]:
+                return
+            del self._entries[key]
+        self.store.delete_outbound(key)
+
+    def discard_poll(self, poll_date: str) -> None:
+        """Drop everything still queued for a poll that was deleted"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if entry["poll_date"] == poll_date and not entry["dead"]]
+            for key in keys:
+                del self._entries[key]
+        for key in keys:
+            self.store.delete_outbound(key)
+
+    def resume(self) -> None:
+        """Pick up the entries queued before the last shutdown"""
+        entries = self.store.load_outbound()
+        with self._lock:
+            for entry in entries:
+                self._entries.setdefault(entry["key"], entry)
+        pending = sum(1 for entry in entries if not entry["dead"])
+        if pending:
+            logger.info("Resuming %d queued outbound messages", pending)
+            self._start(0.0)
+
+    def dead_letters(self) -> List[Dict]:
+        with self._lock:
+            return sorted((dict(entry) for entry in self._entries.values() if entry["dead"]),
+                          key=lambda entry: entry["key"])
+
+    def retry_dead(self) -> int:
+        """Queue every dead letter again with a fresh attempt budget"""
+        with self._lock:
+            revived = [entry for entry in self._entries.values() if entry["dead"]]
+            for entry in revived:
+                entry.update(dead=False, attempts=0, next_attempt=0.0)
+        for entry in revived:
+            self.store.save_outbound(dict(entry))
+        if revived:
+            self._start(0.0)
+        return len(revived)
+
+    def clear_dead(self) -> int:
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry["dead"]]
+            for key in keys:
+                del self._entries[key]
+        for key in keys:
+            self.store.delete_outbound(key)
+        return len(keys)
+
+    def progress(self) -> Dict[str, int]:
+        with self._lock:
+            dead = sum(1 for entry in self._entries.values() if entry["dead"])
+            return {"pending": len(self._entries) - dead, "dead": dead}
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until nothing is queued for a retry"""
+        return self._idle.wait(timeout)
+
+    def _start(self, due: float) -> None:
+        """Make sure the retry thread runs and wakes up by ``due``"""
+        with self._lock:
+            self._idle.clear()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+                self._thread.start()
+            elif due < self._next_wake:
+                self._next_wake = due
+                self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                pending = [entry for entry in self._entries.values() if not entry["dead"]]
+                if not pending:
+                    self._thread = None
+                    self._idle.set()
+                    return
+                now = time.time()
+                due = [dict(entry) for entry in pending if entry["next_attempt"] <= now]
+                self._next_wake = min(entry["next_attempt"] for entry in pending)
+                self._wakeup.clear()
+            if not due:
+                self._wakeup.wait(max(0.0, self._next_wake - now))
+                continue
+
+            for operation in sorted({entry["operation"] for entry in due}):
+                batch = [entry for entry in due if entry["operation"] == operation]
+                try:
+                    report = self.send(operation, batch)
+                except Exception as e:
+                    logger.exception("Error retrying queued %s messages: %s", operation, e)
+                    succeeded, failed = [], [(entry, e) for entry in batch]
+                else:
+                    succeeded = [entry for entry, _ in report.succeeded]
+                    failed = report.failed
+                self._settle(succeeded, failed)
+
+    def _settle(self, succeeded: List[Dict], failed: List) -> None:
+        updated = []
+        with self._lock:
+            for entry in succeeded:
+                self._entries.pop(entry["key"], None)
+            for entry, error in failed:
+                current = self._entries.get(entry["key"])
+                if current is None:
+                    continue
+                self._fail(current, error)
+                updated.append(dict(current))
+                if current["dead"]:
+                    logger.warning("Gave up on %s for %s on %s after %d attempts: %s", current["operation"],
+                                   current["user_id"], current["poll_date"], current["attempts"], error)
+        for entry in succeeded:
+            self.store.delete_outbound(entry["key"])
+        for entry in updated:
+            self.store.save_outbound(entry)
@@ -0,0 +1,260 @@
+import sys
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+
+class MessageRef:
+    """Channel and timestamp of one tracked poll message"""
+
+    __slots__ = ("channel", "ts")
+
+    def __init__(self, channel: str, ts: str):
+        # The same DM channel IDs come back every poll, so keep one copy of each
+        self.channel = sys.intern(channel)
+        self.ts = ts
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"channel": self.channel, "ts": self.ts}
+
+
+@dataclass(frozen=True)
+class PollSnapshot:
+    """Immutable view of the poll state at one version
+
+    ``responses`` and the voters are those of ``poll_date``. A weekly poll
+    covers several ``dates``, each with a snapshot of its own from :meth:`day`.
+    """
+
+    poll_date: Optional[str]
+    version: int
+    responses: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    _voters: Mapping[str, Tuple[str, ...]] = field(default_factory=lambda: MappingProxyType({}))
+    dates: Tuple[str, ...] = ()
+    _days: Mapping[str, "PollSnapshot"] = field(default_factory=lambda: MappingProxyType({}))
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def get(self, user: str) -> Optional[str]:
+        return self.responses.get(user)
+
+    def count(self, response: str) -> int:
+        return len(self._voters.get(response, ()))
+
+    def voters(self, response: str) -> List[str]:
+        return list(self._voters.get(response, ()))
+
+    def day(self, poll_date: Optional[str]) -> Optional["PollSnapshot"]:
+        """Snapshot of one day the poll covers, or None"""
+        return self._days.get(poll_date)
+
+
+class PollState:
+    """Thread-safe state of the active poll
+
+    Votes, poll changes and message tracking are serialized by a lock. Readers
+    take an immutable :class:`PollSnapshot`, which is built at most once per
+    version, so rendering and fan-out never see a half-applied change. Every
+    change bumps ``version``, which also keys the rendered summary cache.
+
+    A poll is identified by its ``poll_date`` and covers one or more ``dates``
+    (a weekly poll covers every workday of the week). Responses are kept per
+    covered date, and the day snapshots of dates without new votes are reused.
+
+    With ``max_tracked_polls`` set, only that many of the most recent polls
+    keep their messages in memory. Older ones stay in the state store.
+    """
+
+    def __init__(self, poll_date: Optional[str] = None, responses: Optional[Dict[str, Dict[str, str]]] = None,
+                 messages: Optional[Dict[str, Dict[str, Dict[str, str]]]] = None,
+                 max_tracked_polls: Optional[int] = None, dates: Optional[List[str]] = None):
+        self._lock = threading.RLock()
+        self.version = 0
+        self.max_tracked_polls = max_tracked_polls
+        self._poll_date = poll_date
+        self._dates: Tuple[str, ...] = ()
+        # Responses per covered date and user
+        self._responses: Dict[str, Dict[str, str]] = {}
+        # Voters per covered date and response value, in voting order (dicts used as ordered sets)
+        self._voters: Dict[str, Dict[str, Dict[str, None]]] = {}
+        # Version of the last change of each covered date, and the day snapshots built for it
+        self._changed: Dict[str, int] = {}
+        self._day_snapshots: Dict[str, PollSnapshot] = {}
+        # Tracked poll messages per poll date and user ID
+        self._messages: Dict[str, Dict[str, MessageRef]] = {
+            date: {user_id: MessageRef(info["channel"], info["ts"]) for user_id, info in tracked.items()}
+            for date, tracked in (messages or {}).items()
+        }
+        self._snapshot: Optional[PollSnapshot] = None
+        if poll_date is not None:
+            self._cover(poll_date, dates)
+        for day, day_responses in (responses or {}).items():
+            for user, response in day_responses.items():
+                self._apply(day, user, response)
+
+    @property
+    def poll_date(self) -> Optional[str]:
+        return self._poll_date
+
+    @property
+    def dates(self) -> Tuple[str, ...]:
+        return self._dates
+
+    def __len__(self) -> int:
+        return len(self._responses.get(self._poll_date, ()))
+
+    def _cover(self, poll_date: Optional[str], dates: Optional[List[str]]) -> None:
+        self._dates = tuple(dates or [poll_date]) if poll_date is not None else ()
+        self._responses = {day: {} for day in self._dates}
+        self._voters = {day: {} for day in self._dates}
+        self._changed = {day: self.version for day in self._dates}
+        self._day_snapshots.clear()
+
+    def _apply(self, day: str, user: str, response: str) -> bool:
+        responses = self._responses.get(day)
+        if responses is None:
+            return False
+        previous = responses.get(user)
+        if previous == response:
+            return False
+        voters = self._voters[day]
+        if previous is not None:
+            del voters[previous][user]
+        voters.setdefault(response, {})[user] = None
+        responses[user] = response
+        self.version += 1
+        self._changed[day] = self.version
+        return True
+
+    def record(self, user: str, response: str,
+               on_change: Optional[Callable[[str, str, str], None]] = None,
+               day: Optional[str] = None) -> Optional[str]:
+        """Record a vote for one date of the active poll, by default its ``poll_date``
+
+        ``on_change(day, user, response)`` is called while the lock is still
+        held, so persisted votes are written in the same order as they were
+        applied. Returns the date of the active poll, or None if there is no
+        active poll covering ``day`` or the vote did not change anything.
+        """
+        with self._lock:
+            day = day or self._poll_date
+            if self._poll_date is None or not self._apply(day, user, response):
+                return None
+            if on_change is not None:
+                on_change(day, user, response)
+            return self._poll_date
+
+    def start(self, poll_date: str, dates: Optional[List[str]] = None) -> List[str]:
+        """Make ``poll_date`` the active poll covering ``dates``, with no responses yet
+
+        Returns the poll dates whose messages were evicted from memory to stay
+        within ``max_tracked_polls``.
+        """
+        with self._lock:
+            self._poll_date = poll_date
+            self._cover(poll_date, dates)
+            self._messages.setdefault(poll_date, {})
+            self.version += 1
+
+            evicted = []
+            if self.max_tracked_polls is not None:
+                older = sorted(date for date in self._messages if date != poll_date)
+                while older and len(self._messages) > self.max_tracked_polls:
+                    date = older.pop(0)
+                    del self._messages[date]
+                    evicted.append(date)
+            return evicted
+
+    def is_tracked(self, poll_date: Optional[str]) -> bool:
+        return poll_date in self._messages
+
+    def track_message(self, poll_date: str, user_id: str, channel: str, ts: str) -> None:
+        with self._lock:
+            self._messages.setdefault(poll_date, {})[user_id] = MessageRef(channel, ts)
+
+    def message_count(self, poll_date: Optional[str]) -> int:
+        return len(self._messages.get(poll_date, ()))
+
+    def messages(self, poll_date: Optional[str]) -> List[Tuple[str, MessageRef]]:
+        """Return a stable copy of the messages tracked for a poll date"""
+        with self._lock:
+            return list(self._messages.get(poll_date, {}).items())
+
+    def end(self, poll_date: str) -> Optional[List[Tuple[str, MessageRef]]]:
+        """Forget a poll, and its responses if it is the active one
+
+        Returns the messages that were tracked for it, or None if the poll was
+        not tracked.
+        """
+        with self._lock:
+            if poll_date not in self._messages:
+                return None
+            messages = list(self._messages.pop(poll_date).items())
+            if poll_date == self._poll_date:
+                self._poll_date = None
+                self._cover(None, None)
+            self.version += 1
+            return messages
+
+    def sync(self, load: Callable[[], Tuple[Optional[str], List[str], Dict[str, Dict[str, str]],
+                                            Dict[str, Dict[str, str]]]]) -> bool:
+        """Merge in the active poll as stored by another replica
+
+        ``load()`` returns ``(poll_date, dates, responses, messages)`` and is
+        called while the lock is held. Votes persist through
+        :meth:`record`'s ``on_change`` under the same lock, so a store that
+        flushes its pending writes in ``load()`` already holds every vote
+        applied here, and no vote can land between the read and the merge.
+        Returns True if the active poll or its responses changed.
+        """
+        with self._lock:
+            poll_date, dates, responses, messages = load()
+            version = self.version
+            if poll_date is None:
+                if self._poll_date is not None:
+                    self.end(self._poll_date)
+            elif poll_date != self._poll_date or tuple(dates or [poll_date]) != self._dates:
+                self.start(poll_date, dates)
+            if poll_date is not None:
+                for day, day_responses in responses.items():
+                    for user, response in day_responses.items():
+                        self._apply(day, user, response)
+                tracked = self._messages.setdefault(poll_date, {})
+                for user_id, info in messages.items():
+                    if user_id not in tracked:
+                        tracked[user_id] = MessageRef(info["channel"], info["ts"])
+            return self.version != version
+
+    def snapshot(self) -> PollSnapshot:
+        """Return an immutable snapshot of the active poll"""
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != self.version:
+                days = {day: self._day_snapshot(day) for day in self._dates}
+                first = days.get(self._poll_date)
+                self._snapshot = PollSnapshot(
+                    poll_date=self._poll_date,
+                    version=self.version,
+                    responses=first.responses if first is not None else MappingProxyType({}),
+                    _voters=first._voters if first is not None else MappingProxyType({}),
+                    dates=self._dates,
+                    _days=MappingProxyType(days),
+                )
+            return self._snapshot
+
+    def _day_snapshot(self, day: str) -> PollSnapshot:
+        # Stamped with the version of the day's last change, so a day without new votes keeps its snapshot
+        snapshot = self._day_snapshots.get(day)
+        if snapshot is None or snapshot.version != self._changed[day]:
+            snapshot = PollSnapshot(
+                poll_date=day,
+                version=self._changed[day],
+                responses=MappingProxyType(dict(self._responses[day])),
+                _voters=MappingProxyType({
+                    response: tuple(voters) for response, voters in self._voters[day].items()
+                }),
+                dates=(day,),
+            )
+            self._day_snapshots[day] = snapshot
+        return snapshot
@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshCoalescer:
+    """Coalesce summary refresh requests and flush them at most once per window"""
+
+    def __init__(self, flush: Callable[[str], None], window: float = 2.0):
+        self._flush = flush
+        self.window = window
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_flush = 0.0
+        self._flushing = 0
+
+    def start(self) -> None:
+        """Start the background flusher if it is not already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="summary-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background flusher after pushing any pending refreshes"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def mark_dirty(self, poll_date: Optional[str]) -> None:
+        """Record that the summary for a poll date needs to be refreshed"""
+        if not poll_date:
+            return
+        with self._lock:
+            self._dirty.add(poll_date)
+        self.start()
+        self._wakeup.set()
+
+    def discard(self, poll_date: Optional[str]) -> None:
+        """Drop a pending refresh, e.g. because the poll was deleted"""
+        with self._lock:
+            self._dirty.discard(poll_date)
+
+    def flush_now(self) -> None:
+        """Push all pending refreshes immediately"""
+        with self._lock:
+            pending = self._dirty
+            self._dirty = set()
+            if not pending:
+                return
+            self._flushing += 1
+        try:
+            for poll_date in sorted(pending):
+                try:
+                    self._flush(poll_date)
+                except Exception as e:
+                    logger.error("Error refreshing summaries for %s: %s", poll_date, e)
+        finally:
+            self._last_flush = time.monotonic()
+            with self._lock:
+                self._flushing -= 1
+
+    def wait_idle(self, timeout: Optional[float] = None, poll_interval: float = 0.01) -> bool:
+        """Wait until no refresh is pending or running, returning False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._dirty and not self._flushing:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Hold back until the window since the previous flush has passed so
+            # that a burst of votes collapses into a single refresh
+            delay = self._last_flush + self.window - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                break
+            self.flush_now()
+        self.flush_now()
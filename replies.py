@@ -0,0 +1,239 @@
+"""Replies of the slash commands, shared by the sync and async Bolt apps
+
+Each function returns the keyword arguments for ``respond``.
+"""
+from datetime import date, datetime
+from typing import Any, Dict
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+HELP_TEXT = """
+*Available Commands:*
+• `/attendance-poll` - Manually trigger attendance poll
+• `/new-poll` - Force create a new poll (deletes previous one)
+• `/delete-poll` - Delete the current active poll
+• `/attendance-stats [date]` - Show attendance statistics for the next poll day, or for a date of the weekly poll
+• `/attendance-history [days]` - Show past polls and your own attendance (default 30 days)
+• `/attendance-trends [weeks]` - Show weekday and rolling attendance averages (default 12 weeks)
+• `/attendance-mute <days>` - Mute the bot for the specified number of days
+• `/attendance-mute <first day> <last day>` - Mute the bot for a later period, e.g. `/attendance-mute 2024-07-01 2024-07-14`
+• `/attendance-unmute` - Unmute the bot if it's currently muted
+• `/attendance-mute-status` - Check your current mute status
+• `/attendance-dlq [retry|clear]` - List undeliverable poll messages, retry or drop them
+• `/attendance-help` - Show this help message
+
+*How it works:*
+• Bot automatically sends attendance polls at 18:00 (Berlin time)
+• Each user receives a private message with the poll
+• Responses are collected and summarized
+• You can use the commands above to manage the polls
+"""
+
+
+def mrkdwn(text: str) -> Dict[str, Any]:
+    return {"blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]}
+
+
+def percent(part, whole):
+    return f"{part / whole:.0%}" if whole else "n/a"
+
+
+def parse_period(text, default, maximum):
+    """Parse the optional number argument of a history command"""
+    text = text.strip()
+    if not text:
+        return default
+    value = int(text)
+    if value <= 0 or value > maximum:
+        raise ValueError(value)
+    return value
+
+
+def help_reply() -> Dict[str, Any]:
+    return mrkdwn(HELP_TEXT)
+
+
+def delete_poll(tenant) -> Dict[str, Any]:
+    if tenant.delete_previous_messages():
+        return {"text": f"Previous attendance poll is being deleted "
+                        f"({tenant.deletion_job.progress()['pending']} messages left)."}
+    return {"text": "No active poll found to delete."}
+
+
+def new_poll_started(deleting) -> Dict[str, Any]:
+    if deleting:
+        return {"text": "Sending a new attendance poll. The previous one is being deleted in the background."}
+    return {"text": "Sending a new attendance poll."}
+
+
+def new_poll_sent(tenant) -> Dict[str, Any]:
+    return {"text": f"New attendance poll has been sent to {tenant.poll.message_count(tenant.poll.poll_date)} users."}
+
+
+def stats(tenant, body) -> Dict[str, Any]:
+    text = body.get("text", "").strip()
+    try:
+        poll_date = date.fromisoformat(text).isoformat() if text else None
+    except ValueError:
+        return {"text": "Please provide a date like `2024-05-13`. Example: `/attendance-stats 2024-05-13`"}
+
+    stats = tenant.get_attendance_stats(poll_date)
+    if stats is None:
+        return {"text": f"The active poll does not cover {poll_date}."}
+    text = (
+        f"*Attendance Statistics for {stats['date']}*\n"
+        f"• Total Responses: {stats['total_responses']}\n"
+        f"• Coming: {stats['coming']}\n"
+        f"• Not Coming: {stats['not_coming']}\n"
+        f"• Maybe: {stats['maybe']}\n"
+        f"• No Response: {stats['no_response']}"
+    )
+    if len(stats['dates']) > 1:
+        text += f"\n_The poll also covers {', '.join(day for day in stats['dates'] if day != stats['date'])}._"
+    return mrkdwn(text)
+
+
+def history(tenant, body) -> Dict[str, Any]:
+    try:
+        days = parse_period(body.get("text", ""), 30, 3660)
+    except ValueError:
+        return {"text": "Please provide a number of days between 1 and 3660. Example: `/attendance-history 30`"}
+
+    history = tenant.get_attendance_history(body["user_name"], days)
+    if not history["days"]:
+        return {"text": f"No attendance history recorded since {history['since']}."}
+
+    lines = [f"*Attendance history since {history['since']}*"]
+    # Newest polls first, a long window would not fit in one message
+    for day in reversed(history["days"][-20:]):
+        lines.append(f"• {day.poll_date} ({WEEKDAY_NAMES[day.weekday][:3]}): {day.yes} coming, {day.no} not coming, "
+                     f"{day.maybe} maybe, {percent(day.responses, day.polled)} responded")
+    if len(history["days"]) > 20:
+        lines.append(f"_…and {len(history['days']) - 20} earlier polls_")
+
+    totals = history["totals"]
+    user = history["user"]
+    answered = user["yes"] + user["no"] + user["maybe"]
+    lines.append("")
+    lines.append(f"Average: {totals['yes'] / totals['polls']:.1f} coming per poll, "
+                 f"{percent(totals['responses'], totals['polled'])} responded")
+    lines.append(f"You: coming {user['yes']}, not coming {user['no']}, maybe {user['maybe']} "
+                 f"out of {user['polls']} polls ({percent(user['yes'], answered)} of your answers were yes)")
+    return mrkdwn("\n".join(lines))
+
+
+def trends(tenant, body) -> Dict[str, Any]:
+    try:
+        weeks = parse_period(body.get("text", ""), 12, 520)
+    except ValueError:
+        return {"text": "Please provide a number of weeks between 1 and 520. Example: `/attendance-trends 12`"}
+
+    trends = tenant.get_attendance_trends(weeks)
+    totals = trends["totals"]
+    if not totals["polls"]:
+        return {"text": f"No attendance history recorded since {trends['since']}."}
+
+    lines = [f"*Attendance trends since {trends['since']}* ({totals['polls']} polls)", "", "*By weekday:*"]
+    for weekday, averages in trends["weekdays"].items():
+        lines.append(f"• {WEEKDAY_NAMES[weekday]}: {averages['average_yes']:.1f} coming on average, "
+                     f"{averages['response_rate']:.0%} responded ({averages['polls']} polls)")
+
+    lines.append("")
+    lines.append(f"*Rolling average over {trends['window']} polls:*")
+    # One point per week keeps long ranges readable
+    weekly = {}
+    for poll_date, average in trends["rolling"]:
+        weekly[datetime.strptime(poll_date, "%Y-%m-%d").isocalendar()[:2]] = (poll_date, average)
+    for poll_date, average in list(weekly.values())[-12:]:
+        lines.append(f"• {poll_date}: {average:.1f} coming")
+    return mrkdwn("\n".join(lines))
+
+
+def dead_letters(tenant, body) -> Dict[str, Any]:
+    action = body.get("text", "").strip().lower()
+    if action == "retry":
+        return {"text": f"Retrying {tenant.outbox.retry_dead()} undeliverable messages."}
+    if action == "clear":
+        return {"text": f"Dropped {tenant.outbox.clear_dead()} undeliverable messages."}
+    if action:
+        return {"text": "Unknown option. Use `/attendance-dlq`, `/attendance-dlq retry` or `/attendance-dlq clear`."}
+
+    progress = tenant.outbox.progress()
+    letters = tenant.outbox.dead_letters()
+    if not letters:
+        return {"text": f"No undeliverable messages ({progress['pending']} queued for a retry)."}
+
+    lines = [f"*Undeliverable messages* ({len(letters)}, {progress['pending']} more queued for a retry)"]
+    for entry in letters[:20]:
+        lines.append(f"• {entry['poll_date']} <@{entry['user_id']}> {entry['operation']}: "
+                     f"{entry['last_error']} ({entry['attempts']} attempts)")
+    if len(letters) > 20:
+        lines.append(f"_…and {len(letters) - 20} more_")
+    lines.append("Use `/attendance-dlq retry` to send them again or `/attendance-dlq clear` to drop them.")
+    return mrkdwn("\n".join(lines))
+
+
+def mute_period(tenant, body, first, last) -> Dict[str, Any]:
+    try:
+        start = date.fromisoformat(first)
+        until = date.fromisoformat(last)
+    except ValueError:
+        return {"text": "Please provide two dates like `2024-07-01 2024-07-14`."}
+    if until < start:
+        return {"text": "The last day of the mute cannot be before its first day."}
+    if until < datetime.now(tenant.timezone()).date():
+        return {"text": "That period is already over."}
+
+    tenant.mute_between(body["user_id"], start, until)
+    return {"text": f"You have muted the attendance bot from {start.strftime('%A, %B %d, %Y')} "
+                    f"until {until.strftime('%A, %B %d, %Y')}. "
+                    f"You will not receive attendance polls in that period."}
+
+
+def mute(tenant, body) -> Dict[str, Any]:
+    text = body.get("text", "").strip()
+    try:
+        # Parse the number of days from the command
+        if not text:
+            return {"text": "Please specify the number of days to mute the bot. Example: `/attendance-mute 5`"}
+
+        # Or the first and last day of a mute planned ahead
+        if len(text.split()) == 2:
+            return mute_period(tenant, body, *text.split())
+
+        days = int(text)
+        if days <= 0:
+            return {"text": "Please provide a positive number of days."}
+
+        # Store the mute information
+        expiration_date = tenant.mute(body["user_id"], days)
+
+        # Format the expiration date for the response
+        formatted_date = expiration_date.strftime("%A, %B %d, %Y")
+
+        return {"text": f"You have muted the attendance bot until {formatted_date}. "
+                        f"You will not receive attendance polls until then."}
+    except ValueError:
+        return {"text": "Invalid input. Please provide a number of days to mute the bot. Example: `/attendance-mute 5`"}
+    except Exception as e:
+        return {"text": f"Error processing your request: {e}"}
+
+
+def unmute(tenant, body) -> Dict[str, Any]:
+    if tenant.unmute(body["user_id"]):
+        return {"text": "You have successfully unmuted the attendance bot. You will now receive attendance polls."}
+    return {"text": "You are not currently muted and are already receiving attendance polls."}
+
+
+def mute_status(tenant, body) -> Dict[str, Any]:
+    mute = tenant.mute_status(body["user_id"])
+    if mute is not None:
+        start, expiration_date = mute
+        formatted_date = expiration_date.strftime("%A, %B %d, %Y")
+        if start is not None:
+            return {"text": f"You will mute the attendance bot from {start.strftime('%A, %B %d, %Y')} "
+                            f"until {formatted_date}. Until then you are receiving attendance polls."}
+        current_date = datetime.now(tenant.timezone()).date()
+        days_left = (expiration_date - current_date).days
+        return {"text": f"You have muted the attendance bot until {formatted_date} ({days_left} days remaining)."}
+    return {"text": "You are not currently muted and are receiving attendance polls."}
@@ -0,0 +1,575 @@
+import logging
+from abc import ABC, abstractmethod
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import ConfigurationError
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+    """Storage interface for poll state that has to survive restarts"""
+
+    @abstractmethod
+    def load_active_poll(self) -> Tuple[Optional[str], List[str], Dict[str, Dict[str, str]],
+                                        Dict[str, Dict[str, str]]]:
+        """Return the active poll date, the dates it covers, the responses per date and its tracked messages"""
+
+    @abstractmethod
+    def set_active_poll(self, poll_date: Optional[str], dates: Optional[List[str]] = None) -> None:
+        """Make ``poll_date`` the active poll, covering ``dates`` (by default only itself)"""
+
+    @abstractmethod
+    def save_response(self, poll_date: str, user: str, response: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear_responses(self, poll_date: str) -> None:
+        ...
+
+    @abstractmethod
+    def save_message(self, poll_date: str, user_id: str, channel: str, ts: str) -> None:
+        ...
+
+    @abstractmethod
+    def load_messages(self, poll_date: str) -> Dict[str, Dict[str, str]]:
+        """Return the tracked messages of any poll that has not been deleted"""
+
+    @abstractmethod
+    def load_summary_message(self, poll_date: str) -> Optional[Dict[str, str]]:
+        """Return the shared channel summary message of a poll, if any"""
+
+    @abstractmethod
+    def save_summary_message(self, poll_date: str, channel: str, ts: str) -> None:
+        ...
+
+    @abstractmethod
+    def retire_poll(self, poll_date: str, deletions: List[Dict[str, str]]) -> None:
+        """Forget a poll and checkpoint its messages as pending deletions, in one step
+
+        Clears the active poll if it is ``poll_date``. ``deletions`` are
+        ``{"channel": ..., "ts": ...}`` entries.
+        """
+
+    @abstractmethod
+    def purge_polls(self, before: str) -> None:
+        """Forget every inactive poll dated before ``before``"""
+
+    @abstractmethod
+    def load_pending_deletions(self) -> List[Dict[str, str]]:
+        """Return the checkpointed messages that still have to be deleted"""
+
+    @abstractmethod
+    def complete_deletion(self, channel: str, ts: str) -> None:
+        ...
+
+    @abstractmethod
+    def load_outbound(self) -> List[Dict[str, Any]]:
+        """Return the queued and dead outbound entries"""
+
+    @abstractmethod
+    def save_outbound(self, entry: Dict[str, Any]) -> None:
+        """Insert or replace an outbound entry by its ``key``"""
+
+    @abstractmethod
+    def delete_outbound(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def load_history_users(self) -> Dict[str, int]:
+        """Return the stable history index of every user who ever answered"""
+
+    @abstractmethod
+    def load_history(self, since: Optional[str] = None) -> List[Tuple[str, bytes, int]]:
+        """Return ``(poll_date, codes, polled)`` day vectors from ``since`` on"""
+
+    @abstractmethod
+    def save_history_day(self, poll_date: str, codes: bytes, polled: int,
+                         new_users: List[Tuple[str, int]]) -> None:
+        """Store a day vector together with the users it introduced, in one step"""
+
+    @abstractmethod
+    def load_mutes(self) -> Dict[str, Tuple[Optional[date], date]]:
+        """Return the ``(start, until)`` days of every mute, ``start`` is None for mutes that applied right away"""
+
+    @abstractmethod
+    def save_mute(self, user_id: str, until: date, start: Optional[date] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete_mute(self, user_id: str) -> None:
+        ...
+
+    def changed(self) -> bool:
+        """Whether another replica may have changed the stored state since the last call"""
+        return False
+
+    def flush(self) -> None:
+        """Block until all pending writes are durable"""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MemoryStore(StateStore):
+    """Non-persistent store, useful for tests and throwaway runs"""
+
+    def __init__(self):
+        self.active_poll: Optional[str] = None
+        self.active_dates: List[str] = []
+        self.responses: Dict[str, Dict[str, str]] = {}
+        self.messages: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.summary_messages: Dict[str, Dict[str, str]] = {}
+        self.pending_deletions: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self.outbound: Dict[str, Dict[str, Any]] = {}
+        self.history_users: Dict[str, int] = {}
+        self.history: Dict[str, Tuple[bytes, int]] = {}
+        self.mutes: Dict[str, Tuple[Optional[date], date]] = {}
+        self._lock = threading.Lock()
+
+    def load_active_poll(self):
+        with self._lock:
+            poll_date = self.active_poll
+            if poll_date is None:
+                return None, [], {}, {}
+            dates = list(self.active_dates or [poll_date])
+            return (poll_date,
+                    dates,
+                    {day: dict(self.responses[day]) for day in dates if day in self.responses},
+                    {user_id: dict(info) for user_id, info in self.messages.get(poll_date, {}).items()})
+
+    def set_active_poll(self, poll_date, dates=None):
+        with self._lock:
+            self.active_poll = poll_date
+            self.active_dates = list(dates or [])
+
+    def save_response(self, poll_date, user, response):
+        with self._lock:
+            self.responses.setdefault(poll_date, {})[user] = response
+
+    def clear_responses(self, poll_date):
+        with self._lock:
+            self.responses.pop(poll_date, None)
+
+    def save_message(self, poll_date, user_id, channel, ts):
+        with self._lock:
+            self.messages.setdefault(poll_date, {})[user_id] = {"channel": channel, "ts": ts}
+
+    def load_messages(self, poll_date):
+        with self._lock:
+            return {user_id: dict(info) for user_id, info in self.messages.get(poll_date, {}).items()}
+
+    def load_summary_message(self, poll_date):
+        with self._lock:
+            message = self.summary_messages.get(poll_date)
+            return dict(message) if message else None
+
+    def save_summary_message(self, poll_date, channel, ts):
+        with self._lock:
+            self.summary_messages[poll_date] = {"channel": channel, "ts": ts}
+
+    def retire_poll(self, poll_date, deletions):
+        with self._lock:
+            for message in deletions:
+                self.pending_deletions[(message["channel"], message["ts"])] = dict(message)
+            self.responses.pop(poll_date, None)
+            self.messages.pop(poll_date, None)
+            self.summary_messages.pop(poll_date, None)
+            if self.active_poll == poll_date:
+                self.active_poll = None
+
+    def purge_polls(self, before):
+        with self._lock:
+            for table in (self.responses, self.messages, self.summary_messages):
+                for poll_date in [d for d in table if d < before and d != self.active_poll]:
+                    del table[poll_date]
+
+    def load_pending_deletions(self):
+        with self._lock:
+            return [dict(message) for message in self.pending_deletions.values()]
+
+    def complete_deletion(self, channel, ts):
+        with self._lock:
+            self.pending_deletions.pop((channel, ts), None)
+
+    def load_outbound(self):
+        with self._lock:
+            return [dict(entry) for entry in self.outbound.values()]
+
+    def save_outbound(self, entry):
+        with self._lock:
+            self.outbound[entry["key"]] = dict(entry)
+
+    def delete_outbound(self, key):
+        with self._lock:
+            self.outbound.pop(key, None)
+
+    def load_history_users(self):
+        with self._lock:
+            return dict(self.history_users)
+
+    def load_history(self, since=None):
+        with self._lock:
+            return [(poll_date, codes, polled) for poll_date, (codes, polled) in sorted(self.history.items())
+                    if since is None or poll_date >= since]
+
+    def save_history_day(self, poll_date, codes, polled, new_users):
+        with self._lock:
+            self.history_users.update(new_users)
+            self.history[poll_date] = (bytes(codes), polled)
+
+    def load_mutes(self):
+        with self._lock:
+            return dict(self.mutes)
+
+    def save_mute(self, user_id, until, start=None):
+        with self._lock:
+            self.mutes[user_id] = (start, until)
+
+    def delete_mute(self, user_id):
+        with self._lock:
+            self.mutes.pop(user_id, None)
+
+
+class SQLiteStore(StateStore):
+    """SQLite store in WAL mode with writes batched on a background thread"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS responses (
+            poll_date TEXT NOT NULL,
+            user TEXT NOT NULL,
+            response TEXT NOT NULL,
+            PRIMARY KEY (poll_date, user)
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            poll_date TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            PRIMARY KEY (poll_date, user_id)
+        );
+        CREATE TABLE IF NOT EXISTS summary_messages (
+            poll_date TEXT PRIMARY KEY,
+            channel TEXT NOT NULL,
+            ts TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pending_deletions (
+            channel TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            PRIMARY KEY (channel, ts)
+        );
+        CREATE TABLE IF NOT EXISTS outbox (
+            key TEXT PRIMARY KEY,
+            poll_date TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            dead INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS history_users (
+            user TEXT PRIMARY KEY,
+            idx INTEGER NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS history_days (
+            poll_date TEXT PRIMARY KEY,
+            codes BLOB NOT NULL,
+            polled INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS mutes (
+            user_id TEXT PRIMARY KEY,
+            until TEXT NOT NULL,
+            starts TEXT
+        );
+        CREATE TABLE IF NOT EXISTS writers (
+            writer TEXT PRIMARY KEY,
+            changes INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = self._connect()
+        self._conn.executescript(self.SCHEMA)
+        # Databases from before mutes could start on a later day
+        if "starts" not in {row[1] for row in self._conn.execute("PRAGMA table_info(mutes)")}:
+            try:
+                self._conn.execute("ALTER TABLE mutes ADD COLUMN starts TEXT")
+            except sqlite3.OperationalError:
+                # Another replica added it first
+                pass
+        self._conn.commit()
+        self._data_version: Optional[int] = None
+        # Every transaction also counts up this store's row in writers, so changed() can tell
+        # another replica's commits from its own
+        self._writer_id = uuid.uuid4().hex
+        self._other_changes: Optional[Dict[str, int]] = None
+
+        # Each item is a list of statements that always end up in the same transaction
+        self._writes: "queue.Queue[Optional[List[Tuple[str, Tuple[Any, ...]]]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="state-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        while True:
+            item = self._writes.get()
+            batch = [item]
+            # Drain whatever else is already queued into the same transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            items = [statements for statements in batch if statements is not None]
+            try:
+                self._commit(conn, items)
+            except Exception as e:
+                # Write the items one by one, so only the one that fails is lost
+                logger.warning("Error writing %d batched poll state changes, writing them one by one: %s",
+                               len(items), e)
+                for statements in items:
+                    try:
+                        self._commit(conn, [statements])
+                    except Exception as e:
+                        logger.error("Dropped a poll state change (%s): %s",
+                                     "; ".join(f"{sql.split('(')[0].strip()} {params}" for sql, params in statements),
+                                     e)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _commit(self, conn: sqlite3.Connection, items: List[List[Tuple[str, Tuple[Any, ...]]]]) -> None:
+        """Execute the items in one transaction, rolled back as a whole if any statement fails"""
+        if not items:
+            return
+        with conn:
+            for statements in items:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+            conn.execute("INSERT INTO writers (writer, changes) VALUES (?, 1) "
+                         "ON CONFLICT (writer) DO UPDATE SET changes = changes + 1", (self._writer_id,))
+
+    def _write(self, sql: str, params: Tuple[Any, ...]) -> None:
+        self._writes.put([(sql, params)])
+
+    def load_active_poll(self):
+        self.flush()
+        meta = dict(self._conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('active_poll', 'active_dates')"
+        ).fetchall())
+        poll_date = meta.get('active_poll')
+        if poll_date is None:
+            return None, [], {}, {}
+
+        # Stores written before weekly polls have no covered dates
+        dates = meta['active_dates'].split(",") if meta.get('active_dates') else [poll_date]
+        responses = {}
+        for day, user, response in self._conn.execute(
+            f"SELECT poll_date, user, response FROM responses WHERE poll_date IN ({', '.join('?' * len(dates))})",
+            dates
+        ):
+            responses.setdefault(day, {})[user] = response
+        messages = {
+            user_id: {"channel": channel, "ts": ts}
+            for user_id, channel, ts in self._conn.execute(
+                "SELECT user_id, channel, ts FROM messages WHERE poll_date = ?", (poll_date,)
+            )
+        }
+        return poll_date, dates, responses, messages
+
+    def set_active_poll(self, poll_date, dates=None):
+        self._writes.put([
+            ("INSERT OR REPLACE INTO meta (key, value) VALUES ('active_poll', ?)", (poll_date,)),
+            ("INSERT OR REPLACE INTO meta (key, value) VALUES ('active_dates', ?)",
+             (",".join(dates) if dates else None,)),
+        ])
+
+    def save_response(self, poll_date, user, response):
+        self._write(
+            "INSERT INTO responses (poll_date, user, response) VALUES (?, ?, ?) "
+            "ON CONFLICT (poll_date, user) DO UPDATE SET response = excluded.response",
+            (poll_date, user, response)
+        )
+
+    def clear_responses(self, poll_date):
+        self._write("DELETE FROM responses WHERE poll_date = ?", (poll_date,))
+
+    def save_message(self, poll_date, user_id, channel, ts):
+        self._write(
+            "INSERT OR REPLACE INTO messages (poll_date, user_id, channel, ts) VALUES (?, ?, ?, ?)",
+            (poll_date, user_id, channel, ts)
+        )
+
+    def load_messages(self, poll_date):
+        self.flush()
+        return {
+            user_id: {"channel": channel, "ts": ts}
+            for user_id, channel, ts in self._conn.execute(
+                "SELECT user_id, channel, ts FROM messages WHERE poll_date = ?", (poll_date,)
+            )
+        }
+
+    def load_summary_message(self, poll_date):
+        self.flush()
+        row = self._conn.execute(
+            "SELECT channel, ts FROM summary_messages WHERE poll_date = ?", (poll_date,)
+        ).fetchone()
+        return {"channel": row[0], "ts": row[1]} if row else None
+
+    def save_summary_message(self, poll_date, channel, ts):
+        self._write(
+            "INSERT OR REPLACE INTO summary_messages (poll_date, channel, ts) VALUES (?, ?, ?)",
+            (poll_date, channel, ts)
+        )
+
+    def retire_poll(self, poll_date, deletions):
+        statements = [
+            ("INSERT OR REPLACE INTO pending_deletions (channel, ts) VALUES (?, ?)",
+             (message["channel"], message["ts"]))
+            for message in deletions
+        ]
+        statements += [
+            ("DELETE FROM responses WHERE poll_date = ?", (poll_date,)),
+            ("DELETE FROM messages WHERE poll_date = ?", (poll_date,)),
+            ("DELETE FROM summary_messages WHERE poll_date = ?", (poll_date,)),
+            ("UPDATE meta SET value = NULL WHERE key = 'active_poll' AND value = ?", (poll_date,)),
+        ]
+        self._writes.put(statements)
+
+    def purge_polls(self, before):
+        active = "(SELECT value FROM meta WHERE key = 'active_poll' AND value IS NOT NULL)"
+        self._writes.put([
+            (f"DELETE FROM {table} WHERE poll_date < ? AND poll_date NOT IN {active}", (before,))
+            for table in ("responses", "messages", "summary_messages")
+        ])
+
+    def load_pending_deletions(self):
+        self.flush()
+        return [
+            {"channel": channel, "ts": ts}
+            for channel, ts in self._conn.execute("SELECT channel, ts FROM pending_deletions")
+        ]
+
+    def complete_deletion(self, channel, ts):
+        self._write("DELETE FROM pending_deletions WHERE channel = ? AND ts = ?", (channel, ts))
+
+    OUTBOX_COLUMNS = ("key", "poll_date", "user_id", "operation", "attempts", "next_attempt", "last_error", "dead")
+
+    def load_outbound(self):
+        self.flush()
+        entries = [
+            dict(zip(self.OUTBOX_COLUMNS, row))
+            for row in self._conn.execute(f"SELECT {', '.join(self.OUTBOX_COLUMNS)} FROM outbox")
+        ]
+        for entry in entries:
+            entry["dead"] = bool(entry["dead"])
+        return entries
+
+    def save_outbound(self, entry):
+        self._write(
+            f"INSERT OR REPLACE INTO outbox ({', '.join(self.OUTBOX_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            tuple(int(entry[column]) if column == "dead" else entry[column] for column in self.OUTBOX_COLUMNS)
+        )
+
+    def delete_outbound(self, key):
+        self._write("DELETE FROM outbox WHERE key = ?", (key,))
+
+    def load_history_users(self):
+        self.flush()
+        return dict(self._conn.execute("SELECT user, idx FROM history_users").fetchall())
+
+    def load_history(self, since=None):
+        self.flush()
+        return [
+            (poll_date, bytes(codes), polled)
+            for poll_date, codes, polled in self._conn.execute(
+                "SELECT poll_date, codes, polled FROM history_days WHERE poll_date >= ? ORDER BY poll_date",
+                (since or "",)
+            )
+        ]
+
+    def save_history_day(self, poll_date, codes, polled, new_users):
+        statements = [
+            ("INSERT OR IGNORE INTO history_users (user, idx) VALUES (?, ?)", (user, index))
+            for user, index in new_users
+        ]
+        statements.append(
+            ("INSERT OR REPLACE INTO history_days (poll_date, codes, polled) VALUES (?, ?, ?)",
+             (poll_date, bytes(codes), polled))
+        )
+        self._writes.put(statements)
+
+    def load_mutes(self):
+        self.flush()
+        return {
+            user_id: (date.fromisoformat(starts) if starts else None, date.fromisoformat(until))
+            for user_id, until, starts in self._conn.execute("SELECT user_id, until, starts FROM mutes")
+        }
+
+    def save_mute(self, user_id, until, start=None):
+        self._write("INSERT OR REPLACE INTO mutes (user_id, until, starts) VALUES (?, ?, ?)",
+                    (user_id, until.isoformat(), start.isoformat() if start else None))
+
+    def delete_mute(self, user_id):
+        self._write("DELETE FROM mutes WHERE user_id = ?", (user_id,))
+
+    def changed(self):
+        # data_version moves whenever another connection commits, including this store's own writer,
+        # so the change counters tell whether any of the commits came from somewhere else
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        changes = dict(self._conn.execute(
+            "SELECT writer, changes FROM writers WHERE writer != ?", (self._writer_id,)
+        ).fetchall())
+        changed = changes != self._other_changes
+        self._other_changes = changes
+        return changed
+
+    def flush(self):
+        self._writes.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join()
+        self._conn.close()
+
+
+def create_store(settings: Dict[str, Any]) -> StateStore:
+    """Create the state store selected in the ``storage`` configuration"""
+    backend = settings.get('backend', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteStore(settings['path'])
+    if backend == 'memory':
+        return MemoryStore()
+    raise ConfigurationError(f"Unknown storage backend: {backend}")
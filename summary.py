@@ -0,0 +1,261 @@
+import json
+import threading
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from config import CompiledConfig
+from poll_state import PollSnapshot
+
+# Slack rejects section text longer than this
+SECTION_TEXT_LIMIT = 3000
+
+SHOW_ALL_ACTION = "attendance_show_all"
+VOTERS_PAGE_ACTION = "attendance_voters_page"
+
+
+class SummaryRenderer:
+    """Builds the poll message blocks and caches them per poll state version"""
+
+    def __init__(self, settings: CompiledConfig):
+        # Everything that does not depend on the votes is prepared once
+        self.message_template = settings.message_template
+        self.summary_template = settings.summary_template
+        self.actions_block = {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": option["text"]},
+                    "value": option["value"],
+                    "action_id": option["action_id"],
+                }
+                for option in settings.response_options
+            ],
+        }
+        self.option_texts = {option["value"]: option["text"] for option in settings.response_options}
+        self.weekly = settings.weekly
+        self.week_template = settings.week_template
+        layout = settings.config.get_summary_layout()
+        self.style = layout['style']
+        self.preview_names = layout['preview_names']
+        self.page_size = layout['page_size']
+        self._cache: Dict[str, Tuple[Any, str]] = {}
+        self._lock = threading.Lock()
+
+    def _question_block(self, poll_date: str) -> Dict[str, Any]:
+        return {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": self.message_template.format(date=poll_date),
+            },
+        }
+
+    @staticmethod
+    def _names(voters: List[str], limit: Optional[int]) -> str:
+        if not voters:
+            return 'None'
+        if limit is None or len(voters) <= limit:
+            return ', '.join(voters)
+        return f"{', '.join(voters[:limit])} and {len(voters) - limit} more"
+
+    def _summary_text(self, state: PollSnapshot, poll_date: str, limit: Optional[int]) -> str:
+        coming = state.voters("yes")
+        not_coming = state.voters("no")
+        maybe = state.voters("maybe")
+        return self.summary_template.format(
+            date=poll_date,
+            coming_count=len(coming),
+            coming_users=self._names(coming, limit),
+            not_coming_count=len(not_coming),
+            not_coming_users=self._names(not_coming, limit),
+            maybe_count=len(maybe),
+            maybe_users=self._names(maybe, limit)
+        )
+
+    def _summary_blocks(self, state: PollSnapshot, poll_date: str) -> List[Dict[str, Any]]:
+        """The tally, listing every voter only if that fits the layout and Slack's limits"""
+        text = self._summary_text(state, poll_date, None) if self.style == "full" else None
+        truncated = text is None or len(text) > SECTION_TEXT_LIMIT
+        if truncated:
+            text = self._summary_text(state, poll_date, self.preview_names)
+            truncated = any(state.count(response) > self.preview_names for response in ("yes", "no", "maybe"))
+        if len(text) > SECTION_TEXT_LIMIT:
+            # Only a very long custom template gets here
+            text = text[:SECTION_TEXT_LIMIT - 1] + "…"
+
+        blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+        if truncated:
+            blocks.append({
+                "type": "actions",
+                "elements": [{
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Show all"},
+                    "value": poll_date,
+                    "action_id": SHOW_ALL_ACTION,
+                }],
+            })
+        return blocks
+
+    def _choice_block(self, choice: Optional[str]) -> Dict[str, Any]:
+        if choice is None:
+            text = "You haven't answered yet."
+        else:
+            text = f"Your answer: *{self.option_texts.get(choice, choice)}*"
+        return {"type": "context", "elements": [{"type": "mrkdwn", "text": text}]}
+
+    def blocks(self, state: PollSnapshot, poll_date: str) -> List[Dict[str, Any]]:
+        """Build the Block Kit payload for the given poll state"""
+        return [
+            self._question_block(poll_date),
+            self.actions_block,
+            *self._summary_blocks(state, poll_date),
+        ]
+
+    def dm_blocks(self, poll_date: str, choice: Optional[str]) -> List[Dict[str, Any]]:
+        """Poll message without the live summary, showing only the user's own answer"""
+        return [
+            self._question_block(poll_date),
+            self.actions_block,
+            self._choice_block(choice),
+        ]
+
+    def channel_blocks(self, state: PollSnapshot, poll_date: str) -> List[Dict[str, Any]]:
+        """Live summary for the shared summary channel"""
+        return self._summary_blocks(state, poll_date)
+
+    def _week_question_block(self, dates: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": self.week_template.format(date=dates[0], end=dates[-1]),
+            },
+        }
+
+    @staticmethod
+    def _day_block(day: str) -> Dict[str, Any]:
+        return {"type": "section",
+                "text": {"type": "mrkdwn", "text": f"*{date.fromisoformat(day).strftime('%A, %B %d')}*"}}
+
+    def _day_actions_block(self, day: str) -> Dict[str, Any]:
+        return {
+            "type": "actions",
+            "elements": [
+                dict(button, action_id=CompiledConfig.day_action_id(button["action_id"], day))
+                for button in self.actions_block["elements"]
+            ],
+        }
+
+    def week_blocks(self, state: PollSnapshot) -> List[Dict[str, Any]]:
+        """Weekly poll with answer buttons and the live summary for every covered day"""
+        blocks = [self._week_question_block(state.dates)]
+        for day in state.dates:
+            blocks += [self._day_block(day), self._day_actions_block(day), *self._summary_blocks(state.day(day), day)]
+        return blocks
+
+    def week_dm_blocks(self, dates: Sequence[str], choices: Mapping[str, Optional[str]]) -> List[Dict[str, Any]]:
+        """Weekly poll without the live summary, showing only the user's own answers"""
+        blocks = [self._week_question_block(dates)]
+        for day in dates:
+            blocks += [self._day_block(day), self._day_actions_block(day), self._choice_block(choices.get(day))]
+        return blocks
+
+    def week_channel_blocks(self, state: PollSnapshot) -> List[Dict[str, Any]]:
+        """Live summary of every covered day for the shared summary channel"""
+        return [block for day in state.dates for block in self._summary_blocks(state.day(day), day)]
+
+    def week_home_view(self, state: PollSnapshot, choices: Mapping[str, Optional[str]]) -> Dict[str, Any]:
+        """App Home view with the live summary and the user's own answer for every covered day"""
+        if not state.dates:
+            return self.home_view(state, None, None)
+        blocks = []
+        for day in state.dates:
+            blocks += [*self._summary_blocks(state.day(day), day), self._choice_block(choices.get(day))]
+        return {"type": "home", "blocks": blocks}
+
+    def home_view(self, state: PollSnapshot, poll_date: Optional[str], choice: Optional[str]) -> Dict[str, Any]:
+        """App Home view with the live summary and the user's own answer"""
+        if poll_date is None:
+            blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": "There is no active attendance poll."}}]
+        else:
+            blocks = [*self._summary_blocks(state, poll_date), self._choice_block(choice)]
+        return {"type": "home", "blocks": blocks}
+
+    def voters_view(self, state: PollSnapshot, poll_date: str, page: int = 0) -> Dict[str, Any]:
+        """Modal with one page of every voter of a poll, grouped by answer"""
+        view = {
+            "type": "modal",
+            "title": {"type": "plain_text", "text": f"Attendance {poll_date}"[:24]},
+            "close": {"type": "plain_text", "text": "Close"},
+        }
+        if state.poll_date != poll_date:
+            view["blocks"] = [{"type": "section",
+                               "text": {"type": "mrkdwn", "text": "This poll is no longer active."}}]
+            return view
+
+        entries = [(response, name) for response in self.option_texts for name in state.voters(response)]
+        pages = max(1, -(-len(entries) // self.page_size))
+        page = max(0, min(page, pages - 1))
+        shown = entries[page * self.page_size:(page + 1) * self.page_size]
+
+        blocks = []
+        for response, text in self.option_texts.items():
+            names = [name for entry_response, name in shown if entry_response == response]
+            if names:
+                blocks.append({
+                    "type": "section",
+                    "text": {"type": "mrkdwn",
+                             "text": f"*{text}* ({state.count(response)})\n{', '.join(names)}"[:SECTION_TEXT_LIMIT]},
+                })
+        if not blocks:
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "Nobody has answered yet."}})
+
+        blocks.append({"type": "context",
+                       "elements": [{"type": "mrkdwn", "text": f"Page {page + 1} of {pages}"}]})
+        buttons = []
+        for label, target in (("Previous", page - 1), ("Next", page + 1)):
+            if 0 <= target < pages:
+                buttons.append({
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": label},
+                    "value": json.dumps({"date": poll_date, "page": target}),
+                    "action_id": f"{VOTERS_PAGE_ACTION}_{label.lower()}",
+                })
+        if buttons:
+            blocks.append({"type": "actions", "elements": buttons})
+        view["blocks"] = blocks
+        return view
+
+    def _cached(self, name: str, key: Any, build) -> str:
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is None or cached[0] != key:
+                cached = (key, json.dumps(build()))
+                self._cache[name] = cached
+            return cached[1]
+
+    def render(self, state: PollSnapshot, poll_date: str) -> str:
+        """Return the serialized blocks, rendering only once per state version
+
+        ``state`` must be an immutable snapshot so that the cached payload
+        matches the version it is stored under.
+        """
+        if self.weekly:
+            return self._cached("dm", (poll_date, state.version), lambda: self.week_blocks(state))
+        return self._cached("dm", (poll_date, state.version), lambda: self.blocks(state, poll_date))
+
+    def render_dm(self, poll_date: str, choice: Optional[str], dates: Sequence[str] = ()) -> str:
+        """Return the serialized summary-less DM blocks for an answer
+
+        A weekly poll is rendered for its covered ``dates`` with no answers yet.
+        """
+        if self.weekly:
+            return self._cached("choice:None", (poll_date, tuple(dates)), lambda: self.week_dm_blocks(dates, {}))
+        return self._cached(f"choice:{choice}", poll_date, lambda: self.dm_blocks(poll_date, choice))
+
+    def render_channel(self, state: PollSnapshot, poll_date: str) -> str:
+        """Return the serialized channel summary, rendering only once per state version"""
+        if self.weekly:
+            return self._cached("channel", (poll_date, state.version), lambda: self.week_channel_blocks(state))
+        return self._cached("channel", (poll_date, state.version), lambda: self.channel_blocks(state, poll_date))
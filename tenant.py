@@ -0,0 +1,923 @@
+"""Per-workspace poll state, jobs and Slack calls
+
+Each tenant is one Slack workspace (or office) with its own configuration,
+bot token, state files and scheduled jobs. All tenants in a process share one
+fan-out worker pool.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from slack_sdk.errors import SlackApiError
+
+import metrics
+from config import DAY_NAMES, Config, ConfigurationError
+from deletion import DeletionJob
+from directory import UserDirectory
+from dispatch import DispatchPlanner
+from dm_cache import DMChannelCache, STALE_CHANNEL_ERRORS
+from fanout import AsyncFanOut, EventLoopThread, FanOut, FairExecutor
+from history import AttendanceHistory
+from mutes import MuteRegistry
+from outbox import Outbox
+from poll_state import PollState
+from refresh import RefreshCoalescer
+from storage import create_store
+from summary import SummaryRenderer
+from tracing import traced, tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+# Settings that are read once at startup, a reloaded configuration does not change them
+RESTART_SETTINGS = ['summary_mode', 'fan_out', 'runtime', 'dm_channel_cache', 'storage', 'replicas',
+                    'metrics', 'tracing', 'profiler', 'logging', 'hot_reload']
+# Settings that show in the poll messages, the active poll is refreshed when they change
+DISPLAY_SETTINGS = ['poll_mode', 'response_options', 'message_template', 'summary_template', 'summary_layout']
+
+
+def load_tenant_specs(path: str) -> List[Dict[str, Any]]:
+    """Read the tenants file: a list of ``id``, ``team_id``, ``bot_token_env`` and ``config_path``"""
+    try:
+        with open(path, 'r') as f:
+            specs = json.load(f)
+    except Exception as e:
+        raise ConfigurationError(f"Failed to load tenants file {path}: {e}")
+
+    if not isinstance(specs, list) or not specs:
+        raise ConfigurationError("Tenants file must contain a non-empty list of tenants")
+    seen_ids, seen_teams = set(), set()
+    for spec in specs:
+        if not isinstance(spec, dict):
+            raise ConfigurationError("Each tenant must be an object")
+        for key in ['id', 'team_id', 'bot_token_env']:
+            if not isinstance(spec.get(key), str) or not spec[key]:
+                raise ConfigurationError(f"Tenant {key} must be a non-empty string")
+        if spec['id'] in seen_ids or spec['team_id'] in seen_teams:
+            raise ConfigurationError(f"Duplicate tenant {spec['id']} or team {spec['team_id']}")
+        seen_ids.add(spec['id'])
+        seen_teams.add(spec['team_id'])
+        if spec.get('config_path') is not None and not isinstance(spec['config_path'], str):
+            raise ConfigurationError(f"Tenant {spec['id']} config_path must be a string")
+    return specs
+
+
+def partition_path(path: str, tenant_id: str) -> str:
+    """Place a tenant's state file in a subdirectory named after the tenant"""
+    if tenant_id == DEFAULT_TENANT:
+        return path
+    return os.path.join(os.path.dirname(path), tenant_id, os.path.basename(path))
+
+
+class TenantSettings:
+    """Everything a tenant derives from its configuration, replaced as one reference on reload
+
+    Code that reads more than one of these takes the bundle once, so it never
+    pairs a renderer with the settings of another configuration version.
+    """
+
+    __slots__ = ('config', 'settings', 'summary_renderer', 'dispatch_settings', 'dispatch_planner', 'retention')
+
+    def __init__(self, config: Config, fan_out, previous: Optional['TenantSettings'] = None):
+        set_value = super().__setattr__
+        set_value('config', config)
+        set_value('settings', config.compile(previous.settings if previous else None))
+        # Static parts of the poll message are prepared once, the rest is cached per poll state version
+        set_value('summary_renderer', SummaryRenderer(self.settings))
+        set_value('dispatch_settings', config.get_dispatch())
+        set_value('dispatch_planner', DispatchPlanner(
+            fan_out.rate_limits,
+            fan_out.max_workers,
+            call_latency=self.dispatch_settings['call_latency_seconds'],
+            safety_margin=self.dispatch_settings['safety_margin_seconds']
+        ))
+        set_value('retention', config.get_retention())
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("TenantSettings is immutable")
+
+    @property
+    def poll_text(self) -> str:
+        if self.settings.weekly:
+            return "Which days will you be coming to the office?"
+        return "Will you be coming to the office tomorrow?"
+
+
+class Tenant:
+    """Poll state, summaries, mutes and scheduled jobs of one workspace"""
+
+    def __init__(self, tenant_id: str, config: Config, client, executor: FairExecutor,
+                 team_id: Optional[str] = None, max_retries: int = 3, leader=None,
+                 io: Optional[EventLoopThread] = None):
+        self.id = tenant_id
+        self.team_id = team_id
+        self.scheduler = None
+        self.client = client
+        self.leader = leader
+        self._identity: Optional[Dict[str, Any]] = None
+
+        # Rate-limit-aware fan-out: this workspace's rate limits, the process-wide worker pool,
+        # or in async mode the process-wide event loop with an async client
+        if io is not None:
+            self.fan_out = AsyncFanOut(
+                client,
+                io,
+                max_concurrency=config.get_runtime()['max_concurrency'],
+                max_retries=max_retries,
+                rate_limits=config.get_fan_out()['rate_limits'],
+                key=tenant_id
+            )
+        else:
+            self.fan_out = FanOut(
+                client,
+                max_retries=max_retries,
+                rate_limits=config.get_fan_out()['rate_limits'],
+                executor=executor,
+                key=tenant_id
+            )
+
+        # Timezone, workdays, templates, answer buttons, renderer and dispatch planner, replaced as a whole on reload
+        self.current = TenantSettings(config, self.fan_out)
+
+        # DM channel IDs never change, so remember them across polls and restarts
+        self.dm_channels = DMChannelCache(partition_path(config.get_dm_channel_cache()['path'], tenant_id))
+
+        # Eligible poll recipients, loaded once and then kept current from user events
+        self.user_directory = UserDirectory()
+
+        # Durable copy of the poll state, so a restart does not lose votes or message timestamps
+        storage = dict(config.get_storage())
+        if storage.get('path'):
+            storage['path'] = partition_path(storage['path'], tenant_id)
+        self.store = create_store(storage)
+        atexit.register(self.store.close)
+
+        # Active poll date, responses and message tracking, restored from the active poll's working set.
+        # Handlers and the scheduler share it, so all changes go through its lock and readers use snapshots.
+        # Only the most recent polls keep their messages in memory, older ones are read back from the store.
+        # A weekly poll keeps one set of messages for the week and responses for each of its dates.
+        saved_poll_date, saved_dates, saved_responses, saved_messages = self.store.load_active_poll()
+        self.poll = PollState(saved_poll_date, saved_responses,
+                              {saved_poll_date: saved_messages} if saved_poll_date else {},
+                              max_tracked_polls=self.retention['max_tracked_polls'],
+                              dates=saved_dates)
+        # Mutes indexed by the days they start and end, muted users are left out of the directory's recipients
+        self.mutes = MuteRegistry(self.store, self.polled_date(),
+                                  on_change=self.user_directory.set_muted)
+
+        # One response vector per poll day, kept for trend and per-user queries long after polls are purged
+        self.history = AttendanceHistory(self.store)
+
+        # Messages of deleted polls are removed in the background from a checkpoint in the store
+        self.deletion_job = DeletionJob(self.fan_out, self.store)
+
+        # Poll messages and summary updates that failed are retried from a queue in the store
+        outbox_settings = config.get_outbox()
+        self.outbox = Outbox(
+            self.store,
+            self.retry_outbound,
+            max_attempts=outbox_settings['max_attempts'],
+            base_delay=outbox_settings['base_delay_seconds'],
+            max_delay=outbox_settings['max_delay_seconds']
+        )
+
+        # Where the live tally is shown: in every DM ("dm"), in one channel message ("channel")
+        # or in each user's App Home ("app_home")
+        self.summary_mode = config.get_summary_mode()['mode']
+        self.summary_channel = config.get_summary_mode()['channel']
+        self.summary_messages = {}  # Shared channel summary message per poll date
+        if saved_poll_date:
+            saved_summary = self.store.load_summary_message(saved_poll_date)
+            if saved_summary:
+                self.summary_messages[saved_poll_date] = saved_summary
+
+        # Batch summary refreshes so a burst of votes costs one update wave per window
+        self.summary_refresher = RefreshCoalescer(
+            self.update_all_summaries,
+            window=config.get_summary_refresh()['debounce_seconds']
+        )
+
+    def __repr__(self) -> str:
+        return f"Tenant({self.id!r}, team_id={self.team_id!r})"
+
+    def identity(self) -> Dict[str, Any]:
+        """The bot's ``auth.test`` identity in this workspace, looked up once"""
+        if self._identity is None:
+            self._identity = self.fan_out.call("auth.test").data
+        return self._identity
+
+    def is_leader(self) -> bool:
+        return self.leader is None or self.leader.is_leader
+
+    def leader_only(self, func):
+        """Run a scheduled job only on the replica that holds the leader lease"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.leader is not None and not self.leader.hold():
+                return None
+            return func(*args, **kwargs)
+        return wrapper
+
+    @property
+    def config(self):
+        return self.current.config
+
+    @property
+    def settings(self):
+        return self.current.settings
+
+    @property
+    def summary_renderer(self):
+        return self.current.summary_renderer
+
+    @property
+    def dispatch_settings(self):
+        return self.current.dispatch_settings
+
+    @property
+    def dispatch_planner(self):
+        return self.current.dispatch_planner
+
+    @property
+    def retention(self):
+        return self.current.retention
+
+    @property
+    def weekly(self):
+        """Whether one poll covers the workdays of a week rather than one day"""
+        return self.settings.weekly
+
+    @property
+    def poll_text(self):
+        return self.current.poll_text
+
+    def timezone(self):
+        return self.settings.timezone
+
+    def get_tomorrow_date(self):
+        tomorrow = datetime.now(self.timezone()) + timedelta(days=1)
+        return tomorrow.strftime("%Y-%m-%d")
+
+    def is_poll_day(self, send_time):
+        """Whether the scheduled poll goes out at ``send_time``"""
+        settings = self.settings
+        if settings.weekly:
+            return send_time.weekday() == settings.poll_weekday
+        return settings.is_workday(send_time + timedelta(days=1))
+
+    def upcoming_poll_dates(self, send_time):
+        """Dates a poll sent at ``send_time`` asks about: tomorrow, or the workdays of the next seven days"""
+        settings = self.settings
+        if not settings.weekly:
+            return [(send_time + timedelta(days=1)).strftime("%Y-%m-%d")]
+        days = [send_time + timedelta(days=offset) for offset in range(1, 8)]
+        return [day.strftime("%Y-%m-%d") for day in days if settings.is_workday(day)]
+
+    def polled_date(self):
+        """First day the next poll asks about, the day mutes are checked against
+
+        A weekly poll is left out for a muted user as a whole, so only its
+        first workday counts.
+        """
+        now = datetime.now(self.timezone())
+        dates = self.upcoming_poll_dates(now)
+        if dates:
+            return date.fromisoformat(dates[0])
+        return now.date() + timedelta(days=1)
+
+    def open_dm_channel(self, user_id):
+        """Return the DM channel with a user, opening it only if it is not cached"""
+        channel_id = self.dm_channels.get(user_id)
+        if channel_id is None:
+            dm_channel = self.fan_out.call("conversations.open", users=user_id)
+            channel_id = dm_channel["channel"]["id"]
+            self.dm_channels.set(user_id, channel_id)
+        return channel_id
+
+    async def open_dm_channel_async(self, user_id):
+        channel_id = self.dm_channels.get(user_id)
+        if channel_id is None:
+            dm_channel = await self.fan_out.acall("conversations.open", users=user_id)
+            channel_id = dm_channel["channel"]["id"]
+            self.dm_channels.set(user_id, channel_id)
+        return channel_id
+
+    def render_summary_blocks(self, tomorrow_date, snapshot=None):
+        """Serialized poll blocks for the current votes, shared by all outgoing messages"""
+        # A snapshot without votes is falsy, as it has a length
+        if snapshot is None:
+            snapshot = self.poll.snapshot()
+        if self.summary_mode != "dm":
+            # The tally lives elsewhere, so new DMs only carry the question and buttons
+            return self.summary_renderer.render_dm(tomorrow_date, None, snapshot.dates)
+        return self.summary_renderer.render(snapshot, tomorrow_date)
+
+    def post_channel_summary(self, tomorrow_date):
+        """Post the shared live summary message for a poll to the summary channel"""
+        try:
+            result = self.fan_out.call(
+                "chat.postMessage",
+                channel=self.summary_channel,
+                blocks=self.summary_renderer.render_channel(self.poll.snapshot(), tomorrow_date),
+                text=f"Attendance summary for {tomorrow_date}"
+            )
+            self.summary_messages[tomorrow_date] = {"channel": result["channel"], "ts": result["ts"]}
+            self.store.save_summary_message(tomorrow_date, result["channel"], result["ts"])
+        except Exception as e:
+            logger.error("[%s] Error posting summary to channel %s: %s", self.id, self.summary_channel, e)
+
+    def load_user_directory(self):
+        try:
+            self.user_directory.ensure_loaded(self.fan_out.call)
+        except Exception as e:
+            logger.error("[%s] Error loading user directory: %s", self.id, e)
+
+    def get_poll_recipients(self):
+        """Eligible users from the directory who have not muted the bot"""
+        # Eligible users come from the local directory, which is normally
+        # already loaded by the time the poll runs
+        with tracer.span("directory.load"):
+            self.user_directory.ensure_loaded(self.fan_out.call)
+        # Mutes that start or end by the polled day are applied first, the directory then leaves out everyone muted
+        self.mutes.advance(self.polled_date())
+        return self.user_directory.recipients()
+
+    @traced("poll.send")
+    def send_attendance_poll(self, poll_date=None, dates=None):
+        """Send the poll for ``poll_date`` covering ``dates``, by default the next poll from now"""
+        try:
+            if dates is None:
+                dates = [poll_date] if poll_date else self.upcoming_poll_dates(datetime.now(self.timezone()))
+            if not dates:
+                logger.info("[%s] No workdays in the coming week, no poll sent", self.id)
+                return
+            recipients = self.get_poll_recipients()
+
+            tomorrow = poll_date or dates[0]
+            tracer.current().set(tenant=self.id, poll_date=tomorrow, dates=len(dates), recipients=len(recipients))
+            # Keep the final answers of the poll being replaced, the last refresh may not have run yet
+            self.record_history(self.poll.snapshot())
+            # Set the current poll date and clear previous responses for the new poll
+            for day in dates:
+                self.store.clear_responses(day)
+            self.store.set_active_poll(tomorrow, dates if self.weekly else None)
+            for evicted_date in self.poll.start(tomorrow, dates):
+                self.summary_messages.pop(evicted_date, None)
+                self.summary_refresher.discard(evicted_date)
+            metrics.POLL_STARTED.set(time.time(), tenant=self.id)
+            if self.summary_mode == "channel" and tomorrow not in self.summary_messages:
+                self.post_channel_summary(tomorrow)
+
+            deliver = self.deliver_async if self.fan_out.asynchronous else self.deliver
+            report = self.fan_out.run(recipients, lambda user: deliver(tomorrow, user),
+                                      label="poll delivery", describe=lambda user: {"user_id": user["id"]},
+                                      method="chat.postMessage")
+            for user, _ in report.succeeded:
+                self.outbox.complete(tomorrow, user["id"], "post")
+            for user, e in report.failed:
+                logger.error("[%s] Error sending message to user %s: %s", self.id, user['name'], e)
+                self.outbox.add(tomorrow, user["id"], "post", e)
+            self.dm_channels.save()
+            self.record_history(self.poll.snapshot())
+            metrics.POLL_DELIVERED.set(time.time(), tenant=self.id)
+
+        except Exception as e:
+            logger.exception("[%s] Error sending attendance poll: %s", self.id, e)
+
+    def _post_poll(self, poll_date, channel_id):
+        return self.fan_out.call(
+            "chat.postMessage",
+            channel=channel_id,
+            blocks=self.render_summary_blocks(poll_date),
+            text=self.poll_text
+        )
+
+    async def _post_poll_async(self, poll_date, channel_id):
+        return await self.fan_out.acall(
+            "chat.postMessage",
+            channel=channel_id,
+            blocks=self.render_summary_blocks(poll_date),
+            text=self.poll_text
+        )
+
+    def deliver(self, poll_date, user):
+        """Post a poll to a user and track the message"""
+        # Post straight to the known DM channel, opening one only for new users
+        was_cached = self.dm_channels.get(user["id"]) is not None
+        channel_id = self.open_dm_channel(user["id"])
+        try:
+            result = self._post_poll(poll_date, channel_id)
+        except SlackApiError as e:
+            if not was_cached or e.response.get("error") not in STALE_CHANNEL_ERRORS:
+                raise
+            # The cached channel is no longer usable, open a fresh one
+            self.dm_channels.invalidate(user["id"])
+            channel_id = self.open_dm_channel(user["id"])
+            result = self._post_poll(poll_date, channel_id)
+
+        # Store the message details for updates
+        self.poll.track_message(poll_date, user["id"], channel_id, result["ts"])
+        self.store.save_message(poll_date, user["id"], channel_id, result["ts"])
+
+    async def deliver_async(self, poll_date, user):
+        was_cached = self.dm_channels.get(user["id"]) is not None
+        channel_id = await self.open_dm_channel_async(user["id"])
+        try:
+            result = await self._post_poll_async(poll_date, channel_id)
+        except SlackApiError as e:
+            if not was_cached or e.response.get("error") not in STALE_CHANNEL_ERRORS:
+                raise
+            self.dm_channels.invalidate(user["id"])
+            channel_id = await self.open_dm_channel_async(user["id"])
+            result = await self._post_poll_async(poll_date, channel_id)
+
+        self.poll.track_message(poll_date, user["id"], channel_id, result["ts"])
+        self.store.save_message(poll_date, user["id"], channel_id, result["ts"])
+
+    def update_message(self, blocks, message):
+        """Replace the summary in one tracked poll message"""
+        self.fan_out.call(
+            "chat.update",
+            channel=message.channel,
+            ts=message.ts,
+            blocks=blocks,
+            text=self.poll_text
+        )
+
+    async def update_message_async(self, blocks, message):
+        await self.fan_out.acall(
+            "chat.update",
+            channel=message.channel,
+            ts=message.ts,
+            blocks=blocks,
+            text=self.poll_text
+        )
+
+    @traced("summary.refresh")
+    def update_all_summaries(self, tomorrow_date=None):
+        # Everything below works on one consistent snapshot, votes keep coming in meanwhile
+        snapshot = self.poll.snapshot()
+        if tomorrow_date is None:
+            working_date = snapshot.poll_date
+        else:
+            working_date = tomorrow_date
+        tracer.current().set(tenant=self.id, poll_date=working_date, mode=self.summary_mode,
+                             version=snapshot.version)
+        if working_date == snapshot.poll_date:
+            self.record_history(snapshot)
+
+        if self.summary_mode == "channel":
+            # A single update refreshes the tally for everyone
+            if working_date in self.summary_messages:
+                msg_info = self.summary_messages[working_date]
+                try:
+                    self.fan_out.call(
+                        "chat.update",
+                        channel=msg_info["channel"],
+                        ts=msg_info["ts"],
+                        blocks=self.summary_renderer.render_channel(snapshot, working_date),
+                        text=f"Attendance summary for {working_date}"
+                    )
+                except Exception as e:
+                    logger.error("[%s] Error updating channel summary for %s: %s", self.id, working_date, e)
+            return
+
+        if self.summary_mode != "dm":
+            # App Home views are rendered when they are opened
+            return
+
+        if working_date and self.poll.is_tracked(working_date):
+            # Render once for the whole wave, later votes are picked up by the next refresh
+            blocks = self.render_summary_blocks(working_date, snapshot)
+
+            update = self.update_message_async if self.fan_out.asynchronous else self.update_message
+            report = self.fan_out.run(self.poll.messages(working_date), lambda entry: update(blocks, entry[1]),
+                                      label="summary refresh", describe=lambda entry: {"user_id": entry[0]},
+                                      method="chat.update")
+            # This wave carried the latest tally, so earlier queued updates are obsolete
+            for (user_id, message), _ in report.succeeded:
+                self.outbox.complete(working_date, user_id, "update")
+            for (user_id, message), e in report.failed:
+                if isinstance(e, SlackApiError) and e.response.get("error") in STALE_CHANNEL_ERRORS:
+                    self.dm_channels.invalidate(user_id)
+                logger.error("[%s] Error updating message for user %s: %s", self.id, user_id, e)
+                self.outbox.add(working_date, user_id, "update", e)
+            self.dm_channels.save()
+
+    def retry_outbound(self, operation, entries):
+        """Send queued poll messages or summary updates again, rendered from the current state
+
+        Entries of polls that are no longer active, and posts that have been
+        delivered in the meantime, count as done.
+        """
+        snapshot = self.poll.snapshot()
+        messages = dict(self.poll.messages(snapshot.poll_date)) if snapshot.poll_date else {}
+        muted = self.mutes.muted()
+
+        if operation == "post":
+            def needed(entry):
+                return entry["user_id"] not in messages and entry["user_id"] not in muted
+            deliver = self.deliver_async if self.fan_out.asynchronous else self.deliver
+
+            def task(entry):
+                user = self.user_directory.get(entry["user_id"]) or {"id": entry["user_id"], "name": entry["user_id"]}
+                return deliver(entry["poll_date"], user)
+        else:
+            def needed(entry):
+                return self.summary_mode == "dm" and entry["user_id"] in messages
+            blocks = self.render_summary_blocks(snapshot.poll_date, snapshot) if snapshot.poll_date else None
+            update = self.update_message_async if self.fan_out.asynchronous else self.update_message
+
+            def task(entry):
+                return update(blocks, messages[entry["user_id"]])
+
+        current = [entry for entry in entries if entry["poll_date"] == snapshot.poll_date and needed(entry)]
+        report = self.fan_out.run(current, task, label=f"outbox {operation}",
+                                  describe=lambda entry: {"user_id": entry["user_id"]},
+                                  method="chat.postMessage" if operation == "post" else "chat.update")
+        skipped = [entry for entry in entries if entry["poll_date"] != snapshot.poll_date or not needed(entry)]
+        report.succeeded.extend((entry, None) for entry in skipped)
+        self.dm_channels.save()
+        return report
+
+    def record_history(self, snapshot):
+        """Store the answers of a poll snapshot in the attendance history, one day vector per covered date"""
+        # Only the leader writes history, other replicas load it in sync_from_store
+        if not snapshot.poll_date or not self.is_leader():
+            return
+        polled = self.poll.message_count(snapshot.poll_date)
+        try:
+            for day in snapshot.dates:
+                self.history.record(day, snapshot.day(day).responses, polled)
+        except Exception as e:
+            logger.error("[%s] Error recording attendance history for %s: %s", self.id, snapshot.poll_date, e)
+
+    def record_response(self, user, response, day=None):
+        """Record a vote for one date of the active poll and schedule a summary refresh if it changed anything
+
+        Returns the date of the poll the vote was recorded for, or None.
+        """
+        poll_date = self.poll.record(user, response, on_change=self.store.save_response, day=day)
+        if poll_date is None:
+            return None
+        metrics.VOTES.inc(tenant=self.id, response=response)
+        if self.is_leader():
+            # Other replicas' votes reach the leader through sync_from_store
+            self.summary_refresher.mark_dirty(poll_date)
+        return poll_date
+
+    def sync_from_store(self):
+        """Pick up polls, votes and mutes that other replicas wrote to the store"""
+        if not self.store.changed():
+            return
+        # Read under the poll lock, after this replica's queued votes are flushed, so a stored answer
+        # never overwrites a newer local one
+        if self.poll.sync(self.store.load_active_poll) and self.is_leader():
+            self.summary_refresher.mark_dirty(self.poll.poll_date)
+        if not self.is_leader():
+            self.history.refresh()
+        self.mutes.load(self.store.load_mutes())
+
+    def handle_vote(self, body, response, day=None):
+        """Record a vote, for one ``day`` of a weekly poll, and return the reply that shows the voter their answer
+
+        Returns None when the live summary in the DMs already shows it.
+        """
+        user = body["user"]["name"]
+        poll_date = self.record_response(user, response, day)
+        if poll_date and self.summary_mode != "dm":
+            current = self.current
+            if current.settings.weekly:
+                snapshot = self.poll.snapshot()
+                blocks = current.summary_renderer.week_dm_blocks(snapshot.dates, self.choices(snapshot, user))
+            else:
+                blocks = current.summary_renderer.dm_blocks(poll_date, response)
+            # Replacing the clicked message through its response_url costs no Web API call
+            return {
+                "replace_original": True,
+                "blocks": blocks,
+                "text": current.poll_text
+            }
+        return None
+
+    @staticmethod
+    def choices(snapshot, user):
+        """A user's answer for each date of a poll"""
+        return {day: snapshot.day(day).get(user) for day in snapshot.dates}
+
+    def home_view(self, user_id):
+        """App Home view with the live summary and the user's own answer"""
+        user = self.user_directory.get(user_id)
+        snapshot = self.poll.snapshot()
+        current = self.current
+        if current.settings.weekly:
+            return current.summary_renderer.week_home_view(snapshot,
+                                                           self.choices(snapshot, user["name"]) if user else {})
+        choice = snapshot.get(user["name"]) if user else None
+        return current.summary_renderer.home_view(snapshot, snapshot.poll_date, choice)
+
+    def voters_view(self, poll_date, page=0):
+        """Paginated modal with every voter of one poll date"""
+        snapshot = self.poll.snapshot()
+        day = snapshot.day(poll_date)
+        return self.summary_renderer.voters_view(snapshot if day is None else day, poll_date, page)
+
+    @traced("poll.stage")
+    def stage_attendance_poll(self, scheduler):
+        """Prepare the next poll ahead of time and schedule its delivery
+
+        Runs ``window_minutes`` before the configured poll time. The recipient
+        list is built and missing DM channels are opened now, then sending
+        starts just early enough for the last message to arrive on time, or
+        right away if the window is too short for the audience.
+        """
+        current = self.current
+        schedule = current.config.get_schedule()
+        tz = current.settings.timezone
+        now = datetime.now(tz)
+        deadline = now.replace(hour=schedule['hour'], minute=schedule['minute'], second=0, microsecond=0)
+        if deadline <= now:
+            deadline += timedelta(days=1)
+
+        if not self.is_poll_day(deadline):
+            return
+        dates = self.upcoming_poll_dates(deadline)
+        if not dates:
+            return
+        poll_date = dates[0]
+
+        try:
+            recipients = self.get_poll_recipients()
+            unopened = [user for user in recipients if self.dm_channels.get(user["id"]) is None]
+            if unopened:
+                open_channel = self.open_dm_channel_async if self.fan_out.asynchronous else self.open_dm_channel
+                report = self.fan_out.run(
+                    unopened, lambda user: open_channel(user["id"]), label="DM staging",
+                    describe=lambda user: {"user_id": user["id"]}, method="conversations.open"
+                )
+                for user, e in report.failed:
+                    logger.error("[%s] Error opening DM channel for user %s: %s", self.id, user['name'], e)
+                self.dm_channels.save()
+        except Exception as e:
+            logger.exception("[%s] Error staging attendance poll: %s", self.id, e)
+            recipients, unopened = [], []
+
+        remaining = [user for user in unopened if self.dm_channels.get(user["id"]) is None]
+        plan = current.dispatch_planner.plan(deadline, len(recipients), len(remaining), earliest=datetime.now(tz))
+        logger.info("[%s] Staged attendance poll for %s: %s", self.id, poll_date, plan)
+        if plan.late:
+            logger.warning("[%s] Delivery of the poll for %s needs %.0f seconds and will finish after %s, "
+                           "consider a longer dispatch window", self.id, poll_date, plan.estimated_seconds,
+                           plan.deadline.strftime("%H:%M"))
+        scheduler.add_job(
+            self.leader_only(self.send_attendance_poll),
+            'date',
+            run_date=plan.start_at,
+            args=[poll_date, dates],
+            misfire_grace_time=None
+        )
+
+    def schedule_daily_poll(self, scheduler):
+        """Add this tenant's daily poll and maintenance jobs to the scheduler, replacing earlier ones"""
+        self.scheduler = scheduler
+        current = self.current
+        schedule = current.config.get_schedule()
+        tz = current.settings.timezone
+
+        if current.dispatch_settings['mode'] == 'window':
+            # Stage the poll ahead of time so delivery completes by the configured time
+            staging_time = (datetime(2000, 1, 1, schedule['hour'], schedule['minute'])
+                            - timedelta(minutes=current.dispatch_settings['window_minutes']))
+            scheduler.add_job(
+                self.leader_only(self.stage_attendance_poll),
+                'cron',
+                hour=staging_time.hour,
+                minute=staging_time.minute,
+                timezone=tz,
+                args=[scheduler],
+                id=f"{self.id}:poll",
+                replace_existing=True
+            )
+        else:
+            # Schedule the job to run at configured time, but only if a poll is due: before a workday,
+            # or on the configured weekday for weekly polls
+            scheduler.add_job(
+                self.leader_only(
+                    lambda: self.send_attendance_poll() if self.is_poll_day(datetime.now(tz)) else None
+                ),
+                'cron',
+                hour=schedule['hour'],
+                minute=schedule['minute'],
+                timezone=tz,
+                id=f"{self.id}:poll",
+                replace_existing=True
+            )
+
+        # Add job to clean up expired mutes
+        scheduler.add_job(
+            self.leader_only(self.cleanup_expired_mutes),
+            'cron',
+            hour=0,  # Run at midnight
+            minute=0,
+            timezone=tz,
+            id=f"{self.id}:mutes",
+            replace_existing=True
+        )
+
+        # Drop polls that are past cold storage retention
+        scheduler.add_job(
+            self.leader_only(self.purge_cold_polls),
+            'cron',
+            hour=0,
+            minute=5,
+            timezone=tz,
+            id=f"{self.id}:purge",
+            replace_existing=True
+        )
+
+        logger.info("[%s] Scheduled %s attendance poll for %s:%s %s", self.id,
+                    f"weekly ({DAY_NAMES[current.settings.poll_weekday]})" if current.settings.weekly else "daily",
+                    schedule['hour'], schedule['minute'], schedule['timezone'])
+
+    def apply_config(self, config):
+        """Switch to a reloaded configuration without a restart
+
+        Everything derived from the new settings is built into a new
+        :class:`TenantSettings` first, which is then swapped in with a single
+        assignment. The poll state is left alone, so votes keep landing while
+        the switch happens. Sections in RESTART_SETTINGS keep their running
+        values.
+        """
+        previous = self.current
+        changed = {key for key in config.settings if config.settings.get(key) != previous.config.settings.get(key)}
+        current = TenantSettings(config, self.fan_out, previous)
+        outbox_settings = config.get_outbox()
+
+        self.current = current
+        self.poll.max_tracked_polls = current.retention['max_tracked_polls']
+        self.summary_refresher.window = config.get_summary_refresh()['debounce_seconds']
+        self.outbox.max_attempts = outbox_settings['max_attempts']
+        self.outbox.base_delay = outbox_settings['base_delay_seconds']
+        self.outbox.max_delay = outbox_settings['max_delay_seconds']
+
+        ignored = sorted(changed.intersection(RESTART_SETTINGS))
+        if ignored:
+            logger.warning("[%s] Changes to %s take effect after a restart", self.id, ", ".join(ignored))
+        if self.scheduler is not None and changed.intersection(['poll_schedule', 'poll_mode', 'dispatch']):
+            self.schedule_daily_poll(self.scheduler)
+        if changed.intersection(DISPLAY_SETTINGS) and self.is_leader():
+            # Messages already sent pick up the new look with one refresh wave
+            self.summary_refresher.mark_dirty(self.poll.poll_date)
+        logger.info("[%s] Applied new configuration (%s changed)", self.id, ", ".join(sorted(changed)) or "nothing")
+
+    def purge_cold_polls(self):
+        """Forget stored polls older than the cold storage retention"""
+        cutoff = datetime.now(self.timezone()).date() - timedelta(days=self.retention['cold_storage_days'])
+        self.store.purge_polls(cutoff.strftime("%Y-%m-%d"))
+
+    def cleanup_expired_mutes(self):
+        """Apply the mutes that start or end by the day the next poll asks about"""
+        expired = self.mutes.advance(self.polled_date())
+        if expired:
+            logger.info("[%s] Cleaned up %d expired mutes", self.id, expired)
+
+    @traced("poll.delete")
+    def delete_previous_messages(self, tomorrow_date=None):
+        """Retire a poll and hand its messages to the background deletion job
+
+        Returns True if there was a poll to delete. The messages are deleted
+        asynchronously, so a new poll can go out while the old one is cleaned up.
+        """
+        try:
+            if tomorrow_date is None:
+                tomorrow_date = self.poll.poll_date
+            tracer.current().set(tenant=self.id, poll_date=tomorrow_date)
+
+            snapshot = self.poll.snapshot()
+            if snapshot.poll_date == tomorrow_date:
+                self.record_history(snapshot)
+                # Retiring the poll forgets the responses of its own date, a weekly poll has more
+                for day in snapshot.dates[1:]:
+                    self.store.clear_responses(day)
+            messages = self.poll.end(tomorrow_date)
+            if messages is not None:
+                self.summary_refresher.discard(tomorrow_date)
+                deletions = [message.as_dict() for user_id, message in messages]
+                summary = self.summary_messages.pop(tomorrow_date, None)
+            elif tomorrow_date:
+                # Older polls are no longer held in memory, but the store still knows their messages
+                deletions = list(self.store.load_messages(tomorrow_date).values())
+                summary = self.store.load_summary_message(tomorrow_date)
+                if not deletions and not summary:
+                    return False
+            else:
+                return False
+
+            if summary:
+                deletions.append(summary)
+            self.outbox.discard_poll(tomorrow_date)
+            self.deletion_job.submit(tomorrow_date, deletions)
+            tracer.current().set(messages=len(deletions))
+            return True
+        except Exception as e:
+            logger.exception("[%s] Error in delete_previous_messages: %s", self.id, e)
+            return False
+
+    def get_attendance_stats(self, poll_date=None):
+        """Daily statistics of one date of the active poll, by default the next one
+
+        Returns None if the active poll does not cover ``poll_date``.
+        """
+        snapshot = self.poll.snapshot()
+        if poll_date is None:
+            # The next date still ahead, or the last one of a weekly poll that has run its course
+            tomorrow = self.get_tomorrow_date()
+            poll_date = next((day for day in snapshot.dates if day >= tomorrow),
+                             snapshot.dates[-1] if snapshot.dates else None)
+        elif snapshot.day(poll_date) is None:
+            return None
+        day = snapshot.day(poll_date)
+        if day is None:
+            # No active poll
+            day = snapshot
+        total_users = len(day)
+        coming = day.count("yes")
+        not_coming = day.count("no")
+        maybe = day.count("maybe")
+        no_response = self.poll.message_count(snapshot.poll_date) - total_users if snapshot.poll_date else 0
+
+        return {
+            "date": poll_date or self.get_tomorrow_date(),
+            "dates": list(snapshot.dates),
+            "total_responses": total_users,
+            "coming": coming,
+            "not_coming": not_coming,
+            "maybe": maybe,
+            "no_response": no_response if no_response >= 0 else 0
+        }
+
+    def history_since(self, days):
+        """First poll date within the last ``days`` days"""
+        return (datetime.now(self.timezone()).date() - timedelta(days=days)).isoformat()
+
+    def get_attendance_history(self, user, days):
+        """Recorded polls and one user's answers over the last ``days`` days"""
+        since = self.history_since(days)
+        return {
+            "since": since,
+            "days": self.history.days(since),
+            "totals": self.history.totals(since),
+            "user": self.history.user_summary(user, since),
+        }
+
+    def get_attendance_trends(self, weeks, window=5):
+        """Weekday averages and rolling averages of attendance over the last ``weeks`` weeks"""
+        since = self.history_since(weeks * 7)
+        return {
+            "since": since,
+            "totals": self.history.totals(since),
+            "weekdays": self.history.weekday_averages(since),
+            "rolling": self.history.rolling(window, since),
+            "window": window,
+        }
+
+    def mute(self, user_id, days):
+        """Mute the bot for a user for a number of days and return the expiration date"""
+        current_date = datetime.now(self.timezone()).date()
+        expiration_date = current_date + timedelta(days=days)
+        self.mutes.advance(self.polled_date())
+        self.mutes.set(user_id, expiration_date)
+        return expiration_date
+
+    def mute_between(self, user_id, start, until):
+        """Mute the bot for a user from ``start`` through ``until``, e.g. for a planned vacation"""
+        self.mutes.advance(self.polled_date())
+        self.mutes.set(user_id, until, start)
+
+    def unmute(self, user_id):
+        """Lift a user's mute, including one that has not started yet, returns whether there was one"""
+        return self.mutes.remove(user_id)
+
+    def mute_status(self, user_id):
+        """Return the ``(start, until)`` days of a user's mute, or None; ``start`` is only set for a later day"""
+        self.mutes.advance(self.polled_date())
+        return self.mutes.get(user_id)
+
+    def resume_jobs(self):
+        """Pick up pending deletions and queued messages, e.g. after becoming leader"""
+        self.deletion_job.resume()
+        self.outbox.resume()
+
+    def start(self):
+        """Start the tenant's background work"""
+        self.summary_refresher.start()
+        if self.leader is None:
+            self.resume_jobs()
+        threading.Thread(target=self.load_user_directory, name=f"user-directory-{self.id}", daemon=True).start()
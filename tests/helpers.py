@@ -0,0 +1,56 @@
+"""Small fakes shared by the tests"""
+import json
+import os
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+
+def slack_error(status_code: int = 429, error: str = "ratelimited", headers=None) -> SlackApiError:
+    response = SlackResponse(client=None, http_verb="POST", api_url="https://slack.test/api",
+                             req_args={}, data={"ok": False, "error": error},
+                             headers=headers or {}, status_code=status_code)
+    return SlackApiError(error, response)
+
+
+class FakeClient:
+    """Web client that answers every call with a fresh message timestamp
+
+    ``errors[name]`` lists Slack error codes the next calls of a method fail with.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.errors = {}
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            self.calls.append((name, kwargs))
+            if self.errors.get(name):
+                raise slack_error(200, self.errors[name].pop(0))
+            if name == "conversations_open":
+                return {"ok": True, "channel": {"id": f"D{kwargs['users']}"}}
+            return {"ok": True, "ts": str(len(self.calls)), "channel": kwargs.get("channel")}
+        return call
+
+
+def make_config(directory: str, **settings):
+    """Validated configuration with ``settings`` merged over the defaults, on a memory store"""
+    from config import Config
+
+    settings.setdefault("storage", {"backend": "memory"})
+    settings.setdefault("dm_channel_cache", {"path": os.path.join(directory, "dm_channels.json")})
+    path = os.path.join(directory, "config.json")
+    with open(path, "w") as f:
+        json.dump(settings, f)
+    config = Config(path)
+    config.validate()
+    return config
+
+
+def make_tenant(directory: str, **settings):
+    """Tenant on a memory store with ``settings`` merged over the default configuration"""
+    from fanout import FairExecutor
+    from tenant import Tenant
+
+    return Tenant("test", make_config(directory, **settings), FakeClient(), FairExecutor(2))
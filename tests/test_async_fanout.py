@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import os
+import sys
+import time
+import unittest
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+from fanout import AsyncFanOut, AsyncTokenBucket, EventLoopThread
+from tests.helpers import slack_error
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from fake_slack import FakeSlack, FakeSlackServer  # noqa: E402
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def stop(io):
+    io.loop.call_soon_threadsafe(io.loop.stop)
+    io._thread.join(5)
+    io.loop.close()
+
+
+class AsyncClient:
+    """Async Web client that records how many calls are waiting on Slack at once"""
+
+    def __init__(self, errors=()):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.errors = list(errors)
+
+    def __getattr__(self, name):
+        async def call(**kwargs):
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(0.01)
+                if self.errors:
+                    raise self.errors.pop(0)
+                return {"ok": True, "channel": kwargs.get("channel")}
+            finally:
+                self.in_flight -= 1
+        return call
+
+
+class EventLoopThreadTest(unittest.TestCase):
+    def setUp(self):
+        self.io = EventLoopThread("test-io")
+        self.addCleanup(stop, self.io)
+
+    def test_run_returns_the_result_in_the_callers_context(self):
+        async def current_request():
+            await asyncio.sleep(0)
+            return request_id.get()
+
+        token = request_id.set("R1")
+        self.addCleanup(request_id.reset, token)
+        self.assertEqual(self.io.run(current_request(), timeout=5), "R1")
+
+    def test_blocking_on_the_loop_thread_is_refused(self):
+        async def nested():
+            return self.io.run(asyncio.sleep(0))
+
+        with self.assertRaises(RuntimeError):
+            self.io.run(nested(), timeout=5)
+
+
+class AsyncTokenBucketTest(unittest.TestCase):
+    def test_burst_then_the_configured_rate(self):
+        async def take(count):
+            bucket = AsyncTokenBucket(600, burst=2)
+            start = time.monotonic()
+            for _ in range(count):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertLess(asyncio.run(take(2)), 0.05)
+        # The third token comes a tenth of a second later at ten per second
+        self.assertGreaterEqual(asyncio.run(take(3)), 0.09)
+
+    def test_pause_holds_every_token(self):
+        async def paused():
+            bucket = AsyncTokenBucket(6000)
+            bucket.pause(0.2)
+            start = time.monotonic()
+            await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(paused()), 0.19)
+
+
+class AsyncFanOutTest(unittest.TestCase):
+    def setUp(self):
+        self.io = EventLoopThread("test-io")
+        self.addCleanup(stop, self.io)
+
+    def test_concurrency_is_bounded(self):
+        client = AsyncClient()
+        fan_out = AsyncFanOut(client, self.io, max_concurrency=5, key="async-test")
+        report = fan_out.run(range(40), lambda index: fan_out.acall("chat.postMessage", channel=f"D{index}"),
+                             on_progress=None, method="chat.postMessage")
+        self.assertEqual((len(report.succeeded), len(report.failed)), (40, 0))
+        self.assertEqual(client.max_in_flight, 5)
+
+    def test_calls_wait_on_slack_together(self):
+        client = AsyncClient()
+        fan_out = AsyncFanOut(client, self.io, key="async-test")
+        start = time.monotonic()
+        fan_out.run(range(100), lambda index: fan_out.acall("chat.postMessage", channel=f"D{index}"),
+                    on_progress=None)
+        # A hundred calls of ten milliseconds each finish well within a second
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertGreater(client.max_in_flight, 50)
+
+    def test_429_is_retried_and_other_errors_are_reported(self):
+        client = AsyncClient(errors=[slack_error(headers={"retry-after": "0"})])
+        fan_out = AsyncFanOut(client, self.io, rate_limits={"chat.update": 6000}, key="async-test")
+        self.assertEqual(fan_out.call("chat.update", channel="D1", ts="1"), {"ok": True, "channel": "D1"})
+        self.assertEqual(client.calls, 2)
+
+        client.errors = [slack_error(200, "channel_not_found")]
+        report = fan_out.run(["D1", "D2"], lambda channel: fan_out.acall("chat.update", channel=channel),
+                             label="update", on_progress=None)
+        self.assertEqual(len(report.succeeded), 1)
+        self.assertEqual(report.failed[0][1].response["error"], "channel_not_found")
+
+    def test_fake_slack_server_end_to_end(self):
+        slack = FakeSlack(1, throttle_probability=0.5, retry_after=0, seed=3)
+        with FakeSlackServer(slack) as server:
+            client = AsyncWebClient(token="xoxb-test", base_url=server.url)
+            fan_out = AsyncFanOut(client, self.io, max_retries=10, rate_limits={"chat.postMessage": 6000},
+                                  key="async-test")
+            report = fan_out.run(range(20), lambda index: fan_out.acall("chat.postMessage", channel=f"D{index}",
+                                                                          text="Poll"),
+                                 on_progress=None, method="chat.postMessage")
+        self.assertEqual((len(report.succeeded), len(report.failed)), (20, 0))
+        self.assertGreater(sum(slack.throttled.values()), 0)
+        self.assertEqual(slack.calls["chat.postMessage"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from slack_sdk import WebClient
+
+from fanout import FanOut, FairExecutor
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_slack import FakeSlack, FakeSlackServer  # noqa: E402
+
+
+class FakeSlackTest(unittest.TestCase):
+    def test_users_are_listed_page_by_page(self):
+        slack = FakeSlack(5)
+        status, first = slack.handle("users.list", {"limit": "4"})
+        self.assertEqual((status, len(first["members"])), (200, 4))
+        _, rest = slack.handle("users.list", {"limit": "4", "cursor": first["response_metadata"]["next_cursor"]})
+        # Five users and slackbot
+        self.assertEqual(len(rest["members"]), 2)
+        self.assertEqual(rest["response_metadata"]["next_cursor"], "")
+
+    def test_calls_over_the_rate_limit_are_throttled(self):
+        slack = FakeSlack(1, rate_limits={"chat.update": 1})
+        statuses = [slack.handle("chat.update", {"channel": "D1", "ts": "1"})[0] for _ in range(3)]
+        # Three calls cannot each fall into a second of their own
+        self.assertIn(429, statuses)
+        self.assertEqual(slack.throttled["chat.update"], statuses.count(429))
+        self.assertEqual(slack.calls["chat.update"], statuses.count(200))
+        self.assertEqual(len(slack.log), statuses.count(200))
+
+
+class FakeSlackServerTest(unittest.TestCase):
+    def test_fan_out_retries_after_a_429(self):
+        slack = FakeSlack(1, throttle_probability=0.5, retry_after=0, seed=3)
+        with FakeSlackServer(slack) as server:
+            client = WebClient(token="xoxb-test", base_url=server.url)
+            fan_out = FanOut(client, max_retries=10, executor=FairExecutor(4), key="test")
+            report = fan_out.run(range(20), lambda index: fan_out.call("chat.postMessage", channel=f"D{index}",
+                                                                          text="Poll"),
+                                 on_progress=None, method="chat.postMessage")
+        self.assertEqual((len(report.succeeded), len(report.failed)), (20, 0))
+        self.assertGreater(sum(slack.throttled.values()), 0)
+        self.assertEqual(slack.calls["chat.postMessage"], 20)
+
+
+class BenchmarkRunTest(unittest.TestCase):
+    def test_small_run_reports_every_phase(self):
+        output = subprocess.run(
+            [sys.executable, os.path.join(BENCHMARK_DIR, "run.py"), "--users", "10", "--latency", "0",
+             "--throttle-probability", "0", "--debounce", "0.1", "--json"],
+            capture_output=True, text=True, check=True, timeout=120
+        ).stdout
+        phases = {phase["phase"]: phase for phase in json.loads(output)[0]["phases"]}
+        self.assertEqual([phases[name]["count"] for name in ("delivery", "votes", "deletion")], [10, 10, 10])
+        self.assertEqual(phases["delivery"]["api_calls_by_method"]["chat.postMessage"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
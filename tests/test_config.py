@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import unittest
+
+from config import Config, ConfigWatcher
+
+OPTIONS = [
+    {"text": "Office", "value": "yes", "action_id": "office_yes"},
+    {"text": "Remote", "value": "no", "action_id": "office_no"},
+]
+
+
+class ConfigReloadTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "config.json")
+        self.write({"storage": {"backend": "memory"}})
+
+    def write(self, settings):
+        with open(self.path, "w") as f:
+            json.dump(settings, f)
+        # Make the new version visible even when it lands within the same timestamp tick
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    def load(self):
+        config = Config(self.path)
+        config.validate()
+        return config
+
+    def watcher(self):
+        applied = []
+        return ConfigWatcher(self.path, applied.append), applied
+
+    def test_invalid_version_is_skipped(self):
+        watcher, applied = self.watcher()
+        self.write({"message_template": "Poll for {unknown}"})
+        with self.assertLogs("config", "ERROR"):
+            self.assertFalse(watcher.check())
+        self.assertEqual(applied, [])
+
+    def test_valid_version_is_applied_once(self):
+        watcher, applied = self.watcher()
+        self.write({"response_options": OPTIONS})
+        self.assertTrue(watcher.check())
+        self.assertFalse(watcher.check())
+        self.assertEqual(applied[0].get_response_options(), OPTIONS)
+
+    def test_retired_actions_keep_routing(self):
+        previous = self.load().compile()
+        self.write({"response_options": OPTIONS})
+        settings = self.load().compile(previous)
+        self.assertEqual(settings.vote("office_yes"), ("yes", None))
+        self.assertEqual(settings.vote("attendance_maybe"), ("maybe", None))
+        self.assertEqual(settings.vote("attendance_no_2030-01-07"), ("no", "2030-01-07"))
+        self.assertIsNone(settings.vote("unknown"))
+
+    def test_compiled_config_is_immutable(self):
+        settings = self.load().compile()
+        with self.assertRaises(AttributeError):
+            settings.weekly = True
+
+
+class TenantReloadTest(unittest.TestCase):
+    def setUp(self):
+        from tests.helpers import make_tenant
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.tenant = make_tenant(self.directory)
+
+    def reload(self, **settings):
+        path = os.path.join(self.directory, "reload.json")
+        settings.setdefault("storage", {"backend": "memory"})
+        settings.setdefault("dm_channel_cache", {"path": os.path.join(self.directory, "dm_channels.json")})
+        with open(path, "w") as f:
+            json.dump(settings, f)
+        config = Config(path)
+        config.validate()
+        self.tenant.apply_config(config)
+        return config
+
+    def test_settings_are_swapped_as_one_bundle(self):
+        before = self.tenant.current
+        config = self.reload(poll_mode={"mode": "weekly"}, retention={"max_tracked_polls": 3})
+        after = self.tenant.current
+        self.assertIsNot(after, before)
+        self.assertIs(after.config, config)
+        self.assertTrue(after.settings.weekly)
+        self.assertTrue(after.summary_renderer.weekly)
+        self.assertEqual(after.poll_text, "Which days will you be coming to the office?")
+        self.assertEqual(self.tenant.poll.max_tracked_polls, 3)
+        # The previous bundle is untouched, so a reader holding it stays consistent
+        self.assertFalse(before.settings.weekly)
+        self.assertFalse(before.summary_renderer.weekly)
+
+    def test_bundle_is_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.tenant.current.settings = None
+
+    def test_votes_route_after_renaming_actions(self):
+        self.reload(response_options=OPTIONS)
+        self.assertEqual(self.tenant.settings.vote("attendance_yes"), ("yes", None))
+        self.assertEqual(self.tenant.settings.vote("office_no"), ("no", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+from deletion import DeletionJob
+from fanout import FanOut, FairExecutor
+from storage import SQLiteStore
+from tests.helpers import FakeClient, make_tenant
+
+MESSAGES = [{"channel": f"D{index}", "ts": f"{index}.0"} for index in range(6)]
+
+
+class DeletionJobTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "attendance.db")
+
+    def job(self, client):
+        store = SQLiteStore(self.path)
+        self.addCleanup(store.close)
+        return DeletionJob(FanOut(client, executor=FairExecutor(2), key="test"), store)
+
+    def deleted(self, client):
+        return sorted(kwargs["ts"] for name, kwargs in client.calls if name == "chat_delete")
+
+    def test_interrupted_deletion_resumes_from_the_checkpoint(self):
+        client = FakeClient()
+        # The first two deletions fail as if the process went away before they were made
+        client.errors["chat_delete"] = ["internal_error", "internal_error"]
+        job = self.job(client)
+        with self.assertLogs("deletion", "ERROR"):
+            job.submit("2030-01-07", MESSAGES)
+            self.assertTrue(job.wait_idle(5))
+        self.assertEqual(job.progress(), {"pending": 0, "deleted": 4, "failed": 2})
+        job.store.close()
+
+        # A restarted replica only finds the two messages that are left
+        restarted = FakeClient()
+        job = self.job(restarted)
+        self.assertEqual(len(job.store.load_pending_deletions()), 2)
+        job.resume()
+        self.assertTrue(job.wait_idle(5))
+        self.assertEqual(len(self.deleted(restarted)), 2)
+        self.assertEqual(set(self.deleted(client)) | set(self.deleted(restarted)),
+                         {message["ts"] for message in MESSAGES})
+        self.assertEqual(job.store.load_pending_deletions(), [])
+
+    def test_messages_that_are_already_gone_count_as_deleted(self):
+        client = FakeClient()
+        client.errors["chat_delete"] = ["message_not_found"]
+        job = self.job(client)
+        job.submit("2030-01-07", MESSAGES[:2])
+        self.assertTrue(job.wait_idle(5))
+        self.assertEqual(job.progress()["deleted"], 2)
+        self.assertEqual(job.store.load_pending_deletions(), [])
+
+    def test_retire_poll_clears_the_active_poll(self):
+        job = self.job(FakeClient())
+        job.store.set_active_poll("2030-01-07")
+        job.store.save_message("2030-01-07", "U1", "D1", "1.0")
+        job.submit("2030-01-07", [{"channel": "D1", "ts": "1.0"}])
+        self.assertTrue(job.wait_idle(5))
+        self.assertEqual(job.store.load_active_poll(), (None, [], {}, {}))
+        self.assertEqual(job.store.load_messages("2030-01-07"), {})
+
+
+class EvictedPollTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name, retention={"max_tracked_polls": 2, "cold_storage_days": 30})
+        for user_id in ("U1", "U2"):
+            self.tenant.user_directory.apply({"id": user_id, "name": user_id.lower()})
+        self.tenant.user_directory.loaded = True
+        for poll_date in ("2030-01-07", "2030-01-08", "2030-01-09"):
+            self.tenant.send_attendance_poll(poll_date)
+
+    def test_evicted_poll_is_only_dropped_from_memory(self):
+        self.assertFalse(self.tenant.poll.is_tracked("2030-01-07"))
+        self.assertTrue(self.tenant.poll.is_tracked("2030-01-08"))
+        self.assertEqual(set(self.tenant.store.load_messages("2030-01-07")), {"U1", "U2"})
+
+    def test_deleting_an_evicted_poll_retires_it_in_the_store(self):
+        stored = self.tenant.store.load_messages("2030-01-07")
+        self.assertTrue(self.tenant.delete_previous_messages("2030-01-07"))
+        self.assertTrue(self.tenant.deletion_job.wait_idle(5))
+        self.assertEqual(self.tenant.store.load_messages("2030-01-07"), {})
+        self.assertEqual(self.tenant.store.load_pending_deletions(), [])
+        deleted = {(kwargs["channel"], kwargs["ts"]) for name, kwargs in self.tenant.client.calls
+                   if name == "chat_delete"}
+        self.assertEqual(deleted, {(message["channel"], message["ts"]) for message in stored.values()})
+        # The active poll is untouched
+        self.assertEqual(self.tenant.poll.poll_date, "2030-01-09")
+        self.assertEqual(len(self.tenant.store.load_messages("2030-01-09")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from directory import UserDirectory
+
+
+def member(user_id, **fields):
+    return {"id": user_id, "name": user_id.lower(), **fields}
+
+
+class UserDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = UserDirectory(page_size=2)
+
+    def paged(self, pages, during=None):
+        """Fake ``users.list`` serving ``pages``, calling ``during(page)`` before it returns each one"""
+        def call(method, limit, cursor=None):
+            index = int(cursor or 0)
+            if during:
+                during(index)
+            next_cursor = str(index + 1) if index + 1 < len(pages) else ""
+            return {"members": pages[index], "response_metadata": {"next_cursor": next_cursor}}
+        return call
+
+    def recipient_ids(self):
+        return sorted(user["id"] for user in self.directory.recipients())
+
+    def test_bootstrap_skips_bots_and_deleted_users(self):
+        pages = [[member("U1"), member("B1", is_bot=True)], [member("U2", deleted=True), member("U3")]]
+        self.directory.bootstrap(self.paged(pages))
+        self.assertEqual(self.recipient_ids(), ["U1", "U3"])
+
+    def test_events_during_bootstrap_are_kept(self):
+        pages = [[member("U1"), member("U2")], [member("U3")]]
+
+        def during(page):
+            if page == 1:
+                # U4 joins after the first page, U1 is deactivated after it was loaded
+                self.directory.apply(member("U4"))
+                self.directory.apply(member("U1", deleted=True))
+                # U3's page was read before the rename reaches the directory
+                self.directory.apply(member("U3", name="carol"))
+
+        self.directory.bootstrap(self.paged(pages, during))
+        self.assertEqual(self.recipient_ids(), ["U2", "U3", "U4"])
+        self.assertEqual(self.directory.get("U3")["name"], "carol")
+
+    def test_muted_users_are_left_out(self):
+        self.directory.set_muted("U1", True)
+        self.directory.bootstrap(self.paged([[member("U1"), member("U2")]]))
+        self.assertEqual(self.recipient_ids(), ["U2"])
+        self.directory.set_muted("U1", False)
+        self.assertEqual(self.recipient_ids(), ["U1", "U2"])
+
+    def test_failed_bootstrap_stops_recording_events(self):
+        def call(method, **kwargs):
+            raise RuntimeError("users.list failed")
+
+        with self.assertRaises(RuntimeError):
+            self.directory.bootstrap(call)
+        self.directory.apply(member("U1"))
+        self.assertIsNone(self.directory._events)
+        self.assertFalse(self.directory.loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from datetime import datetime, timedelta
+
+from dispatch import DispatchPlanner
+
+DEADLINE = datetime(2030, 1, 7, 9, 0)
+RATE_LIMITS = {"chat.postMessage": 600, "conversations.open": 50}
+
+
+class DispatchPlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.planner = DispatchPlanner(RATE_LIMITS, max_workers=10, call_latency=0.3, safety_margin=30)
+
+    def test_small_audience_gets_the_poll_within_seconds(self):
+        plan = self.planner.plan(DEADLINE, 40)
+        self.assertAlmostEqual(plan.estimated_seconds, 1.2)
+        # The margin is capped at the estimate, not the configured 30 seconds
+        self.assertLessEqual(plan.lead_seconds, 3)
+        self.assertLessEqual(plan.finish_at, DEADLINE)
+        self.assertFalse(plan.late)
+
+    def test_empty_audience_starts_at_the_deadline(self):
+        self.assertEqual(self.planner.plan(DEADLINE, 0).start_at, DEADLINE)
+
+    def test_large_audience_is_spread_over_the_rate_limit(self):
+        plan = self.planner.plan(DEADLINE, 6100)
+        # 100 messages go out in the first burst, the rest at ten per second
+        self.assertAlmostEqual(plan.estimated_seconds, 600)
+        self.assertEqual(plan.start_at, DEADLINE - timedelta(seconds=630))
+        self.assertEqual(plan.finish_at, DEADLINE - timedelta(seconds=30))
+        self.assertFalse(plan.late)
+
+    def test_unopened_channels_are_planned_at_their_own_rate(self):
+        plan = self.planner.plan(DEADLINE, 200, unopened=200)
+        self.assertGreater(plan.estimated_seconds, self.planner.plan(DEADLINE, 200).estimated_seconds)
+
+    def test_window_too_short_starts_right_away(self):
+        earliest = DEADLINE - timedelta(minutes=5)
+        plan = self.planner.plan(DEADLINE, 6100, earliest=earliest)
+        self.assertEqual(plan.start_at, earliest)
+        self.assertTrue(plan.late)
+
+
+if __name__ == "__main__":
+    unittest.main()
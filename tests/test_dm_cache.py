@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from slack_sdk.errors import SlackApiError
+
+from dm_cache import DMChannelCache
+from tests.helpers import make_tenant
+
+
+class DMChannelCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "dm_channels.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def on_disk(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_replicas_keep_each_others_channels(self):
+        first, second = DMChannelCache(self.path), DMChannelCache(self.path)
+        first.set("U1", "D1")
+        second.set("U2", "D2")
+        first.save()
+        second.save()
+        self.assertEqual(self.on_disk(), {"U1": "D1", "U2": "D2"})
+        # The later saver also learns the other replica's channels
+        self.assertEqual(second.get("U1"), "D1")
+
+    def test_invalidated_channel_is_removed_from_disk(self):
+        first = DMChannelCache(self.path)
+        first.set("U1", "D1")
+        first.set("U2", "D2")
+        first.save()
+        second = DMChannelCache(self.path)
+        second.invalidate("U1")
+        second.save()
+        self.assertEqual(self.on_disk(), {"U2": "D2"})
+        # Merging back what is on disk does not bring it back either
+        first.set("U3", "D3")
+        first.save()
+        second.set("U4", "D4")
+        second.save()
+        self.assertIsNone(second.get("U1"))
+
+    def test_concurrent_saves_lose_nothing(self):
+        caches = [DMChannelCache(self.path) for _ in range(8)]
+        for index, cache in enumerate(caches):
+            for user in range(50):
+                cache.set(f"U{index}-{user}", f"D{index}-{user}")
+        threads = [threading.Thread(target=cache.save) for cache in caches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.on_disk()), 8 * 50)
+        self.assertEqual([name for name in os.listdir(self.directory.name) if name.endswith(".tmp")], [])
+
+    def test_save_without_changes_does_not_write(self):
+        DMChannelCache(self.path).save()
+        self.assertFalse(os.path.exists(self.path))
+
+
+class StaleChannelTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name)
+        self.tenant.poll.start("2030-01-07")
+        self.tenant.dm_channels.set("U1", "D-old")
+        self.user = {"id": "U1", "name": "alice"}
+
+    def methods(self):
+        return [name for name, _ in self.tenant.client.calls]
+
+    def test_stale_channel_is_reopened(self):
+        self.tenant.client.errors["chat_postMessage"] = ["channel_not_found"]
+        self.tenant.deliver("2030-01-07", self.user)
+        self.assertEqual(self.methods(), ["chat_postMessage", "conversations_open", "chat_postMessage"])
+        self.assertEqual(self.tenant.dm_channels.get("U1"), "DU1")
+
+    def test_permanent_error_does_not_reopen(self):
+        self.tenant.client.errors["chat_postMessage"] = ["cannot_dm_bot"]
+        with self.assertRaises(SlackApiError):
+            self.tenant.deliver("2030-01-07", self.user)
+        self.assertEqual(self.methods(), ["chat_postMessage"])
+        self.assertEqual(self.tenant.dm_channels.get("U1"), "D-old")
+
+
+if __name__ == "__main__":
+    unittest.main()
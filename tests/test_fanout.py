@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+
+from fanout import FairExecutor, FanOut, retry_after
+from tests.helpers import slack_error
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_header_name_in_any_case(self):
+        self.assertEqual(retry_after(slack_error(headers={"Retry-After": "7"})), 7.0)
+        self.assertEqual(retry_after(slack_error(headers={"retry-after": "3"})), 3.0)
+        self.assertEqual(retry_after(slack_error(headers={"RETRY-AFTER": "2.5"})), 2.5)
+
+    def test_defaults_to_one_second(self):
+        self.assertEqual(retry_after(slack_error(headers={})), 1.0)
+
+    def test_call_waits_for_lowercase_header(self):
+        class Client:
+            calls = []
+
+            def chat_update(self, **kwargs):
+                self.calls.append(time.monotonic())
+                if len(self.calls) == 1:
+                    raise slack_error(headers={"retry-after": "0.3"})
+                return {"ok": True}
+
+        client = Client()
+        fan_out = FanOut(client, executor=FairExecutor(1))
+        self.assertEqual(fan_out.call("chat.update", channel="D1", ts="1"), {"ok": True})
+        self.assertGreaterEqual(client.calls[1] - client.calls[0], 0.3)
+
+
+class Client:
+    """Web client whose calls return at once"""
+
+    def __getattr__(self, name):
+        return lambda **kwargs: {"ok": True}
+
+
+class FairExecutorTest(unittest.TestCase):
+    def run_in_background(self, fan_out, count, method):
+        thread = threading.Thread(target=fan_out.run, args=(range(count), lambda item: fan_out.call(method)),
+                                  kwargs={"on_progress": None, "method": method}, daemon=True)
+        thread.start()
+        # Let the throttled run use up its burst and queue the rest
+        time.sleep(0.3)
+        return thread
+
+    def test_throttled_tenant_does_not_hold_the_workers(self):
+        executor = FairExecutor(4)
+        throttled = FanOut(Client(), executor=executor, key="A", rate_limits={"chat.update": 60})
+        other = FanOut(Client(), executor=executor, key="B")
+        self.run_in_background(throttled, 200, "chat.update")
+
+        start = time.monotonic()
+        report = other.run(range(40), lambda item: other.call("chat.postMessage"),
+                           on_progress=None, method="chat.postMessage")
+        self.assertEqual(len(report.succeeded), 40)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_delivery_runs_alongside_throttled_cleanup(self):
+        executor = FairExecutor(4)
+        fan_out = FanOut(Client(), executor=executor, key="A", rate_limits={"chat.delete": 60})
+        self.run_in_background(fan_out, 200, "chat.delete")
+
+        start = time.monotonic()
+        report = fan_out.run(range(40), lambda item: fan_out.call("chat.postMessage"),
+                             on_progress=None, method="chat.postMessage")
+        self.assertEqual(len(report.succeeded), 40)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_throttled_run_keeps_its_rate(self):
+        fan_out = FanOut(Client(), executor=FairExecutor(4), rate_limits={"chat.update": 600})
+        start = time.monotonic()
+        # A burst of ten seconds' worth, then ten calls per second
+        report = fan_out.run(range(110), lambda item: fan_out.call("chat.update"),
+                             on_progress=None, method="chat.update")
+        self.assertEqual(len(report.succeeded), 110)
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+    def test_task_reserving_a_token_takes_only_one(self):
+        bucket_calls = []
+        fan_out = FanOut(Client(), executor=FairExecutor(2), rate_limits={"chat.update": 60})
+        bucket = fan_out._bucket("chat.update")
+        tokens = bucket._tokens
+        fan_out.run(range(3), lambda item: bucket_calls.append(fan_out.call("chat.update")),
+                    on_progress=None, method="chat.update")
+        self.assertEqual(len(bucket_calls), 3)
+        self.assertAlmostEqual(bucket._tokens, tokens - 3, delta=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from history import AttendanceHistory
+from storage import MemoryStore
+
+# Monday to Wednesday of two weeks
+DAYS = {
+    "2030-01-07": {"alice": "yes", "bob": "yes", "carol": "no"},
+    "2030-01-08": {"alice": "no", "bob": "yes"},
+    "2030-01-09": {"alice": "maybe"},
+    "2030-01-14": {"alice": "yes", "bob": "no", "carol": "yes"},
+    "2030-01-15": {"bob": "yes", "carol": "yes"},
+    "2030-01-16": {},
+}
+
+
+class AttendanceHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryStore()
+        self.history = AttendanceHistory(self.store)
+        for poll_date, responses in DAYS.items():
+            self.history.record(poll_date, responses, polled=4)
+
+    def test_totals_match_a_direct_count(self):
+        for since, until in ((None, None), ("2030-01-08", "2030-01-14"), ("2030-01-10", None), ("2030-02-01", None)):
+            days = [responses for poll_date, responses in DAYS.items()
+                    if (since is None or poll_date >= since) and (until is None or poll_date <= until)]
+            self.assertEqual(self.history.totals(since, until), {
+                "polls": len(days),
+                "yes": sum(list(responses.values()).count("yes") for responses in days),
+                "responses": sum(len(responses) for responses in days),
+                "polled": 4 * len(days),
+            })
+
+    def test_rolling_average_reaches_back_before_the_range(self):
+        points = self.history.rolling(3, since="2030-01-14")
+        # Yes votes per day: 2, 1, 0, 2, 2, 0
+        self.assertEqual(points, [("2030-01-14", 1.0), ("2030-01-15", 4 / 3), ("2030-01-16", 4 / 3)])
+        self.assertEqual(self.history.rolling(2)[0], ("2030-01-07", 2.0))
+
+    def test_user_summary(self):
+        self.assertEqual(self.history.user_summary("alice"), {"polls": 6, "yes": 2, "no": 1, "maybe": 1})
+        self.assertEqual(self.history.user_summary("carol", since="2030-01-14"),
+                         {"polls": 3, "yes": 2, "no": 0, "maybe": 0})
+        self.assertEqual(self.history.user_summary("nobody"), {"polls": 6, "yes": 0, "no": 0, "maybe": 0})
+
+    def test_weekday_averages(self):
+        monday = self.history.weekday_averages()[0]
+        self.assertEqual(monday, {"polls": 2, "average_yes": 2.0, "response_rate": 6 / 8})
+
+    def test_recording_a_day_again_updates_the_sums(self):
+        self.assertEqual(self.history.totals()["yes"], 7)
+        self.assertFalse(self.history.record("2030-01-16", {}, polled=4))
+        self.assertTrue(self.history.record("2030-01-16", {"alice": "yes", "dave": "yes"}, polled=4))
+        self.assertEqual(self.history.totals()["yes"], 9)
+        self.assertEqual(self.history.user_summary("dave")["yes"], 1)
+
+    def test_another_replica_picks_up_recorded_days(self):
+        replica = AttendanceHistory(self.store)
+        self.assertEqual(replica.totals(), self.history.totals())
+        self.history.record("2030-01-17", {"bob": "yes"}, polled=4)
+        replica.refresh()
+        self.assertEqual(len(replica), 7)
+        self.assertEqual(replica.user_summary("bob"), self.history.user_summary("bob"))
+
+
+if __name__ == "__main__":
+    unittest.main()
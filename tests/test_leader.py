@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from leader import LeaderLease
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class LeaderLeaseTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "leader.db")
+        self.clock = FakeClock()
+        patcher = mock.patch("leader.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.elected = []
+
+    def lease(self, name):
+        lease = LeaderLease(self.path, ttl=30, on_elected=lambda: self.elected.append(name))
+        self.addCleanup(lease._conn.close)
+        return lease
+
+    def test_only_one_replica_holds_the_lease(self):
+        first, second = self.lease("first"), self.lease("second")
+        with self.assertLogs("leader", "INFO"):
+            self.assertTrue(first.hold())
+        self.assertFalse(second.hold())
+        # Renewing keeps the lease past the original expiry
+        self.clock.now += 20
+        self.assertTrue(first.hold())
+        self.clock.now += 20
+        self.assertFalse(second.hold())
+        self.assertEqual(self.elected, ["first"])
+
+    def test_expired_lease_is_handed_over(self):
+        first, second = self.lease("first"), self.lease("second")
+        first.hold()
+        self.clock.now += 31
+        with self.assertLogs("leader", "INFO"):
+            self.assertTrue(second.hold())
+        with self.assertLogs("leader", "WARNING"):
+            self.assertFalse(first.hold())
+        self.assertEqual(self.elected, ["first", "second"])
+
+    def test_released_lease_is_taken_over_at_once(self):
+        first, second = self.lease("first"), self.lease("second")
+        first.hold()
+        first.release()
+        self.assertFalse(first.is_leader)
+        self.assertTrue(second.hold())
+
+    def test_competing_replicas_elect_one_leader(self):
+        leases = [self.lease(f"replica{index}") for index in range(4)]
+        with self.assertLogs("leader", "INFO"):
+            for _ in range(20):
+                start = threading.Barrier(len(leases))
+                results = {}
+
+                def compete(lease):
+                    start.wait()
+                    results[lease.holder] = lease.hold()
+
+                threads = [threading.Thread(target=compete, args=(lease,)) for lease in leases]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(sum(results.values()), 1)
+                # Let the lease expire so every round is an open race
+                self.clock.now += 31
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import unittest
+import urllib.error
+import urllib.request
+
+from slack_sdk.errors import SlackApiError
+
+import metrics
+from fanout import FanOut, FairExecutor
+from metrics import Counter, Gauge, Histogram, InstrumentedWebClient, Metric, Registry
+from tests.helpers import FakeClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from fake_slack import FakeSlack, FakeSlackServer  # noqa: E402
+
+
+class RenderTest(unittest.TestCase):
+    def test_counter_renders_one_line_per_label_set(self):
+        counter = Counter("calls_total", "Calls by method", ["method"])
+        counter.inc(method="chat.update")
+        counter.inc(2, method="chat.postMessage")
+        self.assertEqual(counter.render(), "\n".join([
+            "# HELP calls_total Calls by method",
+            "# TYPE calls_total counter",
+            'calls_total{method="chat.postMessage"} 2',
+            'calls_total{method="chat.update"} 1',
+        ]))
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("errors_total", "Errors", ["error"])
+        counter.inc(error='bad "quote"\\\n')
+        self.assertIn('errors_total{error="bad \\"quote\\"\\\\\\n"} 1', counter.render())
+
+    def test_gauge_function_is_read_at_scrape_time(self):
+        gauge = Gauge("muted", "Muted users")
+        values = [3, 5]
+        gauge.set_function(lambda: values.pop(0))
+        self.assertTrue(gauge.render().endswith("muted 3"))
+        self.assertTrue(gauge.render().endswith("muted 5"))
+
+    def test_failing_gauge_function_is_left_out(self):
+        gauge = Gauge("muted", "Muted users")
+        gauge.set_function(lambda: 1 / 0)
+        self.assertEqual(gauge.samples(), [])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency", ["method"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value, method="chat.update")
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            'latency_seconds_bucket{method="chat.update",le="0.1"} 1',
+            'latency_seconds_bucket{method="chat.update",le="1"} 2',
+            'latency_seconds_bucket{method="chat.update",le="+Inf"} 3',
+            'latency_seconds_sum{method="chat.update"} 2.55',
+            'latency_seconds_count{method="chat.update"} 3',
+        ])
+
+    def test_metric_without_samples_cannot_be_created(self):
+        class Untyped(Metric):
+            pass
+
+        with self.assertRaises(TypeError):
+            Untyped("untyped", "No samples")
+
+    def test_registry_joins_every_metric(self):
+        registry = Registry()
+        registry.register(Counter("a_total", "A")).inc()
+        registry.register(Gauge("b", "B")).set(1.5)
+        self.assertEqual(registry.render().splitlines()[2::3], ["a_total 1", "b 1.5"])
+        self.assertTrue(registry.render().endswith("\n"))
+
+
+class InstrumentedWebClientTest(unittest.TestCase):
+    def test_calls_latency_and_rate_limits_are_recorded(self):
+        method = "chat.postMessage"
+        calls = metrics.SLACK_API_CALLS.value(method=method)
+        limited = metrics.SLACK_API_RATE_LIMITED.value(method=method)
+        errors = metrics.SLACK_API_ERRORS.value(method=method, error="ratelimited")
+        with FakeSlackServer(FakeSlack(1, throttle_probability=1.0, retry_after=0)) as server:
+            client = InstrumentedWebClient(token="xoxb-test", base_url=server.url)
+            with self.assertRaises(SlackApiError):
+                client.chat_postMessage(channel="D1", text="Poll")
+        self.assertEqual(metrics.SLACK_API_CALLS.value(method=method), calls + 1)
+        self.assertEqual(metrics.SLACK_API_RATE_LIMITED.value(method=method), limited + 1)
+        self.assertEqual(metrics.SLACK_API_ERRORS.value(method=method, error="ratelimited"), errors + 1)
+        self.assertIn(f'slack_api_call_duration_seconds_count{{method="{method}"}}', metrics.REGISTRY.render())
+
+
+class FanOutMetricsTest(unittest.TestCase):
+    def test_failures_and_duration_are_recorded_per_kind(self):
+        client = FakeClient()
+        client.errors["chat_postMessage"] = ["channel_not_found"]
+        fan_out = FanOut(client, max_retries=0, executor=FairExecutor(2), key="metrics-test")
+        failures = metrics.FAN_OUT_FAILURES.value(tenant="metrics-test", kind="poll")
+        fan_out.run(range(3), lambda index: fan_out.call("chat.postMessage", channel=f"D{index}"),
+                    label="poll", on_progress=None)
+        self.assertEqual(metrics.FAN_OUT_FAILURES.value(tenant="metrics-test", kind="poll"), failures + 1)
+        depth = {labels: value for _, labels, value in metrics.FAN_OUT_QUEUE_DEPTH.samples()}
+        self.assertEqual(depth['{tenant="metrics-test",kind="poll"}'], 0)
+        self.assertIn('fan_out_duration_seconds_count{tenant="metrics-test",kind="poll"} 1',
+                      metrics.REGISTRY.render())
+
+
+class MetricsServerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = metrics.start_metrics_server("127.0.0.1", 0)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def test_metrics_are_served_as_prometheus_text(self):
+        with urllib.request.urlopen(self.url + "/metrics") as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+            self.assertIn("# TYPE slack_api_calls_total counter", response.read().decode())
+
+    def test_other_paths_are_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as caught:
+            urllib.request.urlopen(self.url + "/other")
+        self.assertEqual(caught.exception.code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
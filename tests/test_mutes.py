@@ -0,0 +1,146 @@
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from directory import UserDirectory
+from mutes import MuteRegistry
+from storage import MemoryStore
+from tests.helpers import make_tenant
+
+JUNE_30 = date(2024, 6, 30)
+JULY_1 = date(2024, 7, 1)
+JULY_14 = date(2024, 7, 14)
+JULY_15 = date(2024, 7, 15)
+
+
+class MuteRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryStore()
+        self.changes = []
+        # The registry's day is the day the poll asks about, one day after it is sent
+        self.mutes = MuteRegistry(self.store, JUNE_30, on_change=lambda *change: self.changes.append(change))
+
+    def test_vacation_starts_with_the_poll_about_its_first_day(self):
+        self.mutes.set("U1", JULY_14, start=JULY_1)
+        self.assertNotIn("U1", self.mutes)
+        # Sent on June 30, asks about July 1
+        self.mutes.advance(JULY_1)
+        self.assertIn("U1", self.mutes)
+
+    def test_vacation_ends_before_the_poll_about_the_day_after(self):
+        self.mutes.set("U1", JULY_14, start=JULY_1)
+        # Sent on July 13, asks about July 14
+        self.mutes.advance(JULY_14)
+        self.assertIn("U1", self.mutes)
+        # Sent on July 14, asks about July 15
+        self.assertEqual(self.mutes.advance(JULY_15), 1)
+        self.assertNotIn("U1", self.mutes)
+        self.assertEqual(self.store.load_mutes(), {})
+        self.assertEqual(self.changes, [("U1", True), ("U1", False)])
+
+    def test_start_is_reported_while_it_lies_ahead(self):
+        self.mutes.set("U1", JULY_14, start=JULY_1)
+        self.assertEqual(self.mutes.get("U1"), (JULY_1, JULY_14))
+        self.mutes.advance(JULY_1)
+        self.assertEqual(self.mutes.get("U1"), (None, JULY_14))
+
+    def test_unmute_drops_the_pending_events(self):
+        self.mutes.set("U1", JULY_14, start=JULY_1)
+        self.assertTrue(self.mutes.remove("U1"))
+        self.assertFalse(self.mutes.remove("U1"))
+        self.mutes.advance(JULY_1)
+        self.assertNotIn("U1", self.mutes)
+        self.assertEqual(self.changes, [])
+
+    def test_load_only_touches_changed_users(self):
+        for user_id in ("U1", "U2", "U3"):
+            self.mutes.set(user_id, JULY_14)
+        events = len(self.mutes._events)
+        self.changes.clear()
+
+        self.assertEqual(self.mutes.load(self.store.load_mutes()), 0)
+        self.assertEqual(len(self.mutes._events), events)
+
+        # Another replica lifts one mute and moves another to a later start
+        self.store.delete_mute("U1")
+        self.store.save_mute("U2", JULY_14, JULY_1)
+        self.assertEqual(self.mutes.load(self.store.load_mutes()), 2)
+        self.assertEqual(self.mutes.muted(), {"U3"})
+        self.assertEqual(sorted(self.changes), [("U1", False), ("U2", False)])
+        self.mutes.advance(JULY_1)
+        self.assertEqual(self.mutes.muted(), {"U2", "U3"})
+
+    def test_directory_leaves_out_muted_users(self):
+        directory = UserDirectory()
+        for user_id in ("U1", "U2"):
+            directory.apply({"id": user_id, "name": user_id.lower()})
+        mutes = MuteRegistry(self.store, JUNE_30, on_change=directory.set_muted)
+        mutes.set("U1", JULY_14, start=JULY_1)
+        self.assertEqual(len(directory.recipients()), 2)
+        mutes.advance(JULY_1)
+        self.assertEqual(directory.recipients(), [{"id": "U2", "name": "u2"}])
+        mutes.advance(JULY_15)
+        self.assertEqual(len(directory.recipients()), 2)
+
+
+class TenantMuteTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name)
+        self.tenant.user_directory.apply({"id": "U1", "name": "alice"})
+        self.tenant.user_directory.loaded = True
+        self.today = datetime.now(self.tenant.timezone()).date()
+
+    def test_polled_date_is_tomorrow(self):
+        self.assertEqual(self.tenant.polled_date(), self.today + timedelta(days=1))
+
+    def test_mute_starting_tomorrow_skips_todays_poll(self):
+        tomorrow = self.today + timedelta(days=1)
+        self.tenant.mute_between("U1", tomorrow, tomorrow + timedelta(days=3))
+        self.assertEqual(self.tenant.get_poll_recipients(), [])
+
+    def test_mute_ending_today_does_not_skip_todays_poll(self):
+        self.tenant.mute_between("U1", self.today - timedelta(days=3), self.today)
+        self.assertEqual(self.tenant.get_poll_recipients(), [{"id": "U1", "name": "alice"}])
+        self.assertIsNone(self.tenant.mute_status("U1"))
+
+    def test_mute_for_days_covers_the_next_polls(self):
+        until = self.tenant.mute("U1", 2)
+        self.assertEqual(until, self.today + timedelta(days=2))
+        self.assertEqual(self.tenant.mute_status("U1"), (None, until))
+        self.assertEqual(self.tenant.get_poll_recipients(), [])
+
+
+class WeeklyMuteTest(unittest.TestCase):
+    """A weekly poll sent on Friday 2030-01-04 asks about 2030-01-07 to 2030-01-11"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name, poll_mode={"mode": "weekly"})
+        self.tenant.user_directory.apply({"id": "U1", "name": "alice"})
+        self.tenant.user_directory.loaded = True
+
+        class Friday(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return tz.localize(datetime(2030, 1, 4, 10, 0)) if tz else datetime(2030, 1, 4, 10, 0)
+
+        patcher = mock.patch("tenant.datetime", Friday)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.assertEqual(self.tenant.polled_date(), date(2030, 1, 7))
+
+    def test_mute_covering_the_first_day_skips_the_week(self):
+        self.tenant.mute_between("U1", date(2030, 1, 7), date(2030, 1, 7))
+        self.assertEqual(self.tenant.get_poll_recipients(), [])
+
+    def test_mute_starting_later_in_the_week_does_not(self):
+        self.tenant.mute_between("U1", date(2030, 1, 8), date(2030, 1, 11))
+        self.assertEqual(self.tenant.get_poll_recipients(), [{"id": "U1", "name": "alice"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from outbox import Outbox
+from storage import MemoryStore
+from tests.helpers import slack_error
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for target, value in (("outbox.time", self.clock),
+                              # Always the longest delay, so the schedule is exact
+                              ("outbox.random.uniform", lambda low, high: high)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.store = MemoryStore()
+        self.attempts = []
+        self.sent = threading.Semaphore(0)
+        self.outbox = Outbox(self.store, self.send, max_attempts=4, base_delay=2.0, max_delay=5.0)
+
+    def send(self, operation, entries):
+        self.attempts.append((self.clock.now, [entry["key"] for entry in entries]))
+        self.sent.release()
+        return SimpleNamespace(succeeded=[], failed=[(entry, slack_error(503, "service_unavailable"))
+                                                     for entry in entries])
+
+    def wake(self, seconds):
+        """Move the clock forward and let the retry thread look again"""
+        self.clock.now += seconds
+        self.outbox._wakeup.set()
+
+    def stored(self, key):
+        return next(entry for entry in self.store.load_outbound() if entry["key"] == key)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual([self.outbox._backoff(attempts) for attempts in range(1, 6)], [2, 4, 5, 5, 5])
+
+    def test_backoff_jitter_keeps_half_the_delay(self):
+        with mock.patch("outbox.random.uniform", lambda low, high: low):
+            self.assertEqual(self.outbox._backoff(2), 2)
+
+    def test_entry_is_dead_lettered_after_max_attempts(self):
+        key = "2030-01-07|U1|update"
+        with self.assertLogs("outbox", "WARNING"):
+            self.outbox.add("2030-01-07", "U1", "update", slack_error(503, "service_unavailable"))
+            self.assertEqual(self.stored(key)["next_attempt"], 1002.0)
+            # Nothing is retried before the backoff has passed
+            self.wake(1)
+            self.assertFalse(self.sent.acquire(timeout=0.2))
+            for delay in (1, 4, 5):
+                self.wake(delay)
+                self.assertTrue(self.sent.acquire(timeout=5))
+            self.assertTrue(self.outbox.wait_idle(5))
+
+        self.assertEqual([at for at, _ in self.attempts], [1002.0, 1006.0, 1011.0])
+        self.assertEqual(self.outbox.progress(), {"pending": 0, "dead": 1})
+        dead = self.outbox.dead_letters()[0]
+        self.assertEqual((dead["key"], dead["attempts"], dead["last_error"]), (key, 4, "service_unavailable"))
+        self.assertTrue(self.stored(key)["dead"])
+
+    def test_permanent_error_is_dead_lettered_at_once(self):
+        with self.assertLogs("outbox", "WARNING"):
+            self.outbox.add("2030-01-07", "U1", "post", slack_error(200, "cannot_dm_bot"))
+        self.assertEqual(self.outbox.progress(), {"pending": 0, "dead": 1})
+        self.assertEqual(self.attempts, [])
+
+    def test_later_update_replaces_the_queued_one(self):
+        self.outbox.add("2030-01-07", "U1", "update", slack_error(503, "service_unavailable"))
+        self.outbox.add("2030-01-07", "U1", "update", slack_error(503, "service_unavailable"))
+        self.assertEqual(self.outbox.progress(), {"pending": 1, "dead": 0})
+        self.outbox.complete("2030-01-07", "U1", "update")
+        self.assertEqual(self.store.load_outbound(), [])
+        self.wake(10)
+        self.assertTrue(self.outbox.wait_idle(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
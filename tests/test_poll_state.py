@@ -0,0 +1,135 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from poll_state import PollState
+from tests.helpers import make_tenant
+
+
+class PollStateTest(unittest.TestCase):
+    def test_record_changes_version_only_on_change(self):
+        state = PollState()
+        state.start("2030-01-07")
+        version = state.version
+        self.assertEqual(state.record("alice", "yes"), "2030-01-07")
+        self.assertIsNone(state.record("alice", "yes"))
+        self.assertEqual(state.version, version + 1)
+
+    def test_vote_without_active_poll_is_ignored(self):
+        self.assertIsNone(PollState().record("alice", "yes"))
+
+    def test_snapshot_is_reused_until_the_next_change(self):
+        state = PollState()
+        state.start("2030-01-07")
+        state.record("alice", "yes")
+        snapshot = state.snapshot()
+        self.assertIs(state.snapshot(), snapshot)
+        state.record("alice", "no")
+        self.assertIsNot(state.snapshot(), snapshot)
+        # An earlier snapshot keeps showing the state it was taken at
+        self.assertEqual(snapshot.get("alice"), "yes")
+        self.assertEqual(state.snapshot().voters("no"), ["alice"])
+        self.assertEqual(state.snapshot().count("yes"), 0)
+
+    def test_concurrent_votes_are_all_counted_in_order(self):
+        state = PollState()
+        state.start("2030-01-07")
+        persisted = []
+        users = [f"user{index}" for index in range(400)]
+
+        def vote(user):
+            for response in ("yes", "no", "maybe"):
+                state.record(user, response, on_change=lambda day, user, response: persisted.append((user, response)))
+
+        threads = [threading.Thread(target=vote, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        snapshot = state.snapshot()
+        self.assertEqual(len(snapshot), 400)
+        self.assertEqual(snapshot.count("maybe"), 400)
+        self.assertEqual(snapshot.count("yes") + snapshot.count("no"), 0)
+        # The persisted writes follow the order the votes were applied in
+        last = {}
+        for user, response in persisted:
+            last[user] = response
+        self.assertEqual(set(last.values()), {"maybe"})
+        self.assertEqual(len(persisted), 1200)
+
+    def test_start_evicts_the_oldest_tracked_polls(self):
+        state = PollState(max_tracked_polls=2)
+        for day in ("2030-01-07", "2030-01-08"):
+            state.start(day)
+            state.track_message(day, "U1", "D1", day)
+        self.assertEqual(state.start("2030-01-09"), ["2030-01-07"])
+        self.assertFalse(state.is_tracked("2030-01-07"))
+        self.assertTrue(state.is_tracked("2030-01-08"))
+
+    def test_end_forgets_the_active_poll(self):
+        state = PollState()
+        state.start("2030-01-07")
+        state.track_message("2030-01-07", "U1", "D1", "1.0")
+        state.record("alice", "yes")
+        messages = state.end("2030-01-07")
+        self.assertEqual([(user_id, ref.as_dict()) for user_id, ref in messages],
+                         [("U1", {"channel": "D1", "ts": "1.0"})])
+        self.assertIsNone(state.poll_date)
+        self.assertIsNone(state.end("2030-01-07"))
+
+    def test_sync_merges_another_replicas_votes(self):
+        state = PollState()
+        state.start("2030-01-07")
+        state.record("alice", "yes")
+        self.assertTrue(state.sync(lambda: ("2030-01-07", ["2030-01-07"], {"2030-01-07": {"bob": "no"}},
+                                            {"U2": {"channel": "D2", "ts": "2"}})))
+        self.assertFalse(state.sync(lambda: ("2030-01-07", ["2030-01-07"], {"2030-01-07": {"bob": "no"}}, {})))
+        self.assertEqual(dict(state.snapshot().responses), {"alice": "yes", "bob": "no"})
+        self.assertEqual(state.message_count("2030-01-07"), 1)
+
+
+class ReplicaSyncTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = {"backend": "sqlite", "path": os.path.join(directory.name, "attendance.db")}
+        self.local = make_tenant(directory.name, storage=storage)
+        self.other = make_tenant(directory.name, storage=storage)
+        for tenant in (self.local, self.other):
+            self.addCleanup(tenant.store.close)
+        self.other.poll.start("2030-01-07")
+        self.other.store.set_active_poll("2030-01-07")
+        self.other.record_response("alice", "no")
+        self.other.store.flush()
+        self.local.sync_from_store()
+
+    def test_local_vote_during_sync_is_not_overwritten(self):
+        self.other.record_response("bob", "yes")
+        self.other.store.flush()
+        load = self.local.store.load_active_poll
+        voters = []
+
+        def load_then_vote():
+            # A newer local vote arrives right after the stored state has been read
+            stored = load()
+            voter = threading.Thread(target=self.local.record_response, args=("alice", "yes"))
+            voter.start()
+            voter.join(0.2)
+            voters.append(voter)
+            return stored
+
+        self.local.store.load_active_poll = load_then_vote
+        self.local.sync_from_store()
+        voters[0].join()
+        self.local.store.flush()
+
+        self.assertEqual(self.local.poll.snapshot().get("alice"), "yes")
+        self.assertEqual(self.local.poll.snapshot().get("bob"), "yes")
+        stored = self.other.store.load_active_poll()[2]["2030-01-07"]
+        self.assertEqual(stored, {"alice": "yes", "bob": "yes"})
+
+
+if __name__ == "__main__":
+    unittest.main()
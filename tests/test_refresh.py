@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+
+from refresh import RefreshCoalescer
+
+
+class RefreshCoalescerTest(unittest.TestCase):
+    def setUp(self):
+        self.flushed = []
+        self.coalescer = RefreshCoalescer(self.flushed.append, window=0.2)
+        self.addCleanup(self.coalescer.stop)
+
+    def test_burst_collapses_into_one_flush_per_window(self):
+        self.coalescer.mark_dirty("2030-01-07")
+        self.assertTrue(self.coalescer.wait_idle(2))
+        threads = [threading.Thread(target=self.coalescer.mark_dirty, args=("2030-01-07",)) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(self.coalescer.wait_idle(2))
+        self.assertEqual(self.flushed, ["2030-01-07", "2030-01-07"])
+
+    def test_flushes_wait_for_the_window(self):
+        self.coalescer.mark_dirty("2030-01-07")
+        self.assertTrue(self.coalescer.wait_idle(2))
+        marked = time.monotonic()
+        self.coalescer.mark_dirty("2030-01-07")
+        self.assertTrue(self.coalescer.wait_idle(2))
+        self.assertGreaterEqual(time.monotonic() - marked, 0.15)
+
+    def test_discarded_date_is_not_flushed(self):
+        self.coalescer.window = 0.5
+        self.coalescer.mark_dirty("2030-01-07")
+        self.assertTrue(self.coalescer.wait_idle(2))
+        self.coalescer.mark_dirty("2030-01-08")
+        self.coalescer.discard("2030-01-08")
+        self.assertTrue(self.coalescer.wait_idle(2))
+        self.assertEqual(self.flushed, ["2030-01-07"])
+
+    def test_failing_flush_does_not_stop_others(self):
+        def flush(poll_date):
+            if poll_date == "2030-01-07":
+                raise RuntimeError("boom")
+            self.flushed.append(poll_date)
+
+        coalescer = RefreshCoalescer(flush, window=0)
+        self.addCleanup(coalescer.stop)
+        with self.assertLogs("refresh", level="ERROR"):
+            coalescer.mark_dirty("2030-01-07")
+            coalescer.mark_dirty("2030-01-08")
+            self.assertTrue(coalescer.wait_idle(2))
+        self.assertEqual(self.flushed, ["2030-01-08"])
+
+    def test_stop_pushes_pending_refreshes(self):
+        self.coalescer.window = 10
+        self.coalescer.mark_dirty("2030-01-07")
+        self.assertTrue(self.coalescer.wait_idle(2))
+        self.coalescer.mark_dirty("2030-01-08")
+        self.coalescer.stop()
+        self.assertEqual(self.flushed, ["2030-01-07", "2030-01-08"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from poll_state import MessageRef, PollState
+from tests.helpers import make_tenant
+
+
+class MessageRefTest(unittest.TestCase):
+    def test_record_has_no_instance_dict(self):
+        ref = MessageRef("D1", "1.0")
+        self.assertFalse(hasattr(ref, "__dict__"))
+        with self.assertRaises(AttributeError):
+            ref.user_id = "U1"
+
+    def test_channel_ids_are_shared(self):
+        channel = "".join(["D", "0123456789"])
+        self.assertIs(MessageRef(channel, "1.0").channel, sys.intern("D0123456789"))
+        self.assertEqual(MessageRef(channel, "2.0").as_dict(), {"channel": "D0123456789", "ts": "2.0"})
+
+
+class TrackedPollLimitTest(unittest.TestCase):
+    def start(self, state, *poll_dates):
+        evicted = []
+        for poll_date in poll_dates:
+            evicted += state.start(poll_date)
+            state.track_message(poll_date, "U1", "D1", poll_date)
+        return evicted
+
+    def test_oldest_polls_are_evicted_first(self):
+        state = PollState(max_tracked_polls=2)
+        self.assertEqual(self.start(state, "2030-01-07", "2030-01-08", "2030-01-09", "2030-01-10"),
+                         ["2030-01-07", "2030-01-08"])
+        self.assertEqual([state.is_tracked(day) for day in ("2030-01-08", "2030-01-09", "2030-01-10")],
+                         [False, True, True])
+
+    def test_active_poll_is_kept_even_if_it_is_the_oldest(self):
+        state = PollState(max_tracked_polls=1)
+        self.start(state, "2030-01-08")
+        # Restarting an older date, e.g. after a manual resend, keeps it
+        self.assertEqual(state.start("2030-01-07"), ["2030-01-08"])
+        self.assertTrue(state.is_tracked("2030-01-07"))
+
+    def test_no_limit_keeps_every_poll(self):
+        state = PollState()
+        self.assertEqual(self.start(state, "2030-01-07", "2030-01-08", "2030-01-09"), [])
+        self.assertEqual(state.message_count("2030-01-07"), 1)
+
+    def test_lowered_limit_applies_at_the_next_poll(self):
+        state = PollState(max_tracked_polls=3)
+        self.start(state, "2030-01-07", "2030-01-08", "2030-01-09")
+        state.max_tracked_polls = 1
+        self.assertEqual(self.start(state, "2030-01-10"), ["2030-01-07", "2030-01-08", "2030-01-09"])
+
+
+class TenantRetentionTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name, summary_mode={"mode": "channel", "channel": "C1"},
+                                  retention={"max_tracked_polls": 1, "cold_storage_days": 30})
+        self.tenant.user_directory.apply({"id": "U1", "name": "alice"})
+        self.tenant.user_directory.loaded = True
+        self.addCleanup(self.tenant.summary_refresher.stop)
+
+    def test_evicted_poll_drops_its_channel_summary(self):
+        self.tenant.send_attendance_poll("2030-01-07")
+        self.assertIn("2030-01-07", self.tenant.summary_messages)
+        self.tenant.send_attendance_poll("2030-01-08")
+        self.assertNotIn("2030-01-07", self.tenant.summary_messages)
+        self.assertIn("2030-01-08", self.tenant.summary_messages)
+
+    def test_purge_forgets_polls_past_cold_storage(self):
+        today = datetime.now(self.tenant.timezone()).date()
+        old, recent = (str(today - timedelta(days=days)) for days in (31, 29))
+        for poll_date in (old, recent):
+            self.tenant.store.save_message(poll_date, "U1", "D1", "1.0")
+        self.tenant.purge_cold_polls()
+        self.assertEqual(self.tenant.store.load_messages(old), {})
+        self.assertEqual(set(self.tenant.store.load_messages(recent)), {"U1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
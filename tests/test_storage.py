@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from storage import MemoryStore, SQLiteStore, StateStore
+
+
+class StoreContract:
+    """Behaviour every state store has, run against each backend"""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_active_poll_round_trip(self):
+        self.assertEqual(self.store.load_active_poll(), (None, [], {}, {}))
+        self.store.set_active_poll("2030-01-07", ["2030-01-07", "2030-01-08"])
+        self.store.save_response("2030-01-07", "alice", "yes")
+        self.store.save_response("2030-01-08", "alice", "no")
+        self.store.save_response("2030-01-01", "bob", "yes")
+        self.store.save_message("2030-01-07", "U1", "D1", "1.0")
+        poll_date, dates, responses, messages = self.store.load_active_poll()
+        self.assertEqual(poll_date, "2030-01-07")
+        self.assertEqual(dates, ["2030-01-07", "2030-01-08"])
+        self.assertEqual(responses, {"2030-01-07": {"alice": "yes"}, "2030-01-08": {"alice": "no"}})
+        self.assertEqual(messages, {"U1": {"channel": "D1", "ts": "1.0"}})
+
+    def test_daily_poll_covers_its_own_date(self):
+        self.store.set_active_poll("2030-01-07")
+        self.assertEqual(self.store.load_active_poll()[1], ["2030-01-07"])
+
+    def test_retire_poll_queues_deletions(self):
+        self.store.set_active_poll("2030-01-07")
+        self.store.save_message("2030-01-07", "U1", "D1", "1.0")
+        self.store.retire_poll("2030-01-07", [{"channel": "D1", "ts": "1.0"}])
+        self.assertEqual(self.store.load_active_poll()[0], None)
+        self.assertEqual(self.store.load_messages("2030-01-07"), {})
+        self.assertEqual(self.store.load_pending_deletions(), [{"channel": "D1", "ts": "1.0"}])
+        self.store.complete_deletion("D1", "1.0")
+        self.assertEqual(self.store.load_pending_deletions(), [])
+
+    def test_purge_keeps_the_active_poll(self):
+        self.store.set_active_poll("2030-01-01")
+        self.store.save_message("2030-01-01", "U1", "D1", "1.0")
+        self.store.save_message("2029-12-01", "U1", "D1", "0.5")
+        self.store.purge_polls("2030-01-05")
+        self.assertEqual(self.store.load_messages("2029-12-01"), {})
+        self.assertEqual(len(self.store.load_messages("2030-01-01")), 1)
+
+    def test_outbound_round_trip(self):
+        entry = {"key": "2030-01-07|U1|post", "poll_date": "2030-01-07", "user_id": "U1", "operation": "post",
+                 "attempts": 2, "next_attempt": 12.5, "last_error": "ratelimited", "dead": False}
+        self.store.save_outbound(entry)
+        self.assertEqual(self.store.load_outbound(), [entry])
+        self.store.delete_outbound(entry["key"])
+        self.assertEqual(self.store.load_outbound(), [])
+
+    def test_history_round_trip(self):
+        self.store.save_history_day("2030-01-07", bytes([1, 2]), 3, [("alice", 0), ("bob", 1)])
+        self.store.save_history_day("2030-01-08", bytes([3, 0]), 2, [])
+        self.assertEqual(self.store.load_history_users(), {"alice": 0, "bob": 1})
+        self.assertEqual(self.store.load_history("2030-01-08"), [("2030-01-08", bytes([3, 0]), 2)])
+        self.assertEqual(len(self.store.load_history()), 2)
+
+    def test_mutes_round_trip(self):
+        self.store.save_mute("U1", date(2030, 1, 10))
+        self.store.save_mute("U2", date(2030, 7, 14), date(2030, 7, 1))
+        self.assertEqual(self.store.load_mutes(), {"U1": (None, date(2030, 1, 10)),
+                                                   "U2": (date(2030, 7, 1), date(2030, 7, 14))})
+        self.store.delete_mute("U1")
+        self.assertEqual(list(self.store.load_mutes()), ["U2"])
+
+
+class StateStoreInterfaceTest(unittest.TestCase):
+    def test_backend_missing_a_method_fails_when_created(self):
+        class Partial(StateStore):
+            def load_active_poll(self):
+                return None, [], {}, {}
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class MemoryStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return MemoryStore()
+
+
+class SQLiteStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        return SQLiteStore(os.path.join(self.directory.name, "attendance.db"))
+
+    def test_state_survives_reopening(self):
+        self.store.set_active_poll("2030-01-07")
+        self.store.save_response("2030-01-07", "alice", "maybe")
+        self.store.close()
+        self.store = SQLiteStore(self.store.path)
+        self.assertEqual(self.store.load_active_poll()[2], {"2030-01-07": {"alice": "maybe"}})
+
+    def test_failing_write_only_drops_itself(self):
+        with self.assertLogs("storage", level="ERROR") as logs:
+            # A slow first item lets the following ones queue up into one batch behind it
+            self.store._writes.put([("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+                                     "WHERE x < 300000) SELECT count(*) FROM c", ())])
+            self.store.save_response("2030-01-07", "alice", "yes")
+            self.store._writes.put([("INSERT INTO no_such_table VALUES (?)", (1,))])
+            self.store.save_mute("U1", date(2030, 1, 10))
+            self.store.save_message("2030-01-07", "U1", "D1", "1.0")
+            self.store.flush()
+        self.assertIn("no_such_table", "\n".join(logs.output))
+        self.store.set_active_poll("2030-01-07")
+        _, _, responses, messages = self.store.load_active_poll()
+        self.assertEqual(responses, {"2030-01-07": {"alice": "yes"}})
+        self.assertEqual(list(messages), ["U1"])
+        self.assertEqual(list(self.store.load_mutes()), ["U1"])
+
+    def test_changed_ignores_own_writes(self):
+        other = SQLiteStore(self.store.path)
+        self.addCleanup(other.close)
+        self.store.changed()
+        other.changed()
+
+        self.store.save_response("2030-01-07", "alice", "yes")
+        self.store.flush()
+        self.assertFalse(self.store.changed())
+        self.assertTrue(other.changed())
+        self.assertFalse(other.changed())
+
+        other.save_mute("U1", date(2030, 1, 10))
+        other.flush()
+        self.assertTrue(self.store.changed())
+        self.assertFalse(other.changed())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import tempfile
+import unittest
+
+from poll_state import PollState
+from summary import SECTION_TEXT_LIMIT, SHOW_ALL_ACTION, VOTERS_PAGE_ACTION, SummaryRenderer
+from tests.helpers import make_config
+
+POLL_DATE = "2030-01-07"
+
+
+class SummaryTestCase(unittest.TestCase):
+    settings = {}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.renderer = SummaryRenderer(make_config(directory.name, **self.settings).compile())
+        self.state = PollState()
+        self.state.start(POLL_DATE)
+
+    def vote(self, *votes):
+        for user, response in votes:
+            self.state.record(user, response)
+        return self.state.snapshot()
+
+
+class RenderCacheTest(SummaryTestCase):
+    def test_payload_is_rendered_once_per_version(self):
+        snapshot = self.vote(("alice", "yes"))
+        payload = self.renderer.render(snapshot, POLL_DATE)
+        self.assertIs(self.renderer.render(snapshot, POLL_DATE), payload)
+        self.assertIs(self.renderer.render(self.state.snapshot(), POLL_DATE), payload)
+
+        changed = self.renderer.render(self.vote(("bob", "no")), POLL_DATE)
+        self.assertIsNot(changed, payload)
+        self.assertIn("bob", changed)
+
+    def test_payload_matches_the_blocks(self):
+        snapshot = self.vote(("alice", "yes"), ("bob", "maybe"))
+        self.assertEqual(json.loads(self.renderer.render(snapshot, POLL_DATE)),
+                         self.renderer.blocks(snapshot, POLL_DATE))
+
+    def test_dm_payloads_are_cached_per_answer(self):
+        yes = self.renderer.render_dm(POLL_DATE, "yes")
+        self.assertIs(self.renderer.render_dm(POLL_DATE, "yes"), yes)
+        self.assertIsNot(self.renderer.render_dm(POLL_DATE, "no"), yes)
+        self.assertIn("Your answer", yes)
+
+
+class CompactLayoutTest(SummaryTestCase):
+    settings = {"summary_layout": {"style": "compact", "preview_names": 2, "page_size": 3}}
+
+    def test_only_preview_names_are_listed(self):
+        blocks = self.renderer.blocks(self.vote(("alice", "yes"), ("bob", "yes"), ("carol", "yes")), POLL_DATE)
+        text = blocks[2]["text"]["text"]
+        self.assertIn("alice, bob and 1 more", text)
+        self.assertNotIn("carol", text)
+        self.assertEqual(blocks[3]["elements"][0]["action_id"], SHOW_ALL_ACTION)
+        self.assertEqual(blocks[3]["elements"][0]["value"], POLL_DATE)
+
+    def test_short_lists_have_no_show_all_button(self):
+        blocks = self.renderer.blocks(self.vote(("alice", "yes"), ("bob", "no")), POLL_DATE)
+        self.assertEqual(len(blocks), 3)
+        self.assertIn("alice", blocks[2]["text"]["text"])
+
+
+class FullLayoutTest(SummaryTestCase):
+    def test_every_voter_is_listed(self):
+        blocks = self.renderer.channel_blocks(self.vote(*((f"user{index}", "yes") for index in range(20))),
+                                              POLL_DATE)
+        self.assertEqual(len(blocks), 1)
+        self.assertIn("user19", blocks[0]["text"]["text"])
+
+    def test_summary_over_the_section_limit_falls_back_to_compact(self):
+        snapshot = self.vote(*((f"user-with-a-long-name-{index}", "yes") for index in range(200)))
+        blocks = self.renderer.channel_blocks(snapshot, POLL_DATE)
+        self.assertLessEqual(len(blocks[0]["text"]["text"]), SECTION_TEXT_LIMIT)
+        self.assertIn("and 190 more", blocks[0]["text"]["text"])
+        self.assertEqual(blocks[1]["elements"][0]["action_id"], SHOW_ALL_ACTION)
+
+
+class VotersViewTest(SummaryTestCase):
+    settings = CompactLayoutTest.settings
+
+    def setUp(self):
+        super().setUp()
+        self.snapshot = self.vote(("alice", "yes"), ("bob", "yes"), ("carol", "no"), ("dave", "maybe"),
+                                  ("erin", "yes"), ("frank", "no"), ("grace", "maybe"))
+
+    def page(self, page):
+        blocks = self.renderer.voters_view(self.snapshot, POLL_DATE, page)["blocks"]
+        sections = [block["text"]["text"] for block in blocks if block["type"] == "section"]
+        footer = next(block for block in blocks if block["type"] == "context")["elements"][0]["text"]
+        buttons = [
+            (element["action_id"], json.loads(element["value"]))
+            for block in blocks if block["type"] == "actions" for element in block["elements"]
+        ]
+        return sections, footer, buttons
+
+    def section(self, response, count, names):
+        return f"*{self.renderer.option_texts[response]}* ({count})\n{names}"
+
+    def test_first_page_links_only_to_the_next(self):
+        sections, footer, buttons = self.page(0)
+        self.assertEqual(sections, [self.section("yes", 3, "alice, bob, erin")])
+        self.assertEqual(footer, "Page 1 of 3")
+        self.assertEqual(buttons, [(f"{VOTERS_PAGE_ACTION}_next", {"date": POLL_DATE, "page": 1})])
+
+    def test_middle_page_links_both_ways(self):
+        sections, footer, buttons = self.page(1)
+        self.assertEqual(sections, [self.section("no", 2, "carol, frank"), self.section("maybe", 2, "dave")])
+        self.assertEqual(footer, "Page 2 of 3")
+        self.assertEqual([action_id for action_id, _ in buttons],
+                         [f"{VOTERS_PAGE_ACTION}_previous", f"{VOTERS_PAGE_ACTION}_next"])
+
+    def test_page_past_the_end_shows_the_last(self):
+        sections, footer, buttons = self.page(10)
+        self.assertEqual(sections, [self.section("maybe", 2, "grace")])
+        self.assertEqual(footer, "Page 3 of 3")
+        self.assertEqual(buttons, [(f"{VOTERS_PAGE_ACTION}_previous", {"date": POLL_DATE, "page": 1})])
+
+    def test_inactive_poll_says_so(self):
+        view = self.renderer.voters_view(self.snapshot, "2030-01-01")
+        self.assertEqual(view["blocks"][0]["text"]["text"], "This poll is no longer active.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+
+from tests.helpers import make_tenant
+
+POLL_DATE = "2030-01-07"
+USERS = [{"id": f"U{index}", "name": f"user{index}"} for index in range(3)]
+
+
+class SummaryModeTestCase(unittest.TestCase):
+    summary_mode = {}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name, summary_mode=self.summary_mode)
+        for user in USERS:
+            self.tenant.user_directory.apply(user)
+        self.tenant.user_directory.loaded = True
+        self.tenant.send_attendance_poll(POLL_DATE)
+        self.addCleanup(self.tenant.summary_refresher.stop)
+        self.client = self.tenant.client
+
+    def calls(self, method):
+        return [kwargs for name, kwargs in self.client.calls if name == method]
+
+    def vote(self, user, response):
+        """Vote and wait for the refresh the vote triggers"""
+        reply = self.tenant.handle_vote({"user": {"name": user}}, response)
+        self.assertTrue(self.tenant.summary_refresher.wait_idle(5))
+        return reply
+
+
+class ChannelModeTest(SummaryModeTestCase):
+    summary_mode = {"mode": "channel", "channel": "C1"}
+
+    def test_summary_is_posted_once_to_the_channel(self):
+        posts = self.calls("chat_postMessage")
+        self.assertEqual([post["channel"] for post in posts].count("C1"), 1)
+        self.assertEqual(len(posts), len(USERS) + 1)
+        # The DMs only carry the question and the buttons
+        self.assertNotIn("None", next(post["blocks"] for post in posts if post["channel"] != "C1"))
+
+    def test_refresh_is_one_update_of_the_channel_message(self):
+        self.vote("user0", "yes")
+        self.vote("user1", "no")
+        self.client.calls.clear()
+        self.tenant.update_all_summaries()
+        updates = self.calls("chat_update")
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0]["channel"], "C1")
+        self.assertIn("user0", updates[0]["blocks"])
+
+    def test_vote_reply_shows_the_voters_answer(self):
+        reply = self.vote("user0", "maybe")
+        self.assertTrue(reply["replace_original"])
+        self.assertIn("Your answer", str(reply["blocks"]))
+
+
+class AppHomeModeTest(SummaryModeTestCase):
+    summary_mode = {"mode": "app_home", "channel": ""}
+
+    def test_refresh_makes_no_calls(self):
+        self.vote("user0", "yes")
+        self.client.calls.clear()
+        self.tenant.update_all_summaries()
+        self.assertEqual(self.client.calls, [])
+
+    def test_home_view_shows_the_tally_and_own_answer(self):
+        self.vote("user0", "yes")
+        view = self.tenant.home_view("U0")
+        self.assertEqual(view["type"], "home")
+        self.assertIn("user0", str(view["blocks"]))
+        self.assertIn("Your answer", str(view["blocks"]))
+
+
+class DMModeTest(SummaryModeTestCase):
+    def test_refresh_updates_every_dm(self):
+        self.vote("user0", "yes")
+        self.client.calls.clear()
+        self.tenant.update_all_summaries()
+        self.assertEqual(len(self.calls("chat_update")), len(USERS))
+
+
+if __name__ == "__main__":
+    unittest.main()
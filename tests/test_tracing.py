@@ -0,0 +1,180 @@
+import asyncio
+import atexit
+import inspect
+import io
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import tracing
+from fanout import FairExecutor, FanOut
+from tests.helpers import FakeClient
+from tracing import SamplingProfiler, Tracer, setup_logging, traced
+
+
+class TracerTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces", "spans.jsonl")
+        self.tracer = Tracer()
+        self.tracer.configure(True, self.path)
+        self.addCleanup(self.tracer.close)
+
+    def spans(self):
+        """Stop the writer and read back the exported spans by name"""
+        self.tracer.close()
+        with open(self.path) as f:
+            return {record["name"]: record for record in map(json.loads, f)}
+
+
+class SpanExportTest(TracerTestCase):
+    def test_nested_spans_share_the_trace(self):
+        with self.tracer.span("poll.send", tenant="T1"):
+            with self.tracer.span("slack.chat.postMessage") as span:
+                span.set(retries=1)
+        spans = self.spans()
+        parent, child = spans["poll.send"], spans["slack.chat.postMessage"]
+        self.assertIsNone(parent["parent_id"])
+        self.assertEqual(child["parent_id"], parent["span_id"])
+        self.assertEqual(child["trace_id"], parent["trace_id"])
+        self.assertEqual(parent["attributes"], {"tenant": "T1"})
+        self.assertEqual(child["attributes"], {"retries": 1})
+        self.assertGreaterEqual(parent["duration_ms"], child["duration_ms"])
+
+    def test_errors_are_recorded_and_raised(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span("vote"):
+                raise ValueError("bad action")
+        self.assertEqual(self.spans()["vote"]["error"], "ValueError: bad action")
+
+    def test_decorator_keeps_signature_and_coroutines(self):
+        @traced("command")
+        def command(ack, body):
+            return body
+
+        @traced("action")
+        async def action(ack, body):
+            return body
+
+        self.assertEqual(list(inspect.signature(command).parameters), ["ack", "body"])
+        self.assertTrue(inspect.iscoroutinefunction(action))
+        with mock.patch("tracing.tracer", self.tracer):
+            self.assertEqual(command(None, 1), 1)
+            self.assertEqual(asyncio.run(action(None, 2)), 2)
+        self.assertEqual(set(self.spans()), {"command", "action"})
+
+    def test_fan_out_tasks_join_the_callers_trace(self):
+        fan_out = FanOut(FakeClient(), executor=FairExecutor(2))
+        with mock.patch("fanout.tracer", self.tracer):
+            with self.tracer.span("poll.send"):
+                fan_out.run(["U1", "U2"], lambda user_id: fan_out.call("chat.postMessage", channel=user_id),
+                            label="poll", on_progress=None, describe=lambda user_id: {"user_id": user_id})
+        self.tracer.close()
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f]
+        root = next(record for record in records if record["name"] == "poll.send")
+        tasks = [record for record in records if record["name"] == "poll"]
+        calls = [record for record in records if record["name"] == "slack.chat.postMessage"]
+        self.assertEqual(sorted(task["attributes"]["user_id"] for task in tasks), ["U1", "U2"])
+        self.assertTrue(all(task["parent_id"] == root["span_id"] for task in tasks))
+        self.assertEqual({call["parent_id"] for call in calls}, {task["span_id"] for task in tasks})
+        self.assertEqual({record["trace_id"] for record in records}, {root["trace_id"]})
+
+
+class DisabledTracerTest(unittest.TestCase):
+    def test_nothing_is_exported(self):
+        tracer = Tracer()
+        with tracer.span("vote") as span:
+            span.set(user_id="U1")
+        self.assertIs(tracer.current(), tracing._NULL_SPAN)
+        self.assertTrue(tracer._queue.empty())
+        self.assertIsNone(tracer._writer)
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "profile.folded")
+
+    def test_other_threads_are_sampled_as_collapsed_stacks(self):
+        release = threading.Event()
+
+        def waiting_for_release():
+            release.wait(5)
+
+        thread = threading.Thread(target=waiting_for_release)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+
+        profiler = SamplingProfiler(self.path)
+        profiler._sample()
+        profiler._sample()
+        profiler.write()
+        with open(self.path) as f:
+            lines = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+        stack, count = next((stack, count) for stack, count in lines if "waiting_for_release" in stack)
+        self.assertEqual(count, "2")
+        self.assertTrue(stack.startswith("threading.py:_bootstrap;"))
+        self.assertIn("test_tracing.py:waiting_for_release;threading.py:wait", stack)
+        # The sampling thread itself is left out
+        self.assertFalse(any("_sample" in stack for stack, _ in lines))
+
+    def test_rarest_stacks_are_dropped_beyond_the_limit(self):
+        profiler = SamplingProfiler(self.path, max_stacks=4)
+        profiler._stacks.update({"main;poll": 50, "main;vote": 20, "main;refresh": 10, "main;idle": 5})
+        with mock.patch("sys._current_frames", return_value={}):
+            profiler._sample()
+            self.assertEqual(len(profiler._stacks), 4)
+            profiler._stacks["main;rare"] += 1
+            profiler._sample()
+        self.assertEqual(dict(profiler._stacks), {"main;poll": 50, "main;vote": 20})
+        self.assertEqual(profiler.dropped, 16)
+        profiler.write()
+        with open(self.path) as f:
+            self.assertEqual(f.read().splitlines(), ["main;poll 50", "main;vote 20", "[dropped] 16"])
+
+    def test_stop_writes_the_profile(self):
+        profiler = SamplingProfiler(self.path, interval=0.001)
+        profiler.start()
+        self.addCleanup(atexit.unregister, profiler.stop)
+        while not profiler._stacks:
+            threading.Event().wait(0.001)
+        profiler.stop()
+        self.assertIsNone(profiler._thread)
+        self.assertTrue(os.path.getsize(self.path) > 0)
+
+
+class QueuedLoggingTest(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        handlers, level = root.handlers, root.level
+        self.addCleanup(root.setLevel, level)
+        self.addCleanup(setattr, root, "handlers", handlers)
+
+    def test_records_reach_the_stream_through_the_queue(self):
+        stream = io.StringIO()
+        with mock.patch("sys.stderr", stream):
+            listener = setup_logging("INFO")
+        self.addCleanup(atexit.unregister, listener.stop)
+        self.addCleanup(listener.stop)
+        root = logging.getLogger()
+        self.assertEqual([type(handler) for handler in root.handlers], [logging.handlers.QueueHandler])
+
+        logging.getLogger("tenant").debug("Skipping muted user %s", "U1")
+        logging.getLogger("tenant").info("Poll sent to %d users", 3)
+        listener.queue.join()
+        output = stream.getvalue()
+        self.assertIn("INFO tenant: Poll sent to 3 users", output)
+        self.assertNotIn("muted", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
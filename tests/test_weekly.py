@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+
+from tests.helpers import make_tenant
+
+WEEK = ["2030-01-07", "2030-01-08", "2030-01-09"]
+
+
+class WeeklyPollTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tenant = make_tenant(directory.name, poll_mode={"mode": "weekly"})
+        self.tenant.poll.start(WEEK[0], WEEK)
+        for user, response in (("alice", "yes"), ("bob", "no")):
+            self.tenant.poll.record(user, response, day=WEEK[0])
+        self.tenant.poll.record("carol", "maybe", day=WEEK[2])
+
+    def test_stats_of_a_day_without_votes(self):
+        stats = self.tenant.get_attendance_stats(WEEK[1])
+        self.assertEqual(stats["date"], WEEK[1])
+        self.assertEqual((stats["total_responses"], stats["coming"], stats["not_coming"], stats["maybe"]),
+                         (0, 0, 0, 0))
+
+    def test_stats_of_days_with_votes(self):
+        monday = self.tenant.get_attendance_stats(WEEK[0])
+        self.assertEqual((monday["total_responses"], monday["coming"], monday["not_coming"]), (2, 1, 1))
+        wednesday = self.tenant.get_attendance_stats(WEEK[2])
+        self.assertEqual((wednesday["total_responses"], wednesday["maybe"]), (1, 1))
+
+    def test_stats_of_an_uncovered_day(self):
+        self.assertIsNone(self.tenant.get_attendance_stats("2030-01-10"))
+
+    def test_voters_view_of_a_day_without_votes(self):
+        view = self.tenant.voters_view(WEEK[1])
+        text = str(view["blocks"])
+        self.assertNotIn("alice", text)
+        self.assertNotIn("no longer active", text)
+
+    def test_votes_are_kept_per_day(self):
+        self.tenant.poll.record("alice", "no", day=WEEK[1])
+        snapshot = self.tenant.poll.snapshot()
+        self.assertEqual(self.tenant.choices(snapshot, "alice"), {WEEK[0]: "yes", WEEK[1]: "no", WEEK[2]: None})
+        self.assertEqual(snapshot.dates, tuple(WEEK))
+
+    def test_unchanged_days_keep_their_snapshot(self):
+        before = self.tenant.poll.snapshot()
+        self.tenant.poll.record("dave", "yes", day=WEEK[0])
+        after = self.tenant.poll.snapshot()
+        self.assertIs(after.day(WEEK[1]), before.day(WEEK[1]))
+        self.assertIsNot(after.day(WEEK[0]), before.day(WEEK[0]))
+
+    def test_empty_snapshot_is_rendered_as_given(self):
+        self.tenant.poll.start(WEEK[0], WEEK)
+        empty = self.tenant.poll.snapshot()
+        self.tenant.poll.record("alice", "yes", day=WEEK[0])
+        self.assertNotIn("alice", str(self.tenant.render_summary_blocks(WEEK[0], empty)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,257 @@
+"""Span tracing, sampling profiler and non-blocking logging setup
+
+Spans are written as JSON lines by a background thread, so tracing a per-user
+hot loop never waits on disk I/O. Spans nest through a context variable. The
+fan-out engine copies the context into its workers, so per-recipient spans
+share the trace of the run that started them.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes, part of a trace"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_time", "_start", "duration", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_time = time.time()
+        self._start = time.monotonic()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.monotonic() - self._start
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer._export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _NullSpan:
+    """Stand-in used while tracing is disabled"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Creates spans and exports finished ones to a JSON lines file"""
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def configure(self, enabled: bool, path: str) -> None:
+        self.enabled = enabled
+        self.path = path
+        if enabled and self._writer is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._writer = threading.Thread(target=self._write_loop, name="trace-export", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def span(self, name: str, **attributes: Any):
+        """Start a span as a child of the current one, for use as a context manager"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    def current(self):
+        return _current_span.get() or _NULL_SPAN
+
+    def _export(self, span: Span) -> None:
+        self._queue.put(span.to_dict())
+
+    def _write_loop(self) -> None:
+        with open(self.path, "a") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                f.write(json.dumps(record, default=str) + "\n")
+                # Write out whatever else is waiting before flushing
+                while not self._queue.empty():
+                    record = self._queue.get_nowait()
+                    if record is None:
+                        f.flush()
+                        return
+                    f.write(json.dumps(record, default=str) + "\n")
+                f.flush()
+
+    def close(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+
+tracer = Tracer()
+
+
+def traced(name: str) -> Callable:
+    """Decorator that runs a function inside a span
+
+    ``functools.wraps`` keeps the signature visible to Bolt's argument injection.
+    Coroutine functions stay coroutine functions, as the async Bolt app requires.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads and writes them in collapsed stack format
+
+    The output can be turned into a flame graph with tools such as
+    ``flamegraph.pl`` or speedscope. At most ``max_stacks`` distinct stacks are
+    kept; beyond that the rarest are dropped and counted under ``[dropped]``.
+    """
+
+    def __init__(self, path: str, interval: float = 0.01, flush_interval: float = 60.0,
+                 max_stacks: int = 10000):
+        self.path = path
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.max_stacks = max_stacks
+        self.dropped = 0
+        self._stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.write()
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+        if len(self._stacks) > self.max_stacks:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Keep the most common half of the allowed stacks, so pruning does not run on every sample"""
+        kept = self._stacks.most_common(max(1, self.max_stacks // 2))
+        self.dropped += sum(self._stacks.values()) - sum(count for _, count in kept)
+        self._stacks = Counter(dict(kept))
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while not self._stopped.wait(self.interval):
+            self._sample()
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.write()
+                last_flush = time.monotonic()
+
+    def write(self) -> None:
+        try:
+            with open(self.path, "w") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+                if self.dropped:
+                    f.write(f"[dropped] {self.dropped}\n")
+        except Exception as e:
+            logger.error("Error writing profile %s: %s", self.path, e)
+
+
+def setup_logging(level: str = "INFO") -> logging.handlers.QueueListener:
+    """Send log records through a queue so logging never blocks the caller"""
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener